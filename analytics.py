@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# ------------------ study_log.csv 스트리밍 분석 ------------------
+# study_log.csv 는 퇴장할 때마다 한 줄씩 계속 늘어나므로 파일 전체를 메모리에 올리지 않고
+# 일정 크기 단위로 읽어 집계합니다. 어디까지 읽었는지(바이트 위치)와 부분 집계를 체크포인트 파일에 저장해
+# 다음 조회 때는 새로 추가된 줄만 처리합니다. 체크포인트 파일은 조회마다가 아니라 일정 간격으로만 다시 쓰고
+# 종료 시 save_checkpoint() 로 남은 변경을 기록합니다 (유실되어도 다음 시작 때 그 이후 줄만 다시 읽음).
+#
+# 체크포인트에 유지하는 집계 (크기는 사용자 수 × 연도 수에 비례, 로그 길이와 무관):
+#   - 사용자별: 총 공부 시간, 세션 수, 연도별 공부 시간
+#   - 서버 전체: 총 공부 시간, 세션 수, 연도별 공부 시간
+#   - 월별 시작 바이트 위치: 기간 지정 조회 시 해당 월부터만 읽도록 사용
+# NumPy 가 설치되어 있으면 청크 단위 집계를 벡터화합니다 (없으면 순수 파이썬).
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+from persistence import atomic_write_text
+
+_numpy = None # 선택 의존성. 첫 집계 때 불러옴 (봇 시작 시간에서 제외), 없으면 False
+
+
+def _load_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+ANALYTICS_CHUNK_BYTES = int(os.getenv("ANALYTICS_CHUNK_BYTES", str(4 * 1024 * 1024))) # 한 번에 읽는 크기
+ANALYTICS_CHECKPOINT_INTERVAL = float(os.getenv("ANALYTICS_CHECKPOINT_INTERVAL", "60")) # 체크포인트 최소 저장 간격(초)
+CSV_ENCODING = 'utf-8-sig' # 파일 맨 앞의 BOM 만 제거되고 중간 청크에는 영향 없음
+
+
+def _empty_checkpoint():
+    return {"offset": 0, "users": {}, "server": {"total": 0, "sessions": 0, "years": {}}, "month_offsets": {}}
+
+
+def _parse_rows(lines):
+    # (저장소 키, username, date, minutes) 목록으로 변환. 헤더/깨진 줄은 건너뜀
+    # 7번째 열(서버 ID)이 있으면 저장소와 같은 "서버ID:사용자ID" 키로 집계 (기존 줄/기본 서버는 사용자 ID)
+    rows = []
+    for row in csv.reader(lines):
+        if len(row) < 6:
+            continue
+        try:
+            key = f"{row[6]}:{row[0]}" if len(row) > 6 and row[6] else row[0]
+            rows.append((key, row[1], row[2], int(row[5])))
+        except ValueError:
+            continue # 헤더 줄 등
+    return rows
+
+
+class StudyLogAnalytics:
+    def __init__(self, csv_file, checkpoint_file, chunk_bytes=ANALYTICS_CHUNK_BYTES,
+                 checkpoint_interval=ANALYTICS_CHECKPOINT_INTERVAL):
+        self.csv_file = csv_file
+        self.checkpoint_file = checkpoint_file
+        self.chunk_bytes = chunk_bytes
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint = None
+        self._dirty = False    # 마지막 저장 이후 집계가 바뀌었는지
+        self._saved_at = None  # 마지막 체크포인트 저장 시각 (time.monotonic)
+        self._lock = threading.Lock() # 여러 조회가 동시에 refresh 하지 않도록 함 (스레드에서 실행됨)
+
+    def _load_checkpoint(self):
+        if self.checkpoint is not None:
+            return
+        self.checkpoint = _empty_checkpoint()
+        if os.path.exists(self.checkpoint_file):
+            try:
+                with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                    self.checkpoint = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"경고: 분석 체크포인트({self.checkpoint_file})를 읽을 수 없어 처음부터 다시 집계합니다: {e}")
+
+    def _iter_chunks(self, f, offset, stop_offset=None):
+        # offset 부터 완전한 줄 단위로 (청크 시작 위치, 바이트) 를 반환.
+        # 줄 끝(\n)이 없는 마지막 조각은 아직 기록 중인 줄이므로 다음 refresh 때 처리
+        f.seek(offset)
+        position = offset # carry 의 시작 위치
+        carry = b""
+        while True:
+            limit = self.chunk_bytes
+            if stop_offset is not None:
+                limit = min(limit, stop_offset - position - len(carry))
+            data = f.read(limit) if limit > 0 else b""
+            if not data:
+                return
+            data = carry + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0: # 한 줄이 청크보다 김 → 더 읽음
+                carry = data
+                continue
+            yield position, data[:cut]
+            position += cut
+            carry = data[cut:]
+
+    def _aggregate(self, rows, chunk_start):
+        users = self.checkpoint["users"]
+        server = self.checkpoint["server"]
+        month_offsets = self.checkpoint["month_offsets"]
+
+        # 월별 첫 등장 위치 기록 (청크 시작 위치 기준 → 해당 월을 놓치지 않음)
+        for _, _, date_str, _ in rows:
+            month = date_str[:7]
+            if month not in month_offsets:
+                month_offsets[month] = chunk_start
+
+        np = _load_numpy() if rows else None
+        if np is not None:
+            # 벡터화: (사용자, 연도) 조합별 합계를 한 번에 계산
+            keys = np.array([f"{uid}|{date_str[:4]}" for uid, _, date_str, _ in rows])
+            minutes = np.array([m for _, _, _, m in rows], dtype=np.int64)
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            sums = np.bincount(inverse, weights=minutes).astype(np.int64)
+            counts = np.bincount(inverse)
+            grouped = ((str(k).split("|"), int(s), int(c)) for k, s, c in zip(unique_keys, sums, counts))
+        else:
+            acc = {}
+            for uid, _, date_str, m in rows:
+                entry = acc.setdefault((uid, date_str[:4]), [0, 0])
+                entry[0] += m
+                entry[1] += 1
+            grouped = (([uid, year], s, c) for (uid, year), (s, c) in acc.items())
+
+        for (uid, year), total, count in grouped:
+            user = users.setdefault(uid, {"username": None, "total": 0, "sessions": 0, "years": {}})
+            user["total"] += total
+            user["sessions"] += count
+            user["years"][year] = user["years"].get(year, 0) + total
+            server["total"] += total
+            server["sessions"] += count
+            server["years"][year] = server["years"].get(year, 0) + total
+
+        for uid, username, _, _ in rows: # 마지막으로 기록된 이름 사용
+            users[uid]["username"] = username
+
+    def refresh(self):
+        # 체크포인트 이후 새로 추가된 줄만 읽어 집계에 반영 (블로킹 → asyncio.to_thread 로 호출)
+        with self._lock:
+            self._load_checkpoint()
+            if not os.path.exists(self.csv_file):
+                return self.checkpoint
+            size = os.path.getsize(self.csv_file)
+            if size < self.checkpoint["offset"]: # 파일이 교체/축소됨 → 처음부터 다시
+                print("study_log.csv 가 줄어들어 분석 집계를 처음부터 다시 계산합니다.")
+                self.checkpoint = _empty_checkpoint()
+            if size == self.checkpoint["offset"]:
+                return self.checkpoint
+
+            with open(self.csv_file, 'rb') as f:
+                for chunk_start, chunk in self._iter_chunks(f, self.checkpoint["offset"]):
+                    rows = _parse_rows(io.StringIO(chunk.decode(CSV_ENCODING)))
+                    self._aggregate(rows, chunk_start)
+                    self.checkpoint["offset"] = chunk_start + len(chunk)
+            self._dirty = True
+            if self._saved_at is None or time.monotonic() - self._saved_at >= self.checkpoint_interval:
+                self._save_locked()
+            return self.checkpoint
+
+    def _save_locked(self):
+        atomic_write_text(self.checkpoint_file, json.dumps(self.checkpoint, ensure_ascii=False))
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def save_checkpoint(self):
+        # 간격 때문에 아직 저장하지 않은 집계를 기록 (봇 종료 시)
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+    # --- 조회 ---
+    def user_summary(self, uid_str):
+        checkpoint = self.refresh()
+        return checkpoint["users"].get(uid_str)
+
+    def server_summary(self, partition=None):
+        # 서버(partition)별 합계. 기본 서버(None)는 접두어 없는 사용자 키만 집계
+        checkpoint = self.refresh()
+        server = {"total": 0, "sessions": 0, "users": 0}
+        for key, user in checkpoint["users"].items():
+            guild_part, sep, _ = key.rpartition(":")
+            if (guild_part if sep else None) != (None if partition is None else str(partition)):
+                continue
+            server["total"] += user["total"]
+            server["sessions"] += user["sessions"]
+            server["users"] += 1
+        return server
+
+    def range_minutes(self, uid_str, start_date, end_date):
+        # [start_date, end_date] (YYYY-MM-DD 문자열, 포함) 기간의 사용자 공부 시간과 세션 수.
+        # 시작 월 이후 달이 처음 나온 위치부터 읽음. 세션은 퇴장 순서로 쌓이므로 날짜가 정렬되어 있다고 볼 수 없어
+        # (서버마다 시간대가 다름, 가져온 기록 등) 종료일 이후 날짜가 나와도 멈추지 않고 끝까지 확인
+        checkpoint = self.refresh()
+        month_offsets = checkpoint["month_offsets"]
+        start_month = start_date[:7]
+        candidates = [offset for month, offset in month_offsets.items() if month >= start_month]
+        if not candidates:
+            return 0, 0
+        total = sessions = 0
+        with open(self.csv_file, 'rb') as f:
+            for chunk_start, chunk in self._iter_chunks(f, min(candidates), checkpoint["offset"]):
+                rows = _parse_rows(io.StringIO(chunk.decode(CSV_ENCODING)))
+                for uid, _, date_str, minutes in rows:
+                    if uid == uid_str and start_date <= date_str <= end_date:
+                        total += minutes
+                        sessions += 1
+        return total, sessions
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# ------------------ 벤치마크용 가짜 Discord ------------------
+# 실제 게이트웨이/REST 없이 명령어 핸들러와 작업 루프를 실행하기 위한 대역입니다.
+#   - FakeAPI: 요청마다 지연(latency + 지터)을 주고, 전역 초당 요청 한도를 넘으면 discord.py 처럼 기다렸다 보냄.
+#              error_rate 확률로 재시도를 소진한 429 (discord.HTTPException) 를 발생시켜 재시도 경로도 실행
+#   - FakeUser / FakeCtx: 명령어 핸들러가 사용하는 속성(id, mention, display_name, send)만 구현
+#   - install(): bot.get_user / bot.fetch_user / bot.wait_until_ready 를 가짜로 교체
+import asyncio
+import random
+import time
+
+import discord
+
+
+class FakeResponse:
+    # discord.HTTPException 이 참조하는 속성만 가진 응답 객체
+    def __init__(self, status, reason, retry_after=None):
+        self.status = status
+        self.reason = reason
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+
+class FakeAPI:
+    def __init__(self, latency=0.05, jitter=0.02, global_rate=50.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.global_rate = global_rate   # 초당 요청 한도 (Discord 전역 한도 50/s)
+        self.error_rate = error_rate     # 재시도를 소진한 429 를 돌려줄 확률
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0               # 한도 때문에 기다린 요청 수 (discord.py 내부 429 대기에 해당)
+        self.errors = 0
+        self.by_route = {}
+        self._next_slot = 0.0            # 다음 요청이 나갈 수 있는 시각 (monotonic)
+
+    async def call(self, route):
+        self.requests += 1
+        self.by_route[route] = self.by_route.get(route, 0) + 1
+        if self.global_rate:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.global_rate
+            if slot > now:
+                self.throttled += 1
+                await asyncio.sleep(slot - now)
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            raise discord.HTTPException(FakeResponse(429, "Too Many Requests", retry_after=0.05),
+                                        "You are being rate limited.")
+
+    def stats(self):
+        return {"api_requests": self.requests, "api_throttled": self.throttled, "api_429": self.errors}
+
+
+class FakeUser:
+    def __init__(self, uid, api):
+        self.id = uid
+        self.name = f"user{uid}"
+        self.display_name = f"유저{uid}"
+        self.mention = f"<@{uid}>"
+        self.bot = False
+        self.api = api
+        self.dm_channel = None
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, content=None, **kwargs):
+        if self.dm_channel is None: # 첫 DM 은 채널 생성 요청이 추가로 필요
+            await self.api.call("POST /users/@me/channels")
+            self.dm_channel = object()
+        await self.api.call("POST /channels/{channel_id}/messages")
+
+
+class FakeChannel:
+    def __init__(self, channel_id, api):
+        self.id = channel_id
+        self.name = f"channel{channel_id}"
+        self.api = api
+
+    async def send(self, content=None, **kwargs):
+        await self.api.call("POST /channels/{channel_id}/messages")
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+
+
+class FakeVoiceState:
+    def __init__(self, channel=None):
+        self.channel = channel # None 이면 음성 채널에 없음
+
+
+class FakeCtx:
+    def __init__(self, user, channel, guild=None):
+        self.author = user
+        self.channel = channel
+        self.guild = guild
+        self.command = None
+
+    async def send(self, content=None, **kwargs):
+        await self.channel.send(content, **kwargs)
+
+
+class FakeGateway:
+    """bot 에 붙이는 가짜 사용자 캐시. cache_ratio 비율의 사용자만 게이트웨이 캐시에 있다고 가정."""
+
+    def __init__(self, api, cache_ratio=1.0, seed=0):
+        self.api = api
+        self.cache_ratio = cache_ratio
+        self.random = random.Random(seed)
+        self.users = {}
+        self.cached = set()
+
+    def user(self, uid):
+        user = self.users.get(uid)
+        if user is None:
+            user = self.users[uid] = FakeUser(uid, self.api)
+            if self.random.random() < self.cache_ratio:
+                self.cached.add(uid)
+        return user
+
+    def install(self, bot):
+        async def fetch_user(uid):
+            await self.api.call("GET /users/{user_id}")
+            return self.user(uid)
+
+        async def wait_until_ready():
+            return None
+
+        def get_user(uid):
+            user = self.user(uid)
+            return user if uid in self.cached else None
+
+        bot.get_user = get_user
+        bot.fetch_user = fetch_user
+        bot.wait_until_ready = wait_until_ready
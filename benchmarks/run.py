@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+# ------------------ 오프라인 부하 테스트 / 벤치마크 ------------------
+# 실제 Discord 없이 main.py 의 명령어 핸들러와 작업 루프를 가짜 API(benchmarks/fake_discord.py)에 대고 실행해
+# 처리량, p50/p99 지연, 최대 메모리(RSS)를 측정합니다. 시나리오마다 별도 프로세스와 임시 디렉터리에서 실행됩니다.
+#
+# 사용법 (저장소 루트에서):
+#   python -m benchmarks.run                          # 전체 시나리오
+#   python -m benchmarks.run checkin summary_dm       # 일부만
+#   python -m benchmarks.run --json result.json       # 결과 저장
+#   python -m benchmarks.run --compare result.json    # 이전 결과 대비 회귀(기본 20% 초과 악화) 시 종료 코드 1
+#   python -m benchmarks.run --time-scale 10          # 도착 간격/API 지연/속도 한도를 10배 압축해 빨리 실행
+#
+# 시나리오:
+#   checkin      60초 동안 5,000명 입장 후 전원 퇴장
+#   stats        30초 동안 500명이 !통계 (그래프 렌더링 포함)
+#   stats_spam   10초 동안 200명(채널 20개)이 각자 !통계 5번을 동시에 입력 → 요청 한도/렌더링 합치기 확인
+#   summary_dm   토요일 주간 요약 DM 20,000명 (차트는 --render-charts 일 때만 실제 렌더링)
+#   weekly_reset 1년치 기록이 있는 2,000명이 주가 바뀐 뒤 처음 퇴장 → 지난 주 기록을 주간 보관소로 옮기는 롤오버
+#                (보관소 gzip 기록이 끝날 때까지 포함, + 시작 시 데이터 로드 시간)
+#   voice_burst  5초 동안 2,000명이 공부용 음성 채널 입장(10%는 재연결) 후 전원 퇴장 → 출석 저장 횟수 확인
+#   chart_matplotlib / chart_pillow
+#                서로 다른 주간 그래프 300개를 CHART_BACKEND 별로 렌더링 (캐시 미적중) → 렌더링 지연/워커 메모리 비교
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KST = ZoneInfo("Asia/Seoul")
+RESULT_PREFIX = "BENCH_RESULT "
+
+SCENARIOS = {
+    # 이름: (기본 인원, 기본 도착 구간(초))
+    "checkin": (5000, 60.0),
+    "stats": (500, 30.0),
+    "stats_spam": (200, 10.0),
+    "summary_dm": (20000, 0.0),
+    "weekly_reset": (2000, 0.0),
+    "voice_burst": (2000, 5.0),
+    "chart_matplotlib": (300, 0.0),
+    "chart_pillow": (300, 0.0),
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) # Linux: KB 단위
+
+
+# ------------------ 데이터 준비 (main import 전) ------------------
+def seed_user_data(users, days, today, week_of=None):
+    # days 일치 일간 기록과 이번 주 기록을 가진 user_data.json 생성
+    # week_of: 주간 기록을 이 날짜가 속한 주로 (지난주를 주면 주가 바뀐 뒤 아직 아무도 기록하지 않은 상태)
+    rng = random.Random(1)
+    monday = (week_of or today) - timedelta(days=(week_of or today).weekday())
+    data = {}
+    for i in range(users):
+        uid_str = str(10_000 + i)
+        daily, monthly, weekly = {}, {}, {}
+        for d in range(days):
+            day = today - timedelta(days=d)
+            minutes = rng.randint(0, 300)
+            daily[day.isoformat()] = minutes
+            month = day.strftime("%Y-%m")
+            monthly[month] = monthly.get(month, 0) + minutes
+            if monday <= day < monday + timedelta(days=7):
+                weekly[day.isoformat()] = minutes
+        data[uid_str] = {"username": f"user{uid_str}", "total": sum(daily.values()),
+                         "weekly": weekly, "daily": daily, "monthly": monthly}
+    with open("user_data.json", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+# ------------------ 시나리오 ------------------
+async def arrive(window, count, rng, coro_factory, latencies):
+    # window 초 동안 무작위 시각에 도착하는 count 개의 요청을 실행하고 각각의 지연을 기록
+    async def one(i, delay):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        await coro_factory(i)
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i, rng.uniform(0, window)) for i in range(count)))
+
+
+async def scenario_checkin(main, gateway, channel, args):
+    from benchmarks.fake_discord import FakeCtx
+    rng = random.Random(2)
+    latencies = []
+    await arrive(args.window, args.users, rng,
+                 lambda i: main.check_in.callback(FakeCtx(gateway.user(10_000 + i), channel)), latencies)
+    for uid in list(main.attendance_log): # 30분~3시간 공부한 것으로 입장 시각 조정
+        main.attendance_log[uid]["입장"] -= timedelta(minutes=rng.randint(30, 180))
+    checkout_latencies = []
+    await arrive(args.window, args.users, rng,
+                 lambda i: main.check_out.callback(FakeCtx(gateway.user(10_000 + i), channel)), checkout_latencies)
+    return {"ops": args.users * 2, "latencies": latencies + checkout_latencies,
+            "extra": {"checkin_p99": percentile(latencies, 0.99), "checkout_p99": percentile(checkout_latencies, 0.99)}}
+
+
+async def scenario_stats(main, gateway, channel, args):
+    from benchmarks.fake_discord import FakeCtx
+    rng = random.Random(3)
+    latencies = []
+    await arrive(args.window, args.users, rng,
+                 lambda i: main.stats.callback(FakeCtx(gateway.user(10_000 + i), channel), "주간"), latencies)
+    return {"ops": args.users, "latencies": latencies, "extra": {"chart_cache": main.chart_renderer.cache.stats()}}
+
+
+async def scenario_stats_spam(main, gateway, channel, args):
+    # 명령어 check(토큰 버킷)부터 실행: 한도 초과는 on_command_error 로 안내, 통과한 동시 요청은 렌더링 하나를 공유
+    from benchmarks.fake_discord import FakeChannel, FakeCtx
+    from rate_limit import CommandRateLimited
+    rng = random.Random(6)
+    channels = [FakeChannel(100 + index, gateway.api) for index in range(20)]
+    outcomes = {"ran": 0, "rejected": 0}
+
+    async def invoke(i):
+        ctx = FakeCtx(gateway.user(10_000 + i), channels[i % len(channels)])
+        ctx.command = main.stats
+        try:
+            for check in main.stats.checks:
+                await check(ctx)
+        except CommandRateLimited as error:
+            outcomes["rejected"] += 1
+            await main.on_command_error(ctx, error)
+            return
+        outcomes["ran"] += 1
+        await main.stats.callback(ctx, "주간")
+
+    latencies = []
+    await arrive(args.window, args.users, rng,
+                 lambda i: asyncio.gather(*(invoke(i) for _ in range(5))), latencies)
+    cache = main.chart_renderer.cache.stats()
+    return {"ops": args.users * 5, "latencies": latencies,
+            "extra": {**outcomes, "coalesced": main.chart_renderer.coalesced,
+                      "renders": cache["misses"] - main.chart_renderer.coalesced}}
+
+
+async def scenario_summary_dm(main, gateway, channel, args):
+    if not args.render_charts: # DM 발송 경로만 측정
+        async def render_weekly(*_args, **_kwargs):
+            return b"\x89PNG placeholder"
+        main.chart_renderer.render_weekly = render_weekly
+    today = datetime.now(KST).date()
+    saturday = today + timedelta(days=5 - today.weekday()) # 준비한 기록과 같은 주의 토요일 08:00
+    main.get_now = lambda *_: datetime(saturday.year, saturday.month, saturday.day, 8, 0, tzinfo=KST)
+    latencies = []
+    original_send = main.send_weekly_summary
+
+    async def timed_send(uid_str, prepared):
+        start = time.perf_counter()
+        try:
+            return await original_send(uid_str, prepared)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    main.send_weekly_summary = timed_send
+    await main.weekly_summary_dm()
+    return {"ops": len(latencies), "latencies": latencies, "extra": {"resolver": dict(main.user_resolver.stats)}}
+
+
+async def scenario_weekly_reset(main, gateway, channel, args):
+    # 주간 초기화는 월요일 일괄 작업이 아니라 주가 바뀐 뒤 사용자마다 첫 기록에서 일어나는 롤오버.
+    # 사용자별 첫 퇴장 기록(이벤트 루프 쪽 지연)과, 보관소 스레드의 gzip 기록이 모두 끝날 때까지를 측정
+    now = main.guild_now(None)
+    latencies = []
+    for i in range(args.users):
+        start = time.perf_counter()
+        await main.record_study_session(10_000 + i, f"user{10_000 + i}", None, now - timedelta(minutes=30), now)
+        latencies.append(time.perf_counter() - start)
+    loop_s = sum(latencies)
+    start = time.perf_counter()
+    flush_archive = getattr(main.storage, "flush_archive", None) # JSON 백엔드만 보관소 사용
+    if flush_archive is not None:
+        await asyncio.to_thread(flush_archive)
+    archive = getattr(main.storage, "archive", None)
+    return {"ops": args.users, "latencies": latencies,
+            "extra": {"record_s": round(loop_s, 3), "archive_drain_s": round(time.perf_counter() - start, 3),
+                      "archive_bytes": archive.size if archive is not None else None,
+                      "archived_weeks": len(archive.weeks) if archive is not None else None}}
+
+
+async def scenario_voice_burst(main, gateway, channel, args):
+    from benchmarks.fake_discord import FakeChannel, FakeGuild, FakeVoiceState
+    from guild_config import GuildConfig
+    rng = random.Random(4)
+    guild = FakeGuild(2)
+    inside, outside = FakeVoiceState(FakeChannel(20, gateway.api)), FakeVoiceState()
+    main.guild_configs.configs[guild.id] = GuildConfig(voice_channel_ids=[20]) # 저장하지 않고 메모리에만 설정
+    batch_sizes = []
+    original_append_many = main.attendance_store.append_many
+
+    def counted_append_many(events):
+        batch_sizes.append(len(events))
+        return original_append_many(events)
+
+    main.attendance_store.append_many = counted_append_many
+
+    def member(i):
+        user = gateway.user(10_000 + i)
+        user.guild = guild
+        return user
+
+    async def drain():
+        while len(main.voice_tracker):
+            await asyncio.sleep(main.voice_tracker.batch_seconds / 2)
+
+    tracker_task = asyncio.create_task(main.voice_tracker.run(main.apply_voice_transitions))
+    latencies = []
+    await arrive(args.window, args.users, rng,
+                 lambda i: main.on_voice_state_update(member(i), outside, inside), latencies)
+    await drain()
+    sessions = len(main.attendance_log)
+    for i in rng.sample(range(args.users), args.users // 10): # 유예 시간 안에 재연결 → 세션 유지
+        for before, after in ((inside, outside), (outside, inside)):
+            start = time.perf_counter()
+            await main.on_voice_state_update(member(i), before, after)
+            latencies.append(time.perf_counter() - start)
+    for uid in list(main.attendance_log): # 30분~3시간 공부한 것으로 입장 시각 조정
+        main.attendance_log[uid]["입장"] -= timedelta(minutes=rng.randint(30, 180))
+    await arrive(args.window, args.users, rng,
+                 lambda i: main.on_voice_state_update(member(i), inside, outside), latencies)
+    await drain()
+    tracker_task.cancel()
+    return {"ops": len(latencies), "latencies": latencies,
+            "extra": {"sessions": sessions, "still_active": len(main.attendance_log),
+                      "attendance_writes": len(batch_sizes), "max_batch": max(batch_sizes, default=0),
+                      **main.voice_tracker.stats}}
+
+
+async def scenario_chart(main, gateway, channel, args):
+    # 워커를 미리 띄운 뒤 사용자마다 다른 데이터로 렌더링 (캐시 적중 없음), 워커 수만큼 동시에 요청
+    rng = random.Random(5)
+    today = datetime.now(KST).date()
+    days = [(today - timedelta(days=offset)).isoformat() for offset in range(6, -1, -1)]
+    await main.chart_renderer.warmup()
+    latencies, sizes = [], []
+    queue = list(range(args.users))
+
+    async def worker():
+        while queue:
+            i = queue.pop()
+            weekly_data = {day: rng.choice((0, rng.randint(10, 400))) for day in days}
+            start = time.perf_counter()
+            png_bytes = await main.chart_renderer.render_weekly(weekly_data, f"user{i}", owner=str(i))
+            latencies.append(time.perf_counter() - start)
+            sizes.append(len(png_bytes))
+
+    await asyncio.gather(*(worker() for _ in range(main.chart_renderer.max_workers)))
+    main.chart_renderer._executor.shutdown(wait=True) # 종료된 워커의 최대 RSS 를 읽기 위해 기다림
+    main.chart_renderer._executor = None
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {"ops": len(latencies), "latencies": latencies,
+            "extra": {"backend": main.chart_renderer.backend, "workers": main.chart_renderer.max_workers,
+                      "worker_peak_rss_mb": round(worker_rss, 1), "avg_png_kb": round(sum(sizes) / len(sizes) / 1024, 1)}}
+
+
+SCENARIO_FUNCS = {
+    "checkin": scenario_checkin,
+    "stats": scenario_stats,
+    "stats_spam": scenario_stats_spam,
+    "summary_dm": scenario_summary_dm,
+    "weekly_reset": scenario_weekly_reset,
+    "voice_burst": scenario_voice_burst,
+    "chart_matplotlib": scenario_chart,
+    "chart_pillow": scenario_chart,
+}
+
+
+# ------------------ 실행 ------------------
+def run_child(args):
+    # 임시 디렉터리에서 main 을 import 하고 시나리오 하나를 실행한 뒤 결과를 JSON 한 줄로 출력
+    workdir = tempfile.mkdtemp(prefix=f"bench_{args.scenario}_")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+    scale = args.time_scale
+    # 발송 속도 한도도 시간 배율만큼 높여 같은 부하를 짧은 시간에 재현
+    os.environ.setdefault("DM_GLOBAL_RATE", str(40 * scale))
+    os.environ.setdefault("DM_CREATE_RATE", str(10 * scale))
+    os.environ.setdefault("DM_PROGRESS_DIR", workdir)
+    os.environ.setdefault("VOICE_LEAVE_GRACE", str(60 / scale))
+    os.environ.setdefault("VOICE_BATCH_SECONDS", str(2 / scale))
+    os.environ.setdefault("STATS_USER_REFILL_SECONDS", str(10 / scale))
+    os.environ.setdefault("STATS_CHANNEL_REFILL_SECONDS", str(2 / scale))
+    if args.scenario.startswith("chart_"):
+        os.environ["CHART_BACKEND"] = args.scenario[len("chart_"):]
+
+    today = datetime.now(KST).date()
+    if args.scenario == "weekly_reset":
+        seed_user_data(args.users, 365, today, week_of=today - timedelta(days=7))
+    elif args.scenario in ("stats", "stats_spam", "summary_dm"):
+        seed_user_data(args.users, 7, today)
+
+    start = time.perf_counter()
+    import main
+    main.load_state() # 저장소 로드/복구 (실제 실행에서는 로그인과 동시에 진행)
+    main.state_ready.set()
+    startup = time.perf_counter() - start
+
+    from benchmarks.fake_discord import FakeAPI, FakeChannel, FakeGateway
+    api = FakeAPI(latency=args.latency / scale, jitter=args.latency / scale / 2,
+                  global_rate=50 * scale, error_rate=args.error_rate)
+    gateway = FakeGateway(api, cache_ratio=args.cache_ratio)
+    gateway.install(main.bot)
+    channel = FakeChannel(1, api)
+
+    async def go():
+        started = time.perf_counter()
+        result = await SCENARIO_FUNCS[args.scenario](main, gateway, channel, args)
+        result["elapsed"] = time.perf_counter() - started
+        return result
+
+    result = asyncio.run(go())
+    main.flush_all_data()
+    latencies = result.pop("latencies")
+    report = {
+        "scenario": args.scenario,
+        "users": args.users,
+        "time_scale": scale,
+        "ops": result["ops"],
+        "elapsed": round(result["elapsed"], 3),
+        "throughput": round(result["ops"] / result["elapsed"], 1) if result["elapsed"] else None,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+        "startup_s": round(startup, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        **api.stats(),
+        "extra": result["extra"],
+    }
+    print(RESULT_PREFIX + json.dumps(report, ensure_ascii=False, default=str))
+
+
+def run_scenario_process(name, args):
+    users, window = SCENARIOS[name]
+    command = [sys.executable, "-m", "benchmarks.run", "--child", "--scenario", name,
+               "--users", str(args.users or users), "--window", str((args.window or window) / args.time_scale),
+               "--time-scale", str(args.time_scale), "--latency", str(args.latency),
+               "--error-rate", str(args.error_rate), "--cache-ratio", str(args.cache_ratio)]
+    if args.render_charts:
+        command.append("--render-charts")
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    completed = subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    print(f"[{name}] 실행 실패 (종료 코드 {completed.returncode})\n{completed.stderr[-3000:]}")
+    return None
+
+
+def compare(results, baseline, tolerance):
+    # 지연/메모리가 tolerance 이상 늘거나 처리량이 tolerance 이상 줄면 회귀로 판단
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not result:
+            continue
+        for key, worse_if_higher in (("p99_ms", True), ("peak_rss_mb", True), ("throughput", False)):
+            old, new = base.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (worse_if_higher and change > tolerance) or (not worse_if_higher and change < -tolerance):
+                regressions.append(f"{name}.{key}: {old} → {new} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'시나리오':<14}{'ops':>8}{'경과(s)':>10}{'ops/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'RSS(MB)':>10}{'시작(s)':>9}{'API':>8}{'대기':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        if r is None:
+            print(f"{name:<14}{'실패':>8}")
+            continue
+        throughput, p50, p99 = (r[key] if r[key] is not None else "-" for key in ("throughput", "p50_ms", "p99_ms"))
+        print(f"{name:<14}{r['ops']:>8}{r['elapsed']:>10}{throughput:>10}{p50:>10}{p99:>10}"
+              f"{r['peak_rss_mb']:>10}{r['startup_s']:>9}{r['api_requests']:>8}{r['api_throttled']:>7}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="스터디 봇 오프라인 벤치마크")
+    parser.add_argument("scenarios", nargs="*", help=f"실행할 시나리오 ({', '.join(SCENARIOS)}), 생략 시 전체")
+    parser.add_argument("--users", type=int, default=None, help="시나리오 기본 인원 대신 사용할 인원")
+    parser.add_argument("--window", type=float, default=None, help="요청 도착 구간(초)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="시간 압축 배율 (API 지연/속도 한도/도착 구간)")
+    parser.add_argument("--latency", type=float, default=0.05, help="가짜 API 평균 응답 시간(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="재시도 소진 429 를 돌려줄 확률")
+    parser.add_argument("--cache-ratio", type=float, default=0.9, help="게이트웨이 캐시에 있는 사용자 비율")
+    parser.add_argument("--render-charts", action="store_true", help="summary_dm 에서 차트를 실제로 렌더링")
+    parser.add_argument("--json", help="결과를 저장할 JSON 파일")
+    parser.add_argument("--compare", help="비교할 이전 결과 JSON 파일")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="회귀로 판단할 악화 비율")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return 0
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"알 수 없는 시나리오: {', '.join(unknown)}")
+
+    results = {}
+    for name in args.scenarios or list(SCENARIOS):
+        print(f"[{name}] 실행 중...", flush=True)
+        results[name] = run_scenario_process(name, args)
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("성능 회귀:\n  " + "\n  ".join(regressions))
+            return 1
+        print("이전 결과 대비 회귀 없음")
+    return 0 if all(results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# ------------------ 차트 에셋 (폰트 목록 캐시 + 고정 스타일) ------------------
+# 새 컨테이너에서는 matplotlib 가 첫 import 때 시스템 폰트를 모두 훑어 폰트 목록 캐시를 만들고,
+# 워커마다 NanumGothic.ttf 를 다시 등록하느라 첫 !통계 가 몇 초씩 걸립니다.
+# 배포 빌드 단계에서 `python chart_assets.py build` 로 아래 파일을 미리 만들어 두면 워커는 읽기만 합니다.
+#   - chart_assets/mplconfig/fontlist-v*.json : matplotlib 기본 폰트 + NanumGothic 만 담은 폰트 목록 (MPLCONFIGDIR)
+#   - chart_assets/manifest.json              : 빌드한 matplotlib 버전, 폰트/스타일 파일 크기·해시
+#   - chart_assets/study.mplstyle             : 저장소에 포함된 고정 스타일 (빌드 대상 아님)
+# 시작 시 validate() 로 manifest 와 실제 파일을 비교하고, 맞지 않는 항목은 예전 방식(실행 중 폰트 등록,
+# FALLBACK_RC)으로 대신합니다. 폰트 목록이 없거나 오래되면 matplotlib 가 같은 위치에 다시 만듭니다.
+import hashlib
+import json
+import os
+import sys
+from importlib import metadata
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chart_assets')
+MPLCONFIG_DIR = os.path.join(ASSETS_DIR, 'mplconfig')
+MANIFEST_FILE = os.path.join(ASSETS_DIR, 'manifest.json')
+STYLE_FILE = os.path.join(ASSETS_DIR, 'study.mplstyle')
+FONT_PATH = 'NanumGothic.ttf' # 프로젝트 루트에 업로드된 한글 폰트
+FONT_NAME = 'NanumGothic'
+
+# study.mplstyle 을 읽을 수 없을 때 쓰는 같은 설정
+FALLBACK_RC = {
+    "font.family": [FONT_NAME, "DejaVu Sans"],
+    "font.size": 10,
+    "axes.unicode_minus": False,
+    "axes.titlesize": 16,
+    "axes.labelsize": 12,
+    "xtick.labelsize": 10,
+    "ytick.labelsize": 10,
+    "figure.dpi": 100,
+    "savefig.dpi": 100,
+    "savefig.format": "png",
+}
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _matplotlib_version():
+    try:
+        return metadata.version("matplotlib") # matplotlib 를 import 하지 않고 확인
+    except metadata.PackageNotFoundError:
+        return None
+
+
+# ------------------ 검증 (봇 프로세스, matplotlib import 없음) ------------------
+def validate():
+    # {"fontlist": bool, "style": bool, "font": bool, "problems": [...]} : 쓸 수 있는 에셋과 문제 목록
+    status = {"fontlist": False, "style": False, "font": os.path.exists(FONT_PATH), "problems": []}
+    if not status["font"]:
+        status["problems"].append(f"폰트 파일({FONT_PATH}) 없음 → 기본 폰트 사용")
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+        status["problems"].append("manifest 없음 → `python chart_assets.py build` 필요")
+
+    if os.path.exists(STYLE_FILE):
+        status["style"] = manifest is None or manifest.get("style_sha256") == _file_digest(STYLE_FILE)
+        if not status["style"]:
+            status["problems"].append("스타일 파일이 빌드 이후 바뀜 → 내장 설정 사용")
+    else:
+        status["problems"].append("스타일 파일 없음 → 내장 설정 사용")
+
+    if manifest is not None:
+        fontlist = os.path.join(ASSETS_DIR, manifest.get("fontlist", ""))
+        font = manifest.get("font")
+        if manifest.get("matplotlib") != _matplotlib_version():
+            status["problems"].append(f"matplotlib {manifest.get('matplotlib')} 용 폰트 목록 → 다시 생성")
+        elif not os.path.isfile(fontlist):
+            status["problems"].append("폰트 목록 파일 없음 → 다시 생성")
+        elif status["font"] and (font is None or font.get("size") != os.path.getsize(FONT_PATH)):
+            status["problems"].append("폰트 파일이 빌드 이후 바뀜 → 실행 중 등록")
+        else:
+            status["fontlist"] = True
+    return status
+
+
+def describe(status):
+    ready = [name for name in ("fontlist", "style", "font") if status[name]]
+    text = f"차트 에셋: {', '.join(ready) or '없음'} 사용"
+    return text + "".join(f"\n  - {problem}" for problem in status["problems"])
+
+
+# ------------------ 적용 (차트 워커 프로세스) ------------------
+def apply(status):
+    # matplotlib import 전에 호출. 미리 만든 폰트 목록/스타일을 쓰고, 없으면 예전 방식으로 대신함
+    os.environ.setdefault("MPLCONFIGDIR", MPLCONFIG_DIR) # 폰트 목록이 없으면 matplotlib 가 여기에 만듦
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import font_manager as fm, style
+
+    if status["style"]:
+        style.use(STYLE_FILE)
+    else:
+        matplotlib.rcParams.update(FALLBACK_RC)
+    if not status["font"]:
+        matplotlib.rcParams["font.family"] = ["DejaVu Sans"]
+    elif not any(font.name == FONT_NAME for font in fm.fontManager.ttflist):
+        fm.fontManager.addfont(FONT_PATH) # 미리 만든 목록에 없음 → 실행 중 등록
+
+
+# ------------------ 빌드 (배포 시 1회) ------------------
+def build():
+    # matplotlib 기본 폰트 + NanumGothic 만 담은 폰트 목록을 만들어 chart_assets/mplconfig 에 저장
+    os.makedirs(MPLCONFIG_DIR, exist_ok=True)
+    os.environ["MPLCONFIGDIR"] = MPLCONFIG_DIR
+    import matplotlib
+    from matplotlib import font_manager as fm
+
+    manager = fm.fontManager
+    data_path = matplotlib.get_data_path()
+    # 시스템 폰트는 컨테이너마다 다르므로 제외 (차트는 NanumGothic, 없으면 DejaVu Sans 만 사용)
+    manager.ttflist = [font for font in manager.ttflist if font.fname.startswith(data_path)]
+    manager.afmlist = [font for font in manager.afmlist if font.fname.startswith(data_path)]
+    font = None
+    if os.path.exists(FONT_PATH):
+        manager.addfont(os.path.abspath(FONT_PATH))
+        font = {"path": FONT_PATH, "size": os.path.getsize(FONT_PATH), "sha256": _file_digest(FONT_PATH)}
+    fontlist = f"fontlist-v{fm.FontManager.__version__}.json"
+    fm.json_dump(manager, os.path.join(MPLCONFIG_DIR, fontlist))
+
+    manifest = {
+        "matplotlib": matplotlib.__version__,
+        "fontlist": os.path.join('mplconfig', fontlist),
+        "font": font,
+        "style_sha256": _file_digest(STYLE_FILE),
+    }
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    # 사용법: python chart_assets.py build : 폰트 목록/manifest 생성 (배포 빌드 단계)
+    #         python chart_assets.py check : 현재 에셋 상태 확인
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        built = build()
+        print(f"차트 에셋 생성 완료: matplotlib {built['matplotlib']}, 폰트 {'NanumGothic' if built['font'] else '없음'}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "check":
+        print(describe(validate()))
+    else:
+        print("사용법: python chart_assets.py build\n"
+              "        python chart_assets.py check")
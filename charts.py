@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+# ------------------ 차트 렌더링 서비스 ------------------
+# matplotlib 렌더링은 CPU 를 오래 점유하므로 이벤트 루프가 아닌 별도 프로세스 풀에서 실행합니다.
+# - pyplot 전역 상태를 쓰지 않고 객체지향 Figure API + Agg 백엔드만 사용
+# - 워커 프로세스는 시작 시 한 번만 미리 만든 폰트 목록/고정 스타일을 적용 (chart_assets.py, warm worker)
+# - 결과는 PNG 바이트로 반환 → discord.File(io.BytesIO(...)) 로 바로 전송, 임시 파일 없음
+# - 동시에 대기할 수 있는 요청 수를 제한해 과부하 시 호출 측에서 기다리거나 포기하도록 함
+# - 같은 캐시 키의 렌더링이 이미 진행 중이면 새로 그리지 않고 그 결과를 함께 기다림 (요청 합치기)
+# - CHART_BACKEND=pillow 이면 같은 배치의 차트를 Pillow 로 직접 그림 (pillow_charts.py, 더 빠르고 가벼움)
+import asyncio
+import hashlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import chart_assets
+from metrics import registry as metrics
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_MAX_QUEUE = int(os.getenv("CHART_MAX_QUEUE", "32")) # 실행 중 + 대기 중 렌더링 요청 최대 수
+CHART_CACHE_BYTES = int(os.getenv("CHART_CACHE_BYTES", str(32 * 1024 * 1024))) # 렌더링 결과 캐시 최대 크기
+CHART_BACKEND = os.getenv("CHART_BACKEND", "matplotlib").lower() # matplotlib | pillow
+
+# --- 차트 종류별 스타일 ---
+CHART_STYLES = {
+    "stats": {"color": "skyblue", "title": "{username}님의 이번 주 공부 시간"},
+    "summary": {"color": "mediumpurple", "title": "{username}님의 이번 주 공부 시간 요약"},
+}
+
+
+class ChartRendererBusy(Exception):
+    """렌더링 대기열이 가득 차 요청을 받을 수 없을 때 발생."""
+
+
+# ------------------ 워커 프로세스 측 ------------------
+def _init_worker(asset_status, backend="matplotlib"):
+    # 워커 프로세스 시작 시 한 번만 실행: Agg 백엔드 고정 + 폰트 목록/스타일 적용 후 렌더링에 쓰는 모듈을 미리 import
+    # (forkserver/spawn 워커는 부모가 import 한 모듈을 물려받지 않으므로 첫 요청이 import 비용을 내지 않도록)
+    if backend != "matplotlib":
+        import pillow_charts # noqa: F401
+        return
+    try:
+        chart_assets.apply(asset_status)
+        import matplotlib.backends.backend_agg # noqa: F401
+        import matplotlib.figure # noqa: F401
+    except Exception as e:
+        print(f"폰트 설정 중 오류 발생: {e}")
+
+
+def resolve_backend(backend):
+    # 백엔드 이름 -> (백엔드 이름, 주간 차트 함수, 랭킹 차트 함수). Pillow 가 없으면 matplotlib 로 대체
+    if backend == "pillow":
+        if importlib.util.find_spec("PIL") is not None:
+            import pillow_charts
+            return "pillow", pillow_charts.render_weekly_chart, pillow_charts.render_leaderboard_chart
+        print("Pillow 가 설치되어 있지 않아 matplotlib 차트 백엔드를 사용합니다.")
+    elif backend != "matplotlib":
+        print(f"알 수 없는 CHART_BACKEND '{backend}' → matplotlib 사용")
+    return "matplotlib", render_weekly_chart, render_leaderboard_chart
+
+
+def _warmup(backend="matplotlib"):
+    # 워커를 미리 띄우고 차트 종류마다 한 번씩 그려 둠 (글꼴 로드/글리프 캐시 → 첫 요청도 평소 속도)
+    _, render_weekly, _ = resolve_backend(backend)
+    days = [f"2025-01-0{day}" for day in range(1, 8)]
+    for style in CHART_STYLES:
+        render_weekly(days, [0, 30, 60, 90, 120, 150, 180], "준비", style)
+    return os.getpid()
+
+
+def render_weekly_chart(days, values, username, style="stats"):
+    # 주간 막대 차트를 그려 PNG 바이트로 반환 (워커 프로세스에서 실행)
+    from matplotlib.figure import Figure
+
+    chart_style = CHART_STYLES[style]
+    # 데이터가 없을 경우 max() 오류 방지
+    if not values:
+        max_value = 0
+    else:
+        max_value = max(values) if max(values) > 0 else 60 # 최소 y축 높이 확보
+
+    fig = Figure(figsize=(10, 5)) # pyplot 전역 상태를 쓰지 않음
+    ax = fig.subplots()
+    bars = ax.bar(days, values, color=chart_style["color"])
+    ax.set_title(chart_style["title"].format(username=username)) # 글자 크기는 study.mplstyle
+    ax.set_xlabel("날짜")
+    ax.set_ylabel("공부 시간 (분)")
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right') # 라벨 회전 및 정렬
+    ax.set_yticks(range(0, max_value + 60, 60)) # y축 눈금 간격 조정 (+60으로 상단 여유)
+    ax.grid(axis='y', linestyle='--', alpha=0.7) # 가로선 추가
+
+    # 막대 위에 값 표시
+    for bar in bars:
+        yval = bar.get_height()
+        if yval > 0: # 0 이상인 값만 표시
+            ax.text(bar.get_x() + bar.get_width() / 2.0, yval, int(yval), va='bottom', ha='center', fontsize=10)
+
+    fig.tight_layout() # 레이아웃 자동 조정
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def render_leaderboard_chart(names, values, title):
+    # 랭킹 가로 막대 차트 (1위가 맨 위)
+    from matplotlib.figure import Figure
+
+    height = max(3, 0.5 * len(names) + 1.5)
+    fig = Figure(figsize=(8, height))
+    ax = fig.subplots()
+    labels = [f"{rank}. {name}" for rank, name in enumerate(names, 1)]
+    bars = ax.barh(labels[::-1], values[::-1], color='goldenrod')
+    ax.set_title(title)
+    ax.set_xlabel("공부 시간 (분)")
+    ax.grid(axis='x', linestyle='--', alpha=0.7)
+    for bar in bars:
+        xval = bar.get_width()
+        ax.text(xval, bar.get_y() + bar.get_height() / 2.0, f" {int(xval)}", va='center', ha='left', fontsize=10)
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+# ------------------ 렌더링 결과 캐시 ------------------
+class ChartCache:
+    """렌더링된 PNG 를 바이트 크기 기준으로 보관하는 LRU 캐시.
+
+    키는 (사용자, 정렬된 주간 데이터, 이름, 스타일)의 해시이므로 데이터가 바뀌면 자연히 다른 키가 되고,
+    invalidate()/clear() 로 더 이상 쓰이지 않을 항목을 즉시 비웁니다.
+    """
+
+    def __init__(self, max_bytes=CHART_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # 키 -> PNG 바이트 (뒤쪽일수록 최근 사용)
+        self._keys_by_owner = {}      # uid_str -> 해당 사용자 키 집합 (무효화용)
+        self._owner_by_key = {}       # 키 -> uid_str
+
+    @staticmethod
+    def make_key(owner, data, username, style):
+        # data: {날짜: 분} 이면 날짜순으로 정렬해 사용, 목록이면 그대로 사용
+        items = sorted(data.items()) if isinstance(data, dict) else list(data)
+        payload = json.dumps([owner, items, username, style], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        png_bytes = self._entries.get(key)
+        if png_bytes is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return png_bytes
+
+    def put(self, owner, key, png_bytes):
+        if len(png_bytes) > self.max_bytes:
+            return
+        if key in self._entries:
+            self.current_bytes -= len(self._entries.pop(key))
+        self._entries[key] = png_bytes
+        self.current_bytes += len(png_bytes)
+        self._keys_by_owner.setdefault(owner, set()).add(key)
+        self._owner_by_key[key] = owner
+        # 용량 초과 시 가장 오래 쓰지 않은 항목부터 제거
+        while self.current_bytes > self.max_bytes:
+            old_key, old_bytes = self._entries.popitem(last=False)
+            self.current_bytes -= len(old_bytes)
+            self._discard_owner_key(old_key)
+
+    def _discard_owner_key(self, key):
+        owner = self._owner_by_key.pop(key, None)
+        keys = self._keys_by_owner.get(owner)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_owner[owner]
+
+    def invalidate(self, owner):
+        # 해당 사용자의 주간 데이터가 바뀌었을 때 호출 (퇴장 기록 등)
+        for key in self._keys_by_owner.pop(owner, ()):
+            self._owner_by_key.pop(key, None)
+            png_bytes = self._entries.pop(key, None)
+            if png_bytes is not None:
+                self.current_bytes -= len(png_bytes)
+
+    def clear(self):
+        # 주간 초기화 시 호출
+        self._entries.clear()
+        self._keys_by_owner.clear()
+        self._owner_by_key.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# ------------------ 이벤트 루프 측 ------------------
+class ChartRenderer:
+    def __init__(self, max_workers=CHART_WORKERS, max_queue=CHART_MAX_QUEUE, cache=None, backend=CHART_BACKEND):
+        self.backend, self._render_weekly_chart, self._render_leaderboard_chart = resolve_backend(backend)
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.cache = cache if cache is not None else ChartCache()
+        self._executor = None
+        self._slots = None # asyncio.Semaphore: 동시에 접수 가능한 요청 수 (backpressure)
+        self.asset_status = None # chart_assets.validate() 결과 (워커 시작 전 한 번)
+        self._in_flight = {}     # 캐시 키 -> 진행 중인 렌더링 Task (같은 요청끼리 공유)
+        self.coalesced = 0       # 진행 중인 렌더링에 합쳐진 요청 수
+
+    def start(self):
+        if self._executor is None:
+            # 봇 프로세스에는 이미 여러 스레드(상태 로드, write-behind 기록, 출석 저장소 등)가 있어
+            # fork 하면 다른 스레드가 잡고 있던 잠금이 자식에서 영원히 잠긴 채 복사될 수 있으므로 forkserver 사용.
+            # forkserver 는 스레드 없는 서버 프로세스(이 모듈을 미리 import)에서 워커를 fork 함.
+            # 워커는 spawn 처럼 main.py 를 __mp_main__ 으로 import 하지만, main.py 는 import 시 상태 로드나
+            # 스레드/서버 시작을 하지 않으므로(load_state/run_bot 에서 함) 부작용이 없음. forkserver 가 없는 플랫폼은 spawn
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["charts"])
+            else:
+                context = multiprocessing.get_context("spawn")
+            if self.asset_status is None:
+                self.asset_status = chart_assets.validate()
+                print(chart_assets.describe(self.asset_status))
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker, initargs=(self.asset_status, self.backend))
+            self._slots = asyncio.Semaphore(self.max_queue)
+
+    async def warmup(self):
+        # 모든 워커를 미리 띄워 첫 !통계 요청이 프로세스 생성 비용을 내지 않도록 함
+        self.start()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _warmup, self.backend) for _ in range(self.max_workers)))
+
+    async def _render(self, func, args, timeout=None, owner=None, cache_parts=None):
+        # 공통 렌더링 경로: 캐시 확인 → 진행 중인 같은 렌더링에 합류 → 대기열 자리 확보(backpressure)
+        # → 프로세스 풀 실행 → 캐시 저장
+        if owner is None:
+            return await self._render_uncached(func, args, timeout, None, None)
+        cache_key = self.cache.make_key(owner, *cache_parts)
+        png_bytes = self.cache.get(cache_key)
+        if png_bytes is not None:
+            return png_bytes
+
+        task = self._in_flight.get(cache_key)
+        if task is not None:
+            self.coalesced += 1
+            metrics.inc("bot_chart_coalesced_total", chart=func.__name__)
+        else:
+            task = asyncio.ensure_future(self._render_uncached(func, args, timeout, owner, cache_key))
+            self._in_flight[cache_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(cache_key, None))
+        # shield: 먼저 요청한 쪽이 취소되어도 함께 기다리는 요청을 위해 렌더링은 계속 진행
+        return await asyncio.shield(task)
+
+    async def _render_uncached(self, func, args, timeout, owner, cache_key):
+        self.start()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise ChartRendererBusy(f"차트 렌더링 대기열이 가득 찼습니다 ({self.max_queue}건)")
+        try:
+            loop = asyncio.get_running_loop()
+            with metrics.timer("bot_chart_render_seconds", chart=func.__name__, backend=self.backend):
+                png_bytes = await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._slots.release()
+        if cache_key is not None:
+            self.cache.put(owner, cache_key, png_bytes)
+        return png_bytes
+
+    async def render_weekly(self, weekly_data, username, style="stats", timeout=None, owner=None):
+        # weekly_data: {날짜: 분}. timeout 초 안에 대기열 자리가 나지 않으면 ChartRendererBusy
+        # owner(uid_str)가 주어지면 캐시를 사용하고, 같은 데이터면 다시 렌더링하지 않음
+        sorted_weekly_data = dict(sorted(weekly_data.items())) # 날짜 기준으로 정렬
+        days = list(sorted_weekly_data.keys())
+        values = list(sorted_weekly_data.values())
+        return await self._render(self._render_weekly_chart, (days, values, username, style), timeout=timeout,
+                                  owner=owner, cache_parts=(weekly_data, username, style))
+
+    async def render_leaderboard(self, entries, title, timeout=None):
+        # entries: [(이름, 분), ...] 순위 순. 같은 순위표는 캐시에서 재사용
+        names = [name for name, _ in entries]
+        values = [minutes for _, minutes in entries]
+        return await self._render(self._render_leaderboard_chart, (names, values, title), timeout=timeout,
+                                  owner="__leaderboard__", cache_parts=(entries, title, "leaderboard"))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
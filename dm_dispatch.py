@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+# ------------------ 대량 DM 발송기 ------------------
+# 주간 요약처럼 많은 사용자에게 DM 을 보낼 때 사용합니다.
+# - 렌더링(prepare)과 발송(send)을 파이프라인으로 분리: 앞 사용자를 보내는 동안 다음 사용자 차트 준비
+# - 제한된 수의 워커가 동시에 발송하고, 토큰 버킷으로 전역 발송 속도와 DM 채널 생성 속도를 제한
+# - 429/5xx 응답은 지수 백오프(+지터)로 재시도, Forbidden/NotFound 는 재시도하지 않음
+# - 사용자별 결과를 진행 파일(append-only, 한 줄씩 fsync)에 기록해 중간에 재시작해도 이미 보낸 사용자에게 다시 보내지 않음.
+#   sent(발송 완료)/undeliverable(DM 차단, 탈퇴 등)은 건너뛰고, 재시도를 모두 소진한 failed 는 재시작 시 다시 보냄.
+#   모든 사용자를 처리하면 완료 표시 줄을 남겨, 재시작 후 아직 끝나지 않은 회차만 이어서 보낼 수 있게 함
+# 같은 시각에 여러 서버 채널로 보내는 공지(저녁 스터디 알림)는 ChannelBroadcaster 를 사용합니다.
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import discord
+
+DM_CONCURRENCY = int(os.getenv("DM_CONCURRENCY", "8"))
+DM_GLOBAL_RATE = float(os.getenv("DM_GLOBAL_RATE", "40"))   # 초당 최대 요청 수 (디스코드 전역 한도 50/s 보다 낮게)
+DM_CREATE_RATE = float(os.getenv("DM_CREATE_RATE", "10"))   # 초당 DM 채널 생성 수 (POST /users/@me/channels 버킷)
+DM_MAX_RETRIES = int(os.getenv("DM_MAX_RETRIES", "5"))
+DM_PREPARE_CONCURRENCY = int(os.getenv("DM_PREPARE_CONCURRENCY", "4")) # 동시에 렌더링 중인 DM 수
+DM_PROGRESS_DIR = os.getenv("DM_PROGRESS_DIR", ".")
+DM_PROGRESS_FSYNC = os.getenv("DM_PROGRESS_FSYNC", "1") != "0" # 0 이면 fsync 생략 (테스트/벤치마크용)
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "4"))
+BROADCAST_JITTER = float(os.getenv("BROADCAST_JITTER", "10")) # 같은 시각 공지를 흩뿌리는 최대 구간(초)
+
+
+class TokenBucket:
+    """초당 rate 개의 토큰이 채워지는 비동기 토큰 버킷."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock: # 대기 순서를 보장해 한 워커가 계속 새치기하지 않도록 함
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds):
+        # 서버가 429 로 알려준 대기 시간만큼 버킷을 비워 다른 워커도 함께 쉬도록 함
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+def is_retryable(error):
+    return isinstance(error, discord.HTTPException) and (error.status == 429 or error.status >= 500)
+
+
+def get_retry_after(error, default=1.0):
+    # 429 응답의 Retry-After 헤더(초). discord.py 내부 재시도를 모두 소진한 경우에만 여기까지 옴
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+class DMProgressLog:
+    """대량 DM 진행 기록 (append-only JSON 줄).
+
+    사용자 결과 한 줄({"key", "result"})을 덧붙이고 fsync 한 뒤에야 다음 사용자로 넘어가므로
+    종료/강제 종료 직전에 보낸 DM 도 재시작 후 다시 보내지 않습니다. 같은 키는 마지막 줄이 우선하며,
+    모든 사용자를 처리하면 {"complete": true} 줄을 남깁니다.
+    """
+
+    def __init__(self, path, fsync=DM_PROGRESS_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        self._lock = threading.Lock() # 여러 발송 워커가 스레드에서 동시에 기록
+
+    def load(self):
+        # (키 -> 결과, 완료 여부). 기록 도중 종료되어 잘린 마지막 줄은 무시
+        done, complete = {}, False
+        if not os.path.exists(self.path):
+            return done, complete
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"경고: DM 진행 파일 {os.path.basename(self.path)} {line_no}번째 줄이 손상되어 건너뜁니다.")
+                    continue
+                if entry.get("complete"):
+                    complete = True
+                elif "key" in entry:
+                    done[entry["key"]] = entry["result"]
+        return done, complete
+
+    def _write(self, entry):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def record(self, key, result):
+        self._write({"key": key, "result": result})
+
+    def mark_complete(self):
+        self._write({"complete": True})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def progress_path(run_id, progress_dir=DM_PROGRESS_DIR):
+    return os.path.join(progress_dir, f"dm_progress_{run_id}.jsonl")
+
+
+def is_run_complete(run_id, progress_dir=DM_PROGRESS_DIR):
+    # 해당 회차가 모든 사용자를 처리했는지 (진행 파일이 없으면 아직 시작하지 않은 회차)
+    try:
+        return DMProgressLog(progress_path(run_id, progress_dir)).load()[1]
+    except OSError as e:
+        print(f"Error reading DM progress for {run_id}: {e}")
+        return False
+
+
+class BulkDMDispatcher:
+    """run_id 단위로 진행 상황을 저장하는 대량 DM 발송기.
+
+    prepare(key, item) 은 보낼 내용을 만드는 코루틴(예: 차트 렌더링)이며 None 을 반환하면 건너뜁니다.
+    send(key, prepared) 는 실제 발송 코루틴입니다.
+    needs_dm_channel(key) 는 아직 DM 채널이 없어 발송 시 채널 생성 요청이 함께 나가는지 알려 주며,
+    이때만 채널 생성 버킷을 씁니다 (None 이면 항상 생성한다고 보고 제한).
+    """
+
+    def __init__(self, run_id, concurrency=DM_CONCURRENCY, global_rate=DM_GLOBAL_RATE,
+                 create_rate=DM_CREATE_RATE, max_retries=DM_MAX_RETRIES, progress_dir=DM_PROGRESS_DIR,
+                 prepare_concurrency=DM_PREPARE_CONCURRENCY, needs_dm_channel=None):
+        self.run_id = run_id
+        self.needs_dm_channel = needs_dm_channel
+        self.concurrency = concurrency
+        self.prepare_concurrency = prepare_concurrency
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate)
+        self.create_bucket = TokenBucket(create_rate)
+        self.progress_dir = progress_dir
+        self.progress = DMProgressLog(progress_path(run_id, progress_dir))
+        self.stats = {"sent": 0, "failed": 0, "undeliverable": 0, "skipped": 0, "resumed": 0, "resent": 0,
+                      "retries": 0, "rate_limited": 0}
+
+    def _cleanup_old_progress(self):
+        # 다른 회차의 진행 파일은 더 이상 필요 없으므로 삭제
+        current = os.path.basename(self.progress.path)
+        for name in os.listdir(self.progress_dir):
+            if name.startswith("dm_progress_") and name.endswith((".json", ".jsonl")) and name != current:
+                try:
+                    os.remove(os.path.join(self.progress_dir, name))
+                except OSError as e:
+                    print(f"Error removing old DM progress file {name}: {e}")
+
+    async def _send_with_retry(self, key, prepared, send):
+        for attempt in range(self.max_retries + 1):
+            await self.global_bucket.acquire()
+            if self.needs_dm_channel is None or self.needs_dm_channel(key):
+                await self.create_bucket.acquire() # 이미 열린 DM 채널로 보내는 경우는 채널 생성 한도와 무관
+            try:
+                await send(key, prepared)
+                return "sent"
+            except (discord.Forbidden, discord.NotFound) as e:
+                print(f"DM 발송 불가 ({type(e).__name__}): {key}")
+                return "undeliverable" # 다시 보내도 실패하므로 재시작 시에도 건너뜀
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    print(f"DM 발송 실패: {key}: {e}")
+                    return "failed"
+                self.stats["retries"] += 1
+                if e.status == 429:
+                    self.stats["rate_limited"] += 1
+                    delay = get_retry_after(e)
+                    self.global_bucket.penalize(delay)
+                else:
+                    delay = min(60, 2 ** attempt) # 5xx: 지수 백오프
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        return "failed"
+
+    async def run(self, items, prepare, send):
+        # items: (key, item) 반복자. key 는 문자열(사용자 ID)
+        started = time.monotonic()
+        try:
+            done, _ = self.progress.load()
+        except OSError as e:
+            print(f"Error loading DM progress for {self.run_id}: {e}")
+            done = {}
+        self._cleanup_old_progress()
+
+        queue = asyncio.Queue(maxsize=self.concurrency * 2) # 준비된 메시지 대기열 (렌더링이 너무 앞서가지 않도록 제한)
+
+        render_slots = asyncio.Semaphore(self.prepare_concurrency)
+
+        async def prepare_one(key, item):
+            try:
+                prepared = await prepare(key, item)
+            except Exception as e:
+                print(f"DM 내용 준비 실패: {key}: {e}")
+                self.stats["failed"] += 1
+                return
+            finally:
+                render_slots.release()
+            if prepared is None:
+                self.stats["skipped"] += 1
+                return
+            await queue.put((key, prepared))
+
+        async def producer():
+            pending = set()
+            for key, item in items:
+                if done.get(key) in ("sent", "undeliverable"):
+                    self.stats["resumed"] += 1
+                    continue
+                if key in done: # 이전 실행에서 재시도를 모두 소진한 사용자 → 다시 발송
+                    self.stats["resent"] += 1
+                await render_slots.acquire() # 동시에 준비 중인 항목 수 제한
+                task = asyncio.create_task(prepare_one(key, item))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+            for _ in range(self.concurrency):
+                await queue.put(None) # 워커 종료 신호
+
+        async def worker():
+            while True:
+                job = await queue.get()
+                if job is None:
+                    return
+                key, prepared = job
+                result = await self._send_with_retry(key, prepared, send)
+                self.stats[result] += 1
+                # 디스크에 기록한 뒤에 다음 사용자로 (fsync 는 스레드에서)
+                await asyncio.to_thread(self.progress.record, key, result)
+
+        try:
+            await asyncio.gather(producer(), *(worker() for _ in range(self.concurrency)))
+            await asyncio.to_thread(self.progress.mark_complete)
+        finally:
+            self.progress.close()
+
+        elapsed = time.monotonic() - started
+        self.stats["elapsed"] = round(elapsed, 2)
+        self.stats["throughput"] = round(self.stats["sent"] / elapsed, 2) if elapsed > 0 else 0.0
+        return self.stats
+
+
+class ChannelBroadcaster:
+    """여러 채널에 같은 시각의 공지를 보내는 발송기.
+
+    resolve(channel_id) 로 찾은 채널 객체를 캐시해 매번 조회하지 않고,
+    broadcast() 는 미리 만든 (키, 채널, 내용, 예정 시각) 목록을 제한된 동시성으로 보냅니다.
+    발송 시작 시각은 [0, min(jitter, 건수/전역 속도)) 구간에 흩뿌려 정각에 요청이 몰리지 않게 합니다.
+    """
+
+    def __init__(self, get_channel, fetch_channel, concurrency=BROADCAST_CONCURRENCY, jitter=BROADCAST_JITTER,
+                 global_rate=DM_GLOBAL_RATE, max_retries=DM_MAX_RETRIES):
+        self.get_channel = get_channel     # 게이트웨이 캐시 조회 (동기)
+        self.fetch_channel = fetch_channel # 캐시에 없을 때 API 조회 (코루틴)
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate)
+        self.channels = {}                 # channel_id -> 채널 객체
+        self.stats = {}
+
+    async def resolve(self, channel_id):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.get_channel(channel_id)
+            if channel is None:
+                try:
+                    channel = await self.fetch_channel(channel_id)
+                except (discord.NotFound, discord.Forbidden):
+                    return None
+            self.channels[channel_id] = channel
+        return channel
+
+    def invalidate(self, channel_id):
+        self.channels.pop(channel_id, None)
+
+    async def _send_with_retry(self, key, channel, content):
+        for attempt in range(self.max_retries + 1):
+            await self.global_bucket.acquire()
+            try:
+                await channel.send(content)
+                return "sent"
+            except (discord.Forbidden, discord.NotFound) as e:
+                print(f"공지 발송 실패 ({type(e).__name__}): {key} / 채널 {channel.id}")
+                self.invalidate(channel.id) # 삭제되었거나 권한이 바뀐 채널은 다음에 다시 조회
+                return "failed"
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    print(f"공지 발송 실패: {key}: {e}")
+                    return "failed"
+                self.stats["retries"] += 1
+                if e.status == 429:
+                    self.stats["rate_limited"] += 1
+                    delay = get_retry_after(e)
+                    self.global_bucket.penalize(delay)
+                else:
+                    delay = min(60, 2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        return "failed"
+
+    async def broadcast(self, targets):
+        # targets: [(key, channel, content, scheduled_at(epoch 초))]
+        # 반환: 발송 결과와 예정 시각 → 전송 완료까지의 지연(초) 목록
+        started = time.monotonic()
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "rate_limited": 0, "latencies": []}
+        spread = min(self.jitter, len(targets) / self.global_bucket.rate)
+        queue = asyncio.Queue()
+        for offset, target in sorted(((random.uniform(0, spread), target) for target in targets),
+                                     key=lambda item: item[0]):
+            queue.put_nowait((offset, target))
+
+        async def worker():
+            while not queue.empty():
+                offset, (key, channel, content, scheduled_at) = queue.get_nowait()
+                wait = started + offset - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                result = await self._send_with_retry(key, channel, content)
+                self.stats[result] += 1
+                if result == "sent":
+                    self.stats["latencies"].append(max(0.0, time.time() - scheduled_at))
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(targets)))))
+        self.stats["elapsed"] = round(time.monotonic() - started, 2)
+        return self.stats
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# ------------------ 서버(길드)별 설정 ------------------
+# 알림 채널, 시간대, 저녁 알림 시각, 자동 퇴장 기준, 알림 요일, 자동 기록할 음성 채널을 서버마다 따로 둡니다.
+# 설정은 시작 시 한 번 읽어 메모리에 두고, !설정 으로 바뀔 때만 저장합니다.
+# 저장(set/set_home_guild)은 fsync 나 SQLite 잠금 대기가 있으므로 main.py 는 asyncio.to_thread 로 호출합니다.
+#   - 단일 프로세스: guild_config.json (원자적 쓰기)
+#   - 샤드 모드: 공유 SQLite 의 guild_config 테이블
+#
+# 공부 기록은 서버별로 나눠 저장합니다. 저장소 키는 "서버ID:사용자ID" 이며,
+# 기존 데이터와의 호환을 위해 원래 봇이 쓰던 서버(home guild)와 DM 은 접두어 없이 사용자 ID 만 씁니다.
+import json
+import os
+import threading
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from persistence import atomic_write_text
+from shared_state import connect_shared
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Seoul")
+DEFAULT_REMINDER_TIME = os.getenv("REMINDER_TIME", "20:00")
+DEFAULT_AUTO_CHECKOUT_MINUTES = 360 # 6시간
+DEFAULT_REMINDER_WEEKDAYS = (0, 1, 2, 3, 4) # 월~금
+WEEKDAY_NAMES = "월화수목금토일"
+
+
+def parse_reminder_time(text):
+    # "20:00" → datetime.time (잘못된 형식이면 ValueError)
+    hour, minute = text.split(":")
+    return time(hour=int(hour), minute=int(minute))
+
+
+def parse_weekdays(text):
+    # "월화수목금" → (0, 1, 2, 3, 4)
+    weekdays = sorted({WEEKDAY_NAMES.index(ch) for ch in text if ch in WEEKDAY_NAMES})
+    if not weekdays:
+        raise ValueError(f"요일을 찾을 수 없습니다: {text}")
+    return tuple(weekdays)
+
+
+class GuildConfig:
+    __slots__ = ("channel_id", "timezone", "reminder_time", "auto_checkout_minutes", "reminder_weekdays",
+                 "voice_channel_ids", "_tz")
+
+    def __init__(self, channel_id=None, timezone=DEFAULT_TIMEZONE, reminder_time=DEFAULT_REMINDER_TIME,
+                 auto_checkout_minutes=DEFAULT_AUTO_CHECKOUT_MINUTES, reminder_weekdays=DEFAULT_REMINDER_WEEKDAYS,
+                 voice_channel_ids=()):
+        self.channel_id = channel_id
+        self.timezone = timezone
+        self.reminder_time = reminder_time
+        self.auto_checkout_minutes = auto_checkout_minutes
+        self.reminder_weekdays = tuple(reminder_weekdays)
+        self.voice_channel_ids = frozenset(voice_channel_ids) # 비어 있으면 음성 채널 자동 기록 끔
+        self._tz = None
+
+    @property
+    def tz(self):
+        if self._tz is None:
+            try:
+                self._tz = ZoneInfo(self.timezone)
+            except (ZoneInfoNotFoundError, ValueError):
+                print(f"경고: 알 수 없는 시간대 '{self.timezone}'. {DEFAULT_TIMEZONE} 을 사용합니다.")
+                self._tz = ZoneInfo(DEFAULT_TIMEZONE)
+        return self._tz
+
+    def next_reminder(self, now=None):
+        # 다음 알림 시각 (알림 채널이 없으면 None). 시간대의 요일/시각 기준
+        if self.channel_id is None:
+            return None
+        now = (now or datetime.now(self.tz)).astimezone(self.tz)
+        at = parse_reminder_time(self.reminder_time)
+        for days in range(8):
+            day = now.date() + timedelta(days=days)
+            if day.weekday() not in self.reminder_weekdays:
+                continue
+            candidate = datetime.combine(day, at, tzinfo=self.tz)
+            if candidate > now:
+                return candidate
+        return None
+
+    def to_dict(self):
+        return {
+            "channel_id": self.channel_id,
+            "timezone": self.timezone,
+            "reminder_time": self.reminder_time,
+            "auto_checkout_minutes": self.auto_checkout_minutes,
+            "reminder_weekdays": list(self.reminder_weekdays),
+            "voice_channel_ids": sorted(self.voice_channel_ids),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: data[key] for key in cls.__slots__ if key in data})
+
+
+class GuildConfigStore:
+    def __init__(self, json_file='guild_config.json', db_file=None, home_guild_id=None):
+        self.json_file = json_file
+        self.db_file = db_file # 지정하면 SQLite 사용 (샤드 모드)
+        self.configs = {}      # guild_id(int) -> GuildConfig
+        self.home_guild_id = home_guild_id
+        self._env_home = home_guild_id is not None # 환경 변수로 지정한 값은 저장된 값보다 우선
+        self.home_decided = self._env_home         # 기본 서버를 이미 정했는지 (정한 뒤에는 바꾸지 않음)
+        self.conn = None
+        self._save_lock = threading.Lock()         # 작업 스레드에서 동시에 저장할 때 순서대로
+
+    # --- 로드/저장 ---
+    def load(self):
+        if self.db_file:
+            self.conn = connect_shared(self.db_file)
+            for guild_id, config in self.conn.execute("SELECT guild_id, config FROM guild_config"):
+                self.configs[int(guild_id)] = GuildConfig.from_dict(json.loads(config))
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'home_guild_id'").fetchone()
+            decided = row is not None
+            stored_home = int(row[0]) if row and row[0] else None
+        elif os.path.exists(self.json_file):
+            with open(self.json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.configs = {int(guild_id): GuildConfig.from_dict(config)
+                            for guild_id, config in data.get("guilds", {}).items()}
+            decided = "home_guild_id" in data
+            stored_home = data.get("home_guild_id")
+        else:
+            decided, stored_home = False, None
+        if not self._env_home:
+            self.home_guild_id = stored_home
+            self.home_decided = decided
+
+    def _save(self, guild_id=None):
+        with self._save_lock:
+            self._save_locked(guild_id)
+
+    def _save_locked(self, guild_id):
+        if self.conn is not None:
+            with self.conn:
+                if guild_id is not None:
+                    self.conn.execute(
+                        "INSERT INTO guild_config (guild_id, config) VALUES (?, ?) "
+                        "ON CONFLICT(guild_id) DO UPDATE SET config = excluded.config",
+                        (str(guild_id), json.dumps(self.configs[guild_id].to_dict())))
+                if self.home_decided:
+                    self.conn.execute("INSERT INTO meta (key, value) VALUES ('home_guild_id', ?) "
+                                      "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                                      (str(self.home_guild_id or ""),))
+            return
+        # 잠금 안에서 현재 설정 전체를 쓰므로 늦게 끝난 저장이 더 오래된 내용을 덮어쓰지 않음
+        data = {"guilds": {str(gid): config.to_dict() for gid, config in list(self.configs.items())}}
+        if self.home_decided:
+            data["home_guild_id"] = self.home_guild_id
+        atomic_write_text(self.json_file, json.dumps(data, ensure_ascii=False, indent=2))
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # --- 조회/변경 ---
+    def get(self, guild_id):
+        # 저장된 설정이 없으면 기본값 (저장하지 않음). DM(None)도 기본값
+        config = self.configs.get(guild_id)
+        return config if config is not None else GuildConfig()
+
+    def set(self, guild_id, config):
+        self.configs[guild_id] = config
+        self._save(guild_id)
+
+    def set_home_guild(self, guild_id):
+        self.home_guild_id = guild_id
+        self.home_decided = True
+        self._save()
+
+    # --- 저장소 키 (서버별 분리) ---
+    def partition(self, guild_id):
+        # 기존 데이터가 속한 서버와 DM 은 None (접두어 없음)
+        if guild_id is None or guild_id == self.home_guild_id:
+            return None
+        return guild_id
+
+    def storage_key(self, guild_id, uid):
+        partition = self.partition(guild_id)
+        return str(uid) if partition is None else f"{partition}:{uid}"
+
+
+def split_storage_key(key):
+    # "서버ID:사용자ID" → (서버ID 또는 None, 사용자ID 문자열)
+    guild_part, sep, uid_str = key.rpartition(":")
+    return (int(guild_part) if sep else None), uid_str
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# ------------------ 슬래시 명령어용 ctx 어댑터 ------------------
+# 슬래시 명령어(Interaction)를 접두사 명령어 함수가 쓰는 ctx(author/channel/guild/send)처럼 감싸
+# 같은 명령어 함수를 그대로 재사용합니다.
+#   - 첫 send 는 interaction 응답, 이후(또는 defer 뒤)는 followup 으로 전송
+#   - 응답은 명령어를 쓴 사용자에게만 보임 (ephemeral) → delete_after 는 무시
+#   - Discord 는 3초 안에 첫 응답을 요구하므로 오래 걸리는 명령어(그래프 등)는 defer() 를 먼저 호출
+
+
+class InteractionContext:
+    def __init__(self, interaction, ephemeral=True):
+        self.interaction = interaction
+        self.author = interaction.user
+        self.channel = interaction.channel
+        self.guild = interaction.guild
+        self.command = interaction.command
+        self.ephemeral = ephemeral
+
+    async def defer(self):
+        # "생각 중..." 표시로 응답 기한을 15분으로 늘림
+        if not self.interaction.response.is_done():
+            await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+
+    async def send(self, content=None, *, delete_after=None, **kwargs):
+        kwargs = {key: value for key, value in kwargs.items() if value is not None} # 넘기지 않은 인자는 생략
+        if content is not None:
+            kwargs["content"] = content
+        if not self.interaction.response.is_done():
+            await self.interaction.response.send_message(ephemeral=self.ephemeral, **kwargs)
+        else:
+            await self.interaction.followup.send(ephemeral=self.ephemeral, **kwargs)
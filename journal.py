@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# ------------------ 출석 이벤트 저널 (append-only + 스냅샷) ------------------
+# 입장/퇴장/자동 퇴장/격려가 일어날 때마다 전체 파일을 다시 쓰는 대신 한 줄짜리 이벤트를 덧붙이고 fsync 합니다.
+# 일정 건수마다 현재 상태 전체를 스냅샷으로 원자적으로 저장하고 저널을 비웁니다.
+# 시작 시에는 최신 스냅샷을 읽고 그 이후의 저널만 재생하므로 복구 시간은 스냅샷 주기에 비례합니다.
+# 직전 세대(스냅샷 + 그 뒤의 저널)는 .prev 파일로 남겨 두어, 최신 스냅샷이 손상되면 직전 스냅샷에서
+# 두 저널을 이어서 재생합니다 (둘 다 손상되면 빈 상태에서 남은 저널만 재생).
+#
+# 이벤트 형식 (JSON 한 줄):
+#   {"seq": 12, "type": "check_in", "uid": "123", "state": {...}}   → 해당 사용자 상태를 state 로 설정
+#   {"seq": 13, "type": "check_out", "uid": "123"}                  → 해당 사용자 상태 삭제
+import json
+import os
+
+from persistence import atomic_write_text
+
+# 저널/스냅샷 파일 이름 (main.py 와 shard_runner.py 가 함께 사용)
+ATTENDANCE_JOURNAL_FILE = 'attendance_journal.jsonl'
+ATTENDANCE_SNAPSHOT_FILE = 'attendance_snapshot.json'
+
+JOURNAL_SNAPSHOT_EVERY = int(os.getenv("JOURNAL_SNAPSHOT_EVERY", "1000")) # 이 건수마다 스냅샷 저장
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "1") != "0" # 0 이면 fsync 생략 (테스트/벤치마크용)
+
+
+class AttendanceJournal:
+    def __init__(self, journal_file, snapshot_file, snapshot_every=JOURNAL_SNAPSHOT_EVERY, fsync=JOURNAL_FSYNC):
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.state = {}      # uid_str -> 직렬화된 상태 (스냅샷에 그대로 저장)
+        self.seq = 0         # 마지막으로 기록한 이벤트 번호
+        self._since_snapshot = 0
+        self._file = None
+
+    @property
+    def prev_snapshot_file(self):
+        return self.snapshot_file + ".prev"
+
+    @property
+    def prev_journal_file(self):
+        return self.journal_file + ".prev"
+
+    # --- 복구 ---
+    @staticmethod
+    def _read_snapshot(path):
+        # {"seq", "state"} 또는 없거나 손상되었으면 None
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            return {"seq": snapshot.get("seq", 0), "state": snapshot.get("state", {})}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"경고: 출석 스냅샷 {path} 을 읽을 수 없습니다: {e}")
+            return None
+
+    def recover(self, legacy_file=None):
+        # 스냅샷 + 저널 재생으로 상태 복원. 아무 기록도 없으면 legacy_file(기존 attendance_log.json)에서 가져옴
+        snapshot = self._read_snapshot(self.snapshot_file)
+        if snapshot is None and os.path.exists(self.snapshot_file):
+            # 손상된 최신 스냅샷은 옆으로 치워 둠 (다음 스냅샷 때 직전 세대로 밀려나지 않도록)
+            os.replace(self.snapshot_file, self.snapshot_file + ".corrupt")
+            snapshot = self._read_snapshot(self.prev_snapshot_file)
+            if snapshot is not None:
+                print("최신 출석 스냅샷이 손상되어 직전 스냅샷과 저널로 복구합니다.")
+            else:
+                print("경고: 출석 스냅샷을 모두 읽을 수 없어 남아 있는 저널만 재생합니다 (일부 입장 기록이 빠질 수 있음).")
+        elif snapshot is None and os.path.exists(self.prev_snapshot_file):
+            snapshot = self._read_snapshot(self.prev_snapshot_file) # 스냅샷 교체 도중 종료된 경우
+        elif (snapshot is None and legacy_file and os.path.exists(legacy_file)
+              and not os.path.exists(self.journal_file)):
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+                print(f"기존 출석 로그({legacy_file})에서 {len(self.state)}건을 가져왔습니다.")
+            except json.JSONDecodeError:
+                print(f"경고: {legacy_file}이 비어있거나 잘못된 형식입니다.")
+        if snapshot is not None:
+            self.state = snapshot["state"]
+        snapshot_seq = self.seq = snapshot["seq"] if snapshot is not None else 0
+
+        # 직전 저널에는 직전 스냅샷 이후 이벤트가, 저널에는 최신 스냅샷 이후 이벤트가 있음.
+        # 기준 스냅샷에 이미 반영된 이벤트는 seq 로 건너뜀
+        replayed = 0
+        for path in (self.prev_journal_file, self.journal_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 기록 도중 종료되어 잘린 마지막 줄: 그 이후는 신뢰할 수 없으므로 중단
+                        print(f"경고: 출석 저널 {os.path.basename(path)} {line_no}번째 줄이 손상되어 이후 이벤트를 무시합니다.")
+                        break
+                    if event.get("seq", 0) <= snapshot_seq:
+                        continue # 스냅샷에 이미 반영된 이벤트 (스냅샷 직후 저널 정리 전에 종료된 경우)
+                    self._apply(event)
+                    self.seq = event["seq"]
+                    replayed += 1
+        self._since_snapshot = replayed
+        # 복구한 상태로 새 스냅샷을 만들고 저널을 비움 → 손상된 꼬리도 함께 정리됨
+        self.snapshot()
+        return dict(self.state)
+
+    def _apply(self, event):
+        uid = event["uid"]
+        if "state" in event:
+            self.state[uid] = event["state"]
+        else:
+            self.state.pop(uid, None)
+
+    # --- 기록 ---
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.journal_file, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, event_type, uid, state=None):
+        # 이벤트 한 줄을 덧붙이고 디스크에 반영 (state 가 None 이면 삭제 이벤트)
+        self.append_many([(event_type, uid, state)])
+
+    def append_many(self, events):
+        # [(event_type, uid, state)] 를 한 번의 쓰기/fsync 로 덧붙임 (음성 채널 입퇴장처럼 몰려오는 이벤트용)
+        if not events:
+            return
+        lines = []
+        for event_type, uid, state in events:
+            self.seq += 1
+            event = {"seq": self.seq, "type": event_type, "uid": str(uid)}
+            if state is not None:
+                event["state"] = state
+            self._apply(event)
+            lines.append(json.dumps(event, ensure_ascii=False) + "\n")
+        f = self._open()
+        f.write("".join(lines))
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self._since_snapshot += len(lines)
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        # 지금 스냅샷과 저널을 직전 세대(.prev)로 옮기고 새 스냅샷을 원자적으로 저장한 뒤 저널을 비움.
+        # 어느 단계에서 종료되어도 남은 스냅샷 + 두 저널로 복구되며, seq 비교로 중복 재생을 막음
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.snapshot_file):
+            if os.path.exists(self.journal_file):
+                os.replace(self.journal_file, self.prev_journal_file)
+            os.replace(self.snapshot_file, self.prev_snapshot_file)
+        atomic_write_text(self.snapshot_file,
+                          json.dumps({"seq": self.seq, "state": self.state}, ensure_ascii=False))
+        with open(self.journal_file, 'w', encoding='utf-8'):
+            pass
+        self._since_snapshot = 0
+
+    # --- 조회 (shared_state.SqliteAttendanceStore 와 같은 인터페이스) ---
+    def get(self, uid_str):
+        return self.state.get(uid_str)
+
+    def owns(self, uid_str):
+        return True # 단일 프로세스: 모든 사용자를 이 프로세스가 처리
+
+    def count(self):
+        return len(self.state)
+
+    def count_by_guild(self):
+        # {서버 ID(DM/기존 기록은 None): 입장 중 인원}
+        counts = {}
+        for state in self.state.values():
+            guild_id = state.get("서버")
+            counts[guild_id] = counts.get(guild_id, 0) + 1
+        return counts
+
+    def close(self):
+        if self._file is not None or self._since_snapshot:
+            self.snapshot()
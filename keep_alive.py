@@ -1,18 +1,156 @@
-from flask import Flask
-from threading import Thread
+# -*- coding: utf-8 -*-
+# ------------------ 상태 확인 / 메트릭 웹서버 ------------------
+# 별도 스레드의 Flask 대신 봇과 같은 asyncio 이벤트 루프에서 aiohttp 서버를 실행합니다.
+#   /        : 기존과 같은 "Bot is online" (Replit/Render 유지용)
+#   /health  : 실제 상태(게이트웨이 지연, 마지막 heartbeat, 작업 루프 마지막 실행 시각) JSON. 이상 시 503 (readiness)
+#   /live    : 플랫폼 health check 용 (liveness). 프로세스가 응답하면 200 이고, 시작 직후나 게이트웨이 재연결 중의
+#              일시적인 비정상은 HEALTH_LIVENESS_GRACE 초까지 봐줌 → 느린 시작/순간 끊김으로 재시작이 반복되지 않음
+#   /metrics : Prometheus 텍스트 형식 메트릭
+#   /metrics.json : 히스토그램 요약(p50/p99)과 카운터 JSON
+import math
+import os
+import time
 
-app = Flask('')
+from aiohttp import web
 
+HEALTH_PORT = int(os.getenv("PORT", "8080"))            # Render 는 PORT 환경 변수로 포트를 지정
+HEALTH_MAX_LATENCY = float(os.getenv("HEALTH_MAX_LATENCY", "10"))        # 이 이상이면 비정상 (초)
+HEALTH_MAX_HEARTBEAT_AGE = float(os.getenv("HEALTH_MAX_HEARTBEAT_AGE", "120")) # 마지막 heartbeat ACK 허용 경과 시간
+HEALTH_LIVENESS_GRACE = float(os.getenv("HEALTH_LIVENESS_GRACE", "900")) # 이만큼 계속 비정상이어야 /live 가 503 (초)
 
-@app.route('/')
-def home():
-    return "Bot is online"
 
+class TaskMonitor:
+    """작업 루프별 마지막 실행 시각 기록."""
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+    def __init__(self):
+        self.last_run = {}
 
+    def mark(self, name):
+        self.last_run[name] = time.time()
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(samples):
+    # samples: (이름, 종류, 설명, {라벨}, 값) 목록 → Prometheus 텍스트 형식
+    lines = []
+    described = set()
+    for name, kind, help_text, labels, value in samples:
+        if value is None:
+            continue
+        family = name
+        if kind == "histogram": # _bucket/_sum/_count 는 하나의 메트릭으로 설명
+            family = name.rsplit("_", 1)[0]
+        if family not in described:
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            described.add(family)
+        label_text = ""
+        if labels:
+            label_text = "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + "}"
+        lines.append(f"{name}{label_text} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class HealthServer:
+    def __init__(self, bot, task_monitor, metrics_provider=None, snapshot_provider=None, host='0.0.0.0',
+                 port=HEALTH_PORT):
+        self.bot = bot
+        self.task_monitor = task_monitor
+        self.metrics_provider = metrics_provider   # () -> samples 목록 (봇 고유 메트릭)
+        self.snapshot_provider = snapshot_provider # () -> JSON 으로 직렬화 가능한 dict
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+        self.healthy_at = None # 마지막으로 정상이었던 시각 (시작 후 한 번도 없으면 None → started_at 기준)
+        self._runner = None
+
+    def heartbeat_age(self):
+        # 마지막 heartbeat ACK 이후 경과 시간(초). 게이트웨이 연결 전이면 None
+        ws = getattr(self.bot, "ws", None)
+        keep_alive = getattr(ws, "_keep_alive", None)
+        last_ack = getattr(keep_alive, "_last_ack", None)
+        if last_ack is None:
+            return None
+        return time.perf_counter() - last_ack
+
+    def status(self):
+        latency = self.bot.latency
+        heartbeat_age = self.heartbeat_age()
+        ready = self.bot.is_ready() and not self.bot.is_closed()
+        healthy = (ready and math.isfinite(latency) and latency < HEALTH_MAX_LATENCY
+                   and (heartbeat_age is None or heartbeat_age < HEALTH_MAX_HEARTBEAT_AGE))
+        if healthy:
+            self.healthy_at = time.time()
+        return {
+            "status": "ok" if healthy else "unhealthy",
+            "ready": ready,
+            "latency": latency if math.isfinite(latency) else None,
+            "last_heartbeat_ack_age": heartbeat_age,
+            "uptime": time.time() - self.started_at,
+            "tasks": dict(self.task_monitor.last_run),
+        }
+
+    # --- 라우트 ---
+    async def handle_home(self, request):
+        return web.Response(text="Bot is online")
+
+    async def handle_health(self, request):
+        status = self.status()
+        return web.json_response(status, status=200 if status["status"] == "ok" else 503)
+
+    def liveness(self):
+        # 비정상 상태가 유예 시간보다 오래 계속됐을 때만 False (시작 중/재연결 중에는 True)
+        status = self.status()
+        unhealthy_for = 0.0 if status["status"] == "ok" else time.time() - (self.healthy_at or self.started_at)
+        return {"alive": unhealthy_for < HEALTH_LIVENESS_GRACE, "status": status["status"],
+                "unhealthy_for": unhealthy_for, "uptime": status["uptime"]}
+
+    async def handle_live(self, request):
+        live = self.liveness()
+        return web.json_response(live, status=200 if live["alive"] else 503)
+
+    async def handle_metrics(self, request):
+        status = self.status()
+        samples = [
+            ("bot_up", "gauge", "1 if the bot is connected and ready", None, int(status["ready"])),
+            ("bot_uptime_seconds", "gauge", "Seconds since the process started", None, round(status["uptime"], 3)),
+            ("discord_gateway_latency_seconds", "gauge", "Gateway heartbeat latency", None, status["latency"]),
+            ("discord_heartbeat_ack_age_seconds", "gauge", "Seconds since the last heartbeat ACK", None,
+             status["last_heartbeat_ack_age"]),
+            ("discord_guilds", "gauge", "Number of guilds the bot is in", None, len(self.bot.guilds)),
+        ]
+        for task_name, last_run in status["tasks"].items():
+            samples.append(("bot_task_last_run_timestamp_seconds", "gauge", "Unix time of the last task run",
+                            {"task": task_name}, last_run))
+        if self.metrics_provider is not None:
+            samples.extend(self.metrics_provider())
+        return web.Response(text=format_prometheus(samples), content_type="text/plain", charset="utf-8")
+
+    async def handle_metrics_json(self, request):
+        payload = {"health": self.status()}
+        if self.snapshot_provider is not None:
+            payload["metrics"] = self.snapshot_provider()
+        return web.json_response(payload)
+
+    # --- 시작/종료 ---
+    async def start(self):
+        app = web.Application()
+        app.add_routes([
+            web.get('/', self.handle_home),
+            web.get('/health', self.handle_health),
+            web.get('/live', self.handle_live),
+            web.get('/metrics', self.handle_metrics),
+            web.get('/metrics.json', self.handle_metrics_json),
+        ])
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"상태 확인 서버 시작: http://{self.host}:{self.port}/health")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
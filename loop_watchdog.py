@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# ------------------ 이벤트 루프 블로킹 감지 / 샘플링 프로파일러 ------------------
+# LoopWatchdog: 이벤트 루프 안의 코루틴이 주기적으로 heartbeat 시각을 갱신하고, 별도 스레드가 그 시각을 확인합니다.
+#   heartbeat 가 임계값보다 오래 갱신되지 않으면 루프가 막힌 것이므로 그 순간 루프 스레드의 스택을
+#   sys._current_frames() 로 잡아 출력/보관합니다. (LOOP_WATCHDOG_THRESHOLD=초, 0 이면 사용 안 함)
+# SamplingProfiler: 지정한 시간 동안 일정 간격으로 스레드 스택을 샘플링해
+#   flamegraph.pl / speedscope 에서 바로 열 수 있는 collapsed-stack 형식("a;b;c 횟수")으로 만듭니다.
+# 둘 다 표준 라이브러리만 사용하며 외부 서비스가 필요 없습니다.
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from metrics import registry as metrics
+
+LOOP_WATCHDOG_THRESHOLD = float(os.getenv("LOOP_WATCHDOG_THRESHOLD", "0")) # 막힘으로 판단할 시간(초), 0 이면 꺼짐
+WATCHDOG_MAX_EVENTS = 20        # 보관할 최근 블로킹 기록 수
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005")) # 샘플링 간격(초)
+PROFILER_MAX_SECONDS = 60
+
+
+class LoopWatchdog:
+    def __init__(self, threshold=LOOP_WATCHDOG_THRESHOLD):
+        self.threshold = threshold
+        self.interval = threshold / 4 # heartbeat/검사 주기: 임계값보다 충분히 짧게
+        self.events = deque(maxlen=WATCHDOG_MAX_EVENTS) # {"at", "blocked", "stack"}
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._current_event = None # 현재 진행 중인 블로킹 (한 번 막힐 때 한 번만 기록)
+        self._stop = threading.Event()
+        self._thread = None
+        self._heartbeat_task = None
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def start(self):
+        # 이벤트 루프 안에서 호출
+        if not self.enabled or self._thread is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        print(f"이벤트 루프 감시 시작: {self.threshold}초 이상 막히면 스택을 기록합니다.")
+
+    async def _heartbeat(self):
+        while True:
+            now = time.monotonic()
+            event = self._current_event
+            if event is not None: # 막혔다가 풀림 → 실제로 막힌 시간 확정
+                event["blocked"] = round(now - self._last_beat, 3)
+                metrics.observe("bot_event_loop_blocked_seconds", event["blocked"])
+                print(f"이벤트 루프가 {event['blocked']}초 동안 막혀 있었습니다.")
+                self._current_event = None
+            self._last_beat = now
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            blocked = time.monotonic() - self._last_beat
+            if blocked < self.threshold or self._current_event is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            event = {"at": time.time(), "blocked": round(blocked, 3), "stack": stack}
+            self._current_event = event
+            self.events.append(event)
+            metrics.inc("bot_event_loop_blocked_total")
+            print(f"경고: 이벤트 루프가 {blocked:.2f}초 이상 응답하지 않습니다. 현재 실행 중인 스택:\n{stack}")
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    def recent_events(self):
+        return list(self.events)
+
+
+def _collapse(frame):
+    # 가장 바깥 호출부터 "모듈:함수;모듈:함수" 형태로 연결
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class SamplingProfiler:
+    def __init__(self, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, thread_ids=None):
+        # thread_ids 가 None 이면 프로파일러 자신을 제외한 모든 스레드를 샘플링
+        if self._thread is not None:
+            raise RuntimeError("프로파일러가 이미 실행 중입니다.")
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, args=(thread_ids,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _sample(self, thread_ids):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (thread_ids is not None and thread_id not in thread_ids):
+                    continue
+                thread_name = names.get(thread_id, str(thread_id)).replace(";", "_").replace(" ", "_")
+                self.samples[f"{thread_name};{_collapse(frame)}"] += 1
+            self.sample_count += 1
+
+    def stop(self):
+        if self._thread is None:
+            return self.samples
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return self.samples
+
+    def collapsed(self):
+        # flamegraph.pl 입력 형식: 한 줄에 "스택 횟수"
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    async def profile(self, seconds, thread_ids=None):
+        # seconds 동안 샘플링한 뒤 collapsed-stack 텍스트 반환 (이벤트 루프는 그동안 자유롭게 동작)
+        self.start(thread_ids)
+        try:
+            await asyncio.sleep(min(seconds, PROFILER_MAX_SECONDS))
+        finally:
+            self.stop()
+        return self.collapsed()
@@ -1,161 +1,336 @@
 # -*- coding: utf-8 -*-
+from startup import StartupTimer
+startup_timer = StartupTimer() # 무거운 import(discord 등)부터 측정
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta, time # time 추가
-from zoneinfo import ZoneInfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import os
 import csv
 import json
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm # 한글 폰트 설정 위해 추가
+import io
+import re
+import signal
+import asyncio
+import time as time_module # datetime.time 과 이름이 겹쳐 별칭 사용
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from keep_alive import keep_alive
-
-# ------------------ 한글 폰트 설정 (Replit 등 환경에 따라 경로 확인 필요) ------------------
-# Replit 같은 환경에서는 기본 폰트가 없을 수 있으므로, 나눔고딕 같은 폰트 파일을 업로드하고 경로 지정
-# 또는 시스템에 설치된 폰트 경로 사용
-try:
-    # 예시: NanumGothic.ttf 파일이 프로젝트 루트에 있다고 가정
-    font_path = 'NanumGothic.ttf' # Replit의 파일 탐색기 최상위에 업로드하세요.
-    if os.path.exists(font_path):
-        fm.fontManager.addfont(font_path)
-        plt.rc('font', family='NanumGothic')
-        plt.rc('axes', unicode_minus=False) # 마이너스 부호 깨짐 방지
-        print(f"폰트 로드 성공: {font_path}")
-    else:
-        print(f"경고: 지정된 폰트 파일({font_path})을 찾을 수 없습니다. 기본 폰트를 사용합니다.")
-        # 기본 폰트 사용 시 한글이 깨질 수 있음
-except Exception as e:
-    print(f"폰트 설정 중 오류 발생: {e}")
-
+from keep_alive import HealthServer, TaskMonitor
+from metrics import registry as metrics, sample_loop_lag, instrument_http
+from loop_watchdog import LoopWatchdog, SamplingProfiler, PROFILER_MAX_SECONDS
+from journal import AttendanceJournal, ATTENDANCE_JOURNAL_FILE, ATTENDANCE_SNAPSHOT_FILE
+from shared_state import SqliteAttendanceStore, SqliteLease
+from storage import create_storage
+from charts import ChartRenderer, ChartRendererBusy
+import chart_assets
+from dm_dispatch import BulkDMDispatcher, ChannelBroadcaster, is_run_complete
+from user_cache import UserResolver
+from scheduler import DeadlineScheduler
+from analytics import StudyLogAnalytics
+from ranking import RankingBoard, RANKING_PERIODS
+from weekly_archive import iso_week_key, week_start_of
+from guild_config import GuildConfigStore, GuildConfig, split_storage_key, parse_reminder_time, parse_weekdays, WEEKDAY_NAMES
+from voice_tracking import VoiceSessionTracker, JOIN
+from rate_limit import TokenBucketLimiter, CommandRateLimited, token_bucket_check, check_rate_limits
+from interaction_context import InteractionContext
+startup_timer.record("imports", 0)
 
 # ------------------ 초기 설정 ------------------
-keep_alive() # Replit 유지용 웹서버 실행
 load_dotenv() # .env 파일 로드
 
+# --- 슬래시 명령어 / 게이트웨이 인텐트 ---
+# /입장 /퇴장 /통계 /랭킹 /설정 /도움말 은 message_content 인텐트 없이 동작. MESSAGE_CONTENT_INTENT=0 이면 게이트웨이가
+# 모든 채널의 메시지 내용을 보내지 않음 (접두사 명령어는 DM/봇 멘션에서만 동작 → 안내 문구도 슬래시 명령어로)
+SLASH_COMMANDS = os.getenv("SLASH_COMMANDS", "1") == "1"     # 슬래시 명령어 등록
+SLASH_SYNC = os.getenv("SLASH_SYNC", "1") == "1"             # 첫 on_ready 때 Discord 에 명령어 목록 동기화
+MESSAGE_CONTENT_INTENT = os.getenv("MESSAGE_CONTENT_INTENT", "1") == "1"
+PRESENCE_INTENT = os.getenv("PRESENCE_INTENT", "1") == "1"
+
 intents = discord.Intents.default()
 intents.members = True
-intents.message_content = True
-intents.presences = True # 멤버 활동 상태 감지를 위해 (선택사항)
+intents.message_content = MESSAGE_CONTENT_INTENT
+intents.presences = PRESENCE_INTENT # 멤버 활동 상태 감지를 위해 (선택사항)
+
+# --- 샤드 모드 (shard_runner.py 가 설정) ---
+# SHARD_COUNT 가 있으면 AutoShardedBot 으로 SHARD_IDS 의 샤드만 실행하고, 상태는 SQLite 공유 저장소에 둠
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()] or None
+SHARDED = SHARD_COUNT > 0
+SHARD_WORKER = os.getenv("SHARD_WORKER", f"worker-{os.getpid()}") # 이 프로세스 이름 (출석 담당/리더 구분)
+
+if SHARDED:
+    bot = commands.AutoShardedBot(command_prefix=commands.when_mentioned_or('!'), intents=intents,
+                                  shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix=commands.when_mentioned_or('!'), intents=intents)
+
+# --- 사용자 안내용 명령어 표기 ---
+# message_content 인텐트가 꺼져 있으면 서버 채널에서 `!입장` 같은 접두사 명령어가 동작하지 않으므로
+# 슬래시 명령어로 (슬래시 명령어도 끈 경우 봇 멘션 형식으로) 안내
+SLASH_OPTION_NAMES = {"통계": ("기간",), "랭킹": ("기간", "옵션"), "설정": ("항목", "값")}
+
+def command_hint(name, *args):
+    # command_hint("통계", "주간") → `!통계 주간` / `/통계 기간:주간` / `@봇 통계 주간`
+    if MESSAGE_CONTENT_INTENT:
+        text = " ".join((f"!{name}", *args))
+    elif SLASH_COMMANDS:
+        options = [f"{option}:{arg}" for option, arg in zip(SLASH_OPTION_NAMES.get(name, ()), args)]
+        text = " ".join((f"/{name}", *options))
+    else:
+        text = " ".join((f"@{bot.user.name if bot.user else '봇'}", name, *args))
+    return f"`{text}`"
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+user_resolver = UserResolver(bot) # fetch_user 대신 게이트웨이/로컬 캐시 우선 조회
+task_monitor = TaskMonitor() # 작업 루프별 마지막 실행 시각 (상태 확인 서버에서 노출)
 
 # --- 데이터 파일 이름 정의 ---
 DATA_FILE = 'user_data.json'
 CSV_FILE = 'study_log.csv'
 ATTENDANCE_FILE = 'attendance_log.json' # 출석 로그 파일
+SQLITE_DB_FILE = os.getenv("SQLITE_DB_FILE", 'study.db') # STORAGE_BACKEND=sqlite 일 때 사용
+
+# --- study_log.csv 분석 (스트리밍 + 체크포인트) ---
+ANALYTICS_CHECKPOINT_FILE = 'study_log_checkpoint.json'
+study_log_analytics = StudyLogAnalytics(CSV_FILE, ANALYTICS_CHECKPOINT_FILE)
+DATE_RANGE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}~\d{4}-\d{2}-\d{2}$")
+
+# --- 차트 렌더링 (별도 프로세스 풀) ---
+chart_renderer = ChartRenderer()
+CHART_BUSY_TIMEOUT = float(os.getenv("CHART_BUSY_TIMEOUT", "10")) # !통계 그래프 대기 한도(초)
+
+# --- !통계 요청 한도 (토큰 버킷: burst 회까지 연속 허용, refill 초마다 1회 회복, burst=0 이면 끔) ---
+stats_user_limiter = TokenBucketLimiter(int(os.getenv("STATS_USER_BURST", "3")),
+                                        float(os.getenv("STATS_USER_REFILL_SECONDS", "10")))
+stats_channel_limiter = TokenBucketLimiter(int(os.getenv("STATS_CHANNEL_BURST", "15")),
+                                           float(os.getenv("STATS_CHANNEL_REFILL_SECONDS", "2")))
 
 # --- 데이터 변수 초기화 ---
-user_data = {}
+storage = None # 공부 기록 저장소 (STORAGE_BACKEND: json/sqlite)
 attendance_log = {} # 메모리 내 출석 로그 (봇 재시작 시 파일에서 복원)
 
+async def run_storage(func, *args):
+    # SQLite 백엔드(storage.blocking)는 디스크 조회/잠금 대기가 있으므로 스레드에서, JSON 백엔드는 메모리라 바로 실행
+    if storage.blocking:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+async def get_weekly_minutes(uid_str, week_start):
+    # JSON 백엔드: 메모리에 있는 주는 루프에서 바로 읽고, 보관소로 옮겨진 주만 스레드에서 gzip 구간을 읽음
+    if storage.blocking:
+        return await asyncio.to_thread(storage.get_weekly, uid_str, week_start)
+    days = storage.get_recent_weekly(uid_str, week_start)
+    return days or await asyncio.to_thread(storage.read_archived_weekly, uid_str, week_start)
+
 # --- 시간대 설정 함수 ---
-def get_now():
-    return datetime.now(ZoneInfo("Asia/Seoul"))
+def get_now(tz=None):
+    return datetime.now(tz or ZoneInfo("Asia/Seoul"))
+
+# --- 서버별 설정 (알림 채널/시간대/알림 시각/자동 퇴장/요일) ---
+GUILD_CONFIG_FILE = 'guild_config.json'
+HOME_GUILD_ID = int(os.getenv("HOME_GUILD_ID")) if os.getenv("HOME_GUILD_ID") else None # 기존 기록이 속한 서버
+guild_configs = GuildConfigStore(GUILD_CONFIG_FILE, db_file=SQLITE_DB_FILE if SHARDED else None,
+                                 home_guild_id=HOME_GUILD_ID) # load_state() 에서 읽음
+
+def ctx_guild_id(ctx):
+    return ctx.guild.id if ctx.guild else None # DM 이면 None
+
+def guild_now(guild_id):
+    # 해당 서버 시간대의 현재 시각
+    return get_now(guild_configs.get(guild_id).tz)
+
+def current_week_start(now=None):
+    # 이번 주 월요일 "YYYY-MM-DD" (주간 기록/랭킹 조회 기준)
+    return week_start_of((now or get_now()).date().isoformat())
 
 # ------------------ 데이터 파일 관리 ------------------
 
-# --- User Data ---
-def save_user_data():
+# --- 출석 이벤트 저널 ---
+# 입장/퇴장/격려마다 attendance_log.json 전체를 다시 쓰는 대신 이벤트 한 줄을 저널에 덧붙이고(fsync),
+# 일정 건수마다 스냅샷을 저장. 시작 시 스냅샷 + 저널 재생으로 복원 (기존 attendance_log.json 은 최초 1회 가져옴)
+# 파일 이름(ATTENDANCE_JOURNAL_FILE/ATTENDANCE_SNAPSHOT_FILE)은 journal.py 에 정의
+
+def encode_attendance_entry(data):
+    # datetime 객체를 ISO 문자열로 변환하여 저장
+    entry_time = data.get("입장")
+    last_encouragement = data.get("마지막_격려")
+    return {
+        "입장": entry_time.isoformat(),
+        "마지막_격려": last_encouragement if last_encouragement is not None else 0, # 기본값 처리
+        "서버": data.get("서버"), # 입장한 서버 (기존 기록/DM 은 None)
+        **({"음성": True} if data.get("음성") else {}) # 음성 채널 입장으로 시작한 세션
+    }
+
+if SHARDED: # 여러 프로세스가 같은 사용자를 볼 수 있으므로 SQLite 공유 테이블 사용
+    attendance_store = SqliteAttendanceStore(SQLITE_DB_FILE, SHARD_WORKER)
+else:
+    attendance_store = AttendanceJournal(ATTENDANCE_JOURNAL_FILE, ATTENDANCE_SNAPSHOT_FILE)
+
+# 저널 fsync / SQLite 잠금 대기(최대 30초)가 이벤트 루프를 막지 않도록 출석 저장소 호출은 전용 스레드 하나에서 실행.
+# 작업자가 하나뿐이라 이벤트 기록 순서가 유지되고, 저장소 내부 상태도 이 스레드에서만 바뀜
+attendance_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="attendance-store")
+
+async def attendance_store_call(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(attendance_io, func, *args)
+
+async def save_attendance_logs(uids, event_type):
+    # 여러 사용자의 상태를 한 번의 쓰기로 기록 (음성 채널 전환 배치용)
+    events = []
+    for uid in uids:
+        data = attendance_log.get(uid)
+        events.append((event_type, uid, encode_attendance_entry(data) if data is not None else None))
+    if not events:
+        return
     try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(user_data, f, ensure_ascii=False, indent=2)
+        with metrics.timer("bot_storage_duration_seconds", op="attendance_store_batch"):
+            await attendance_store_call(attendance_store.append_many, events)
     except Exception as e:
-        print(f"Error saving user data: {e}")
-
-def load_user_data():
-    global user_data
-    if os.path.exists(DATA_FILE):
-        try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                user_data = json.load(f)
-        except json.JSONDecodeError:
-            print(f"경고: {DATA_FILE}이 비어있거나 잘못된 형식입니다. 새 데이터 파일을 생성합니다.")
-            user_data = {}
-        except Exception as e:
-            print(f"Error loading user data: {e}")
-            user_data = {} # 오류 발생 시 빈 딕셔너리로 초기화
-    else:
-        user_data = {}
+        print(f"Error saving attendance log batch ({len(events)}건): {e}")
+
+def flush_all_data():
+    # 봇 종료 시 호출: 대기 중인 변경 사항을 모두 디스크에 기록
+    if storage is not None: # 상태 로드 전에 종료된 경우
+        storage.close()
+    attendance_io.shutdown(wait=True) # 이미 넘긴 출석 이벤트를 모두 기록한 뒤 닫음
+    attendance_store.close()
+    study_log_analytics.save_checkpoint()
+    guild_configs.close()
+    chart_renderer.close()
 
 # --- Attendance Log ---
-def save_attendance_log():
+async def save_attendance_log(uid, event_type):
+    # 해당 사용자의 현재 상태를 이벤트로 기록 (attendance_log 에 없으면 삭제 이벤트)
+    # event_type: check_in / check_out / auto_checkout / encourage / remove
     try:
-        # datetime 객체를 ISO 문자열로 변환하여 저장
-        serializable_log = {}
-        for uid, data in attendance_log.items():
-            # data 딕셔너리 구조 확인 및 안전한 접근
-            entry_time = data.get("입장")
-            last_encouragement = data.get("마지막_격려")
-            if entry_time and isinstance(entry_time, datetime): # datetime 객체인지 확인
-                serializable_log[str(uid)] = {
-                    "입장": entry_time.isoformat(),
-                    "마지막_격려": last_encouragement if last_encouragement is not None else 0 # 기본값 처리
-                }
-            else:
-                print(f"Warning: Invalid '입장' data for user {uid}: {entry_time}. Skipping save.")
-
-        with open(ATTENDANCE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(serializable_log, f, ensure_ascii=False, indent=2)
+        data = attendance_log.get(uid)
+        if data is None:
+            with metrics.timer("bot_storage_duration_seconds", op="attendance_store"):
+                await attendance_store_call(attendance_store.append, event_type, uid)
+        elif isinstance(data.get("입장"), datetime):
+            with metrics.timer("bot_storage_duration_seconds", op="attendance_store"):
+                await attendance_store_call(attendance_store.append, event_type, uid, encode_attendance_entry(data))
+        else:
+            print(f"Warning: Invalid '입장' data for user {uid}: {data.get('입장')}. Skipping save.")
     except Exception as e:
         print(f"Error saving attendance log: {e}")
 
 
+def decode_attendance_entry(uid_str, data):
+    # ISO 문자열을 다시 datetime 객체로 변환 (잘못된 항목이면 None)
+    try:
+        # 타임존 정보가 포함된 ISO 문자열 파싱 시도
+        entry_time_str = data.get("입장")
+        last_encouragement = data.get("마지막_격려", 0) # 기본값 0
+
+        if not entry_time_str:
+            print(f"Warning: Missing '입장' data for user {uid_str}. Skipping entry.")
+            return None
+
+        entry_time = datetime.fromisoformat(entry_time_str)
+        # 만약 타임존 정보가 없다면 한국 시간대로 설정 (하위호환성)
+        if entry_time.tzinfo is None:
+            entry_time = entry_time.replace(tzinfo=ZoneInfo("Asia/Seoul"))
+        # 또는 항상 한국 시간대로 강제 변환
+        # entry_time = datetime.fromisoformat(data["입장"]).astimezone(korea_tz)
+
+        return {
+            "입장": entry_time,
+            "마지막_격려": last_encouragement,
+            "서버": data.get("서버"),
+            "음성": data.get("음성", False)
+        }
+    except (ValueError, TypeError) as dt_err:
+        print(f"Error parsing datetime for user {uid_str}: {dt_err}. Skipping entry.")
+    except Exception as inner_e:
+         print(f"Error processing attendance entry for user {uid_str}: {inner_e}. Skipping entry.")
+    return None
+
+
 def load_attendance_log():
     global attendance_log
-    if os.path.exists(ATTENDANCE_FILE):
-        try:
-            with open(ATTENDANCE_FILE, 'r', encoding='utf-8') as f:
-                loaded_log = json.load(f)
-                # ISO 문자열을 다시 datetime 객체로 변환하여 로드
-                attendance_log = {}
-                korea_tz = ZoneInfo("Asia/Seoul")
-                for uid_str, data in loaded_log.items():
-                    try:
-                        # 타임존 정보가 포함된 ISO 문자열 파싱 시도
-                        entry_time_str = data.get("입장")
-                        last_encouragement = data.get("마지막_격려", 0) # 기본값 0
-
-                        if not entry_time_str:
-                            print(f"Warning: Missing '입장' data for user {uid_str}. Skipping entry.")
-                            continue
-
-                        entry_time = datetime.fromisoformat(entry_time_str)
-                        # 만약 타임존 정보가 없다면 한국 시간대로 설정 (하위호환성)
-                        if entry_time.tzinfo is None:
-                            entry_time = entry_time.replace(tzinfo=korea_tz)
-                        # 또는 항상 한국 시간대로 강제 변환
-                        # entry_time = datetime.fromisoformat(data["입장"]).astimezone(korea_tz)
-
-                        attendance_log[int(uid_str)] = {
-                            "입장": entry_time,
-                            "마지막_격려": last_encouragement
-                        }
-                    except (ValueError, TypeError) as dt_err:
-                        print(f"Error parsing datetime for user {uid_str}: {dt_err}. Skipping entry.")
-                    except Exception as inner_e:
-                         print(f"Error processing attendance entry for user {uid_str}: {inner_e}. Skipping entry.")
-
-        except json.JSONDecodeError:
-            print(f"경고: {ATTENDANCE_FILE}이 비어있거나 잘못된 형식입니다. 새 로그 파일을 생성합니다.")
-            attendance_log = {}
-        except Exception as e:
-            print(f"Error loading attendance log: {e}")
-            attendance_log = {} # 오류 발생 시 빈 딕셔너리로 초기화
-    else:
+    try:
+        loaded_log = attendance_store.recover(legacy_file=ATTENDANCE_FILE)
+        # ISO 문자열을 다시 datetime 객체로 변환하여 로드
         attendance_log = {}
+        for uid_str, data in loaded_log.items():
+            entry = decode_attendance_entry(uid_str, data)
+            if entry is not None:
+                attendance_log[int(uid_str)] = entry
 
-# --- 초기 데이터 로드 및 CSV 파일 준비 ---
-load_user_data()
-load_attendance_log() # 봇 시작 시 출석 로그 복원
+    except json.JSONDecodeError:
+        print(f"경고: {ATTENDANCE_SNAPSHOT_FILE}이 비어있거나 잘못된 형식입니다. 새 로그 파일을 생성합니다.")
+        attendance_log = {}
+    except Exception as e:
+        print(f"Error loading attendance log: {e}")
+        attendance_log = {} # 오류 발생 시 빈 딕셔너리로 초기화
 
-if not os.path.exists(CSV_FILE):
+
+async def sync_attendance(uid):
+    # 샤드 모드: 다른 프로세스에서 입장/퇴장했을 수 있으므로 공유 저장소 기준으로 메모리 상태를 맞춤
+    if not SHARDED:
+        return
+    data = await attendance_store_call(attendance_store.get, str(uid))
+    entry = decode_attendance_entry(str(uid), data) if data is not None else None
+    if entry is None:
+        attendance_log.pop(uid, None)
+    else:
+        attendance_log[uid] = entry
+
+# --- 초기 데이터 로드 및 CSV 파일 준비 (load_state) ---
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+if SHARDED and STORAGE_BACKEND != "sqlite":
+    print("샤드 모드에서는 여러 프로세스가 함께 쓸 수 있는 SQLite 저장소를 사용합니다.")
+    STORAGE_BACKEND = "sqlite"
+ranking_boards = {} # 서버(partition, 기본 서버는 None)별 주간/월간/전체 랭킹 (정렬 상태 유지)
+
+def ranking_periods(guild_id):
+    # 랭킹 보드(partition) 시간대 기준 (이번 달, 이번 주 월요일). 기록 날짜와 같은 시간대를 써야 주 경계가 맞음.
+    # DM 과 기본 서버는 같은 보드(None)를 쓰므로 기본 서버의 시간대
+    partition = guild_configs.partition(guild_id)
+    now = guild_now(partition if partition is not None else guild_configs.home_guild_id)
+    return now.strftime("%Y-%m"), current_week_start(now)
+
+def build_ranking_boards(iter_rows):
+    # iter_rows(month_str, week_start): 저장소의 랭킹 행 (storage.iter_ranking_rows).
+    # 서버마다 그 서버 시간대의 이번 주/달 합계로 랭킹 인덱스 구성. 같은 기간을 쓰는 서버들은 한 번에 조회
+    # (시간대가 달라도 주/달 경계 근처가 아니면 기간이 같으므로 보통 한 번)
+    partition_periods = {guild_configs.partition(gid): ranking_periods(gid) for gid in guild_configs.configs}
+    partition_periods[None] = ranking_periods(None)
+    unconfigured_periods = (guild_now(None).strftime("%Y-%m"), current_week_start(guild_now(None))) # 설정 없는 서버
+    rows_by_partition = {}
+    for month_str, week_start in {unconfigured_periods, *partition_periods.values()}:
+        for key, *rest in iter_rows(month_str, week_start):
+            partition, uid_str = split_storage_key(key)
+            if partition_periods.get(partition, unconfigured_periods) == (month_str, week_start):
+                rows_by_partition.setdefault(partition, []).append((uid_str, *rest))
+    boards = {}
+    for partition, partition_rows in rows_by_partition.items():
+        boards[partition] = RankingBoard()
+        boards[partition].load(partition_rows, *partition_periods.get(partition, unconfigured_periods))
+    return boards
+
+def get_ranking_board(guild_id):
+    return ranking_boards.setdefault(guild_configs.partition(guild_id), RankingBoard())
+
+ranking_loaded_at = 0.0
+RANKING_RELOAD_SECONDS = 60 # 샤드 모드: 다른 프로세스의 퇴장 기록을 반영하기 위해 다시 읽는 주기
+
+# --- 예약 작업 리더 선출 (샤드 모드) ---
+# 주간 초기화 / 주간 요약 DM 은 임대를 가진 프로세스 하나만 실행 (저녁 알림은 서버를 맡은 프로세스가 실행)
+job_lease = SqliteLease(SQLITE_DB_FILE, "scheduled_jobs", SHARD_WORKER) if SHARDED else None
+
+def is_job_leader():
+    return job_lease is None or job_lease.is_leader
+
+def ensure_csv_file():
+    if os.path.exists(CSV_FILE):
+        return
     try:
         with open(CSV_FILE, 'w', newline='', encoding='utf-8-sig') as f: # utf-8-sig for Excel compatibility
             writer = csv.writer(f)
             writer.writerow([
                 'User ID', 'Username', 'Date', 'Start Time', 'End Time',
-                'Duration (min)'
+                'Duration (min)', 'Guild ID'
             ])
     except Exception as e:
         print(f"Error creating CSV file: {e}")
@@ -165,266 +340,483 @@ if not os.path.exists(CSV_FILE):
 # ======================================================================
 
 # ------------------ 자동 격려 및 자동 퇴장 ------------------
-@tasks.loop(minutes=10) # 루프 주기 (예: 10분마다)
-async def encourage_message_loop():
-    await bot.wait_until_ready() # 봇이 완전히 준비될 때까지 기다림
-    now = get_now()
-    # attendance_log 는 {uid: {"입장": datetime, "마지막_격려": int}} 형태
-    to_remove = [] # 자동 퇴장 처리할 사용자 목록
+# 입장 시 사용자별로 다음 이벤트(다음 정시 격려 또는 6시간 자동 퇴장) 시각 하나만 스케줄러에 예약하고
+# 퇴장 시 예약을 취소합니다. 스케줄러는 가장 이른 예약 시각까지 잠들었다가 마감된 사용자만 처리하므로
+# 메시지가 정확한 시각에 발송되고, 처리 비용이 전체 입장 인원과 무관합니다.
+# 자동 퇴장 기준은 서버별 설정 (기본 6시간 = 360분)
+attendance_scheduler = DeadlineScheduler()
+attendance_scheduler_task = None
+
+def format_minutes(minutes):
+    # 90 → "1시간 30분", 360 → "6시간", 45 → "45분"
+    hours, rest = divmod(minutes, 60)
+    if hours and rest:
+        return f"{hours}시간 {rest}분"
+    return f"{hours}시간" if hours else f"{rest}분"
+
+def schedule_attendance_event(uid, after_hours=0):
+    # attendance_log 의 입장 시간/마지막 격려 시간을 기준으로 다음 이벤트 예약
+    info = attendance_log.get(uid)
+    start_time = info.get("입장") if info else None
+    if not isinstance(start_time, datetime):
+        if info is not None:
+            print(f"Warning: Invalid '입장' time found for user {uid}. Skipping schedule.")
+        attendance_scheduler.cancel(uid)
+        return
 
-    # 반복 중 딕셔너리 변경을 피하기 위해 키 목록 복사
-    current_attendees = list(attendance_log.keys())
+    auto_checkout_minutes = guild_configs.get(info.get("서버")).auto_checkout_minutes
+    next_hour = max(info.get("마지막_격려", 0), after_hours) + 1
+    if next_hour * 60 < auto_checkout_minutes:
+        deadline = start_time + timedelta(hours=next_hour) # 다음 정시 격려
+    else:
+        deadline = start_time + timedelta(minutes=auto_checkout_minutes) # 자동 퇴장
+    attendance_scheduler.schedule(uid, deadline.timestamp())
 
-    for uid in current_attendees:
-        if uid not in attendance_log: # 루프 도중 퇴장한 경우 건너뛰기
-            continue
 
-        info = attendance_log[uid]
-        try:
-            start_time = info.get("입장")
-            last_encouragement = info.get("마지막_격려", 0)
-
-            # 입장 시간이 유효한 datetime 객체인지 확인
-            if not isinstance(start_time, datetime):
-                 print(f"Warning: Invalid '입장' time found for user {uid} in encourage loop. Skipping.")
-                 # 문제가 있는 데이터는 제거하는 것이 좋을 수 있음
-                 # to_remove.append(uid)
-                 continue
-
-            duration_seconds = (now - start_time).total_seconds()
-            duration_minutes = int(duration_seconds / 60)
-            current_hours = duration_minutes // 60
-
-            # --- 자동 퇴장 (6시간 = 360분) ---
-            if duration_minutes >= 360:
-                user = None
-                try:
-                     user = await bot.fetch_user(uid) # 사용자 객체 가져오기
-                     if user:
-                         await user.send(f"⏰ 6시간({duration_minutes}분)이 지나 자동 퇴장 처리되었습니다. 충분한 휴식도 중요해요! 내일도 파이팅! 💪")
-                         print(f"자동 퇴장 처리: {user.name} ({uid}), 시간: {duration_minutes}분")
-                     else: # fetch_user가 None을 반환할 수도 있음 (극히 드뭄)
-                         print(f"자동 퇴장 처리 실패: 사용자 {uid} 객체를 가져올 수 없음")
-                except discord.NotFound:
-                     print(f"자동 퇴장 처리 실패: 사용자 {uid}를 찾을 수 없음 (서버 나감 등)")
-                except discord.Forbidden:
-                     print(f"자동 퇴장 처리 실패 (Forbidden): 사용자 {uid}에게 DM을 보낼 수 없음")
-                except Exception as user_fetch_err:
-                    print(f"자동 퇴장 중 사용자({uid}) 정보 조회/메시지 발송 오류: {user_fetch_err}")
-
-                to_remove.append(uid)
-                # 자동 퇴장 시에는 CSV/JSON 기록은 남기지 않음 (선택사항)
-
-            # --- 격려 메시지 (1시간 단위) ---
-            # 마지막 격려 시간보다 현재 경과 시간이 크면 발송
-            elif current_hours > 0 and current_hours > last_encouragement:
-                user = None
-                try:
-                    user = await bot.fetch_user(uid)
-                    if user:
-                        await user.send(f"🎉 와우! 공부 시작 {current_hours}시간 돌파! 정말 대단해요! 잠시 스트레칭은 어때요? 😊")
-                        attendance_log[uid]["마지막_격려"] = current_hours # 격려 시간 업데이트
-                        print(f"격려 메시지 발송: {user.name} ({uid}), 시간: {current_hours}시간")
-                    else:
-                         print(f"격려 메시지 발송 실패: 사용자 {uid} 객체를 가져올 수 없음")
-                except discord.NotFound:
-                     print(f"격려 메시지 발송 실패: 사용자 {uid}를 찾을 수 없음 (서버 나감 등)")
-                except discord.Forbidden:
-                     print(f"격려 메시지 발송 실패 (Forbidden): 사용자 {uid}에게 DM을 보낼 수 없음")
-                     # DM 차단 시에도 격려 시간은 업데이트 할 지 결정 필요 (현재는 안 함)
-                except Exception as user_fetch_err:
-                     print(f"격려 메시지 발송 중 사용자({uid}) 정보 조회/메시지 발송 오류: {user_fetch_err}")
+@metrics.timed("bot_task_duration_seconds", task="attendance_scheduler")
+async def handle_attendance_event(uid, _payload=None):
+    # 예약 시각이 된 사용자 한 명 처리 (attendance_log 는 {uid: {"입장": datetime, "마지막_격려": int}} 형태)
+    task_monitor.mark("attendance_scheduler")
+    await sync_attendance(uid)
+    if not await attendance_store_call(attendance_store.owns, str(uid)): # 다른 프로세스에서 다시 입장함 → 그쪽에서 처리
+        attendance_log.pop(uid, None)
+        return
+    info = attendance_log.get(uid)
+    if info is None: # 그 사이 퇴장한 경우
+        return
 
+    now = get_now()
+    start_time = info.get("입장")
+    last_encouragement = info.get("마지막_격려", 0)
+    auto_checkout_minutes = guild_configs.get(info.get("서버")).auto_checkout_minutes
+    duration_seconds = (now - start_time).total_seconds()
+    duration_minutes = int(duration_seconds / 60)
+    current_hours = duration_minutes // 60
+
+    # --- 자동 퇴장 (서버 설정, 기본 6시간 = 360분) ---
+    if duration_minutes >= auto_checkout_minutes:
+        user = None
+        try:
+             user = await user_resolver.resolve(uid) # 캐시 우선, 없을 때만 API 조회
+             if user:
+                 await user.send(f"⏰ {format_minutes(auto_checkout_minutes)}({duration_minutes}분)이 지나 자동 퇴장 처리되었습니다. 충분한 휴식도 중요해요! 내일도 파이팅! 💪")
+                 print(f"자동 퇴장 처리: {user.name} ({uid}), 시간: {duration_minutes}분")
+             else: # 조회 결과가 None 일 수도 있음 (극히 드뭄)
+                 print(f"자동 퇴장 처리 실패: 사용자 {uid} 객체를 가져올 수 없음")
+        except discord.NotFound:
+             print(f"자동 퇴장 처리 실패: 사용자 {uid}를 찾을 수 없음 (서버 나감 등)")
+        except discord.Forbidden:
+             print(f"자동 퇴장 처리 실패 (Forbidden): 사용자 {uid}에게 DM을 보낼 수 없음")
+        except Exception as user_fetch_err:
+            print(f"자동 퇴장 중 사용자({uid}) 정보 조회/메시지 발송 오류: {user_fetch_err}")
+
+        # 자동 퇴장 처리된 사용자 로그에서 제거 및 파일 업데이트
+        # 자동 퇴장 시에는 CSV/JSON 기록은 남기지 않음 (선택사항)
+        if uid in attendance_log:
+            del attendance_log[uid]
+            await save_attendance_log(uid, "auto_checkout")
+        return
 
-        except Exception as e:
-            print(f"Error in encourage_message_loop for user {uid}: {e}")
-            # 개별 사용자 오류가 전체 루프를 멈추지 않도록 처리
-
-    # 자동 퇴장 처리된 사용자들 로그에서 제거 및 파일 업데이트
-    if to_remove:
-        changed = False
-        for uid in to_remove:
-            if uid in attendance_log:
+    # --- 격려 메시지 (1시간 단위) ---
+    # 마지막 격려 시간보다 현재 경과 시간이 크면 발송
+    if current_hours > 0 and current_hours > last_encouragement:
+        user = None
+        try:
+            user = await user_resolver.resolve(uid)
+            if user:
+                await user.send(f"🎉 와우! 공부 시작 {current_hours}시간 돌파! 정말 대단해요! 잠시 스트레칭은 어때요? 😊")
+                if uid in attendance_log:
+                    attendance_log[uid]["마지막_격려"] = current_hours # 격려 시간 업데이트
+                    await save_attendance_log(uid, "encourage")
+                print(f"격려 메시지 발송: {user.name} ({uid}), 시간: {current_hours}시간")
+            else:
+                 print(f"격려 메시지 발송 실패: 사용자 {uid} 객체를 가져올 수 없음")
+        except discord.NotFound:
+             print(f"격려 메시지 발송 실패: 사용자 {uid}를 찾을 수 없음 (서버 나감 등)")
+        except discord.Forbidden:
+             print(f"격려 메시지 발송 실패 (Forbidden): 사용자 {uid}에게 DM을 보낼 수 없음")
+             # DM 차단 시 격려 시간은 업데이트하지 않고, 다음 정시에 다시 시도
+        except Exception as user_fetch_err:
+             print(f"격려 메시지 발송 중 사용자({uid}) 정보 조회/메시지 발송 오류: {user_fetch_err}")
+
+    # 다음 이벤트 예약 (발송 실패 시에도 같은 시간대를 반복하지 않도록 현재 경과 시간 이후로)
+    if uid in attendance_log:
+        schedule_attendance_event(uid, after_hours=current_hours)
+
+
+# ------------------ 상태 로드 ------------------
+# 서버 설정/공부 기록/출석 상태/랭킹은 import 시점이 아니라 load_state() 에서 읽습니다.
+# run_bot() 은 이를 스레드에서 실행하면서 동시에 로그인/게이트웨이 연결을 진행하고,
+# 명령어/on_ready 는 state_ready 가 설정될 때까지 기다립니다.
+state_ready = asyncio.Event()
+
+def load_state():
+    global storage, ranking_loaded_at
+    with startup_timer.phase("guild_config"):
+        guild_configs.load()
+    with startup_timer.phase("storage_load"):
+        storage = create_storage(STORAGE_BACKEND, DATA_FILE, CSV_FILE, SQLITE_DB_FILE)
+    with startup_timer.phase("attendance_recover"):
+        load_attendance_log() # 봇 시작 시 출석 로그 복원
+        # 입장 중인 사용자들의 다음 격려/자동 퇴장 시각 다시 예약
+        for uid in attendance_log:
+            schedule_attendance_event(uid)
+    storage.start()
+    with startup_timer.phase("ranking_load"):
+        ranking_boards.clear()
+        ranking_boards.update(build_ranking_boards(storage.iter_ranking_rows))
+        ranking_loaded_at = time_module.monotonic()
+    ensure_csv_file()
+
+
+# ------------------ 음성 채널 자동 기록 ------------------
+# !설정 음성 으로 공부용 음성 채널을 지정한 서버에서는 채널 입장/퇴장이 곧 !입장/!퇴장 입니다 (voice_tracking.py).
+# 음성 상태 이벤트는 메모리에서 사용자별 전환 하나로 정리되고, 배치마다 출석 저장/CSV 기록을 한 번에 합니다.
+# 시작된 세션은 명령어 입장과 같은 attendance_log 항목("음성": True)이므로 격려/자동 퇴장도 그대로 적용됩니다.
+voice_tracker = VoiceSessionTracker()
+voice_tracker_task = None
+
+def is_voice_session(uid):
+    info = attendance_log.get(uid)
+    return info is not None and info.get("음성", False)
+
+
+@metrics.timed("bot_task_duration_seconds", task="voice_sessions")
+async def apply_voice_transitions(due):
+    # due: [(uid, (종류, guild_id, username, 시각))]. 음성 채널로 시작/종료된 세션을 한 번에 반영
+    task_monitor.mark("voice_sessions")
+    started, finished, csv_rows = [], [], []
+    for uid, (kind, guild_id, username, at) in due:
+        try:
+            await sync_attendance(uid) # 샤드 모드: 그 사이 다른 프로세스에서 입장/퇴장했을 수 있음
+            if kind == JOIN:
+                if uid in attendance_log: # 그 사이 !입장
+                    continue
+                attendance_log[uid] = {"입장": at, "마지막_격려": 0, "서버": guild_id, "음성": True}
+                schedule_attendance_event(uid)
+                started.append(uid)
+            elif is_voice_session(uid): # !퇴장/자동 퇴장으로 이미 끝난 세션은 건너뜀
+                info = attendance_log[uid]
+                _, csv_row = await record_study_session(uid, username, info.get("서버"), info["입장"], at)
+                csv_rows.append(csv_row)
                 del attendance_log[uid]
-                changed = True
-        if changed:
-            save_attendance_log() # 변경 사항이 있을 때만 저장
+                attendance_scheduler.cancel(uid)
+                finished.append(uid)
+        except Exception as e:
+            print(f"Error applying voice transition {kind} for user {uid}: {e}")
+    await save_attendance_logs(started, "voice_join")
+    await save_attendance_logs(finished, "voice_leave")
+    if csv_rows:
+        append_csv_rows(csv_rows)
+    if started or finished:
+        print(f"음성 채널 자동 기록: 입장 {len(started)}명, 퇴장 {len(finished)}명")
+
+
+def reconcile_voice_sessions(guilds):
+    # 시작/재연결/설정 변경 시 이벤트로 받지 못한 음성 상태를 맞춤:
+    # 공부 채널에 있는데 입장 상태가 아니면 입장 예약, 음성 세션인데 채널에 없으면 퇴장 예약 (퇴장 시각은 지금)
+    present = set()
+    for guild in guilds:
+        for channel_id in guild_configs.get(guild.id).voice_channel_ids:
+            for member in getattr(guild.get_channel(channel_id), "members", ()):
+                if member.bot:
+                    continue
+                present.add(member.id)
+                voice_tracker.joined(member.id, guild.id, str(member), guild_now(guild.id),
+                                     active=member.id in attendance_log)
+    guild_ids = {guild.id for guild in guilds}
+    for uid, info in list(attendance_log.items()):
+        if info.get("음성") and info.get("서버") in guild_ids and uid not in present:
+            user = bot.get_user(uid)
+            username = str(user) if user else (storage.get_summary(guild_configs.storage_key(info.get("서버"), uid)) or {}).get("username")
+            voice_tracker.left(uid, username or str(uid), guild_now(info.get("서버")), active=True)
+
 
 # ------------------ 주간 초기화 ------------------
-# 매주 월요일 00:00 KST 에 실행
+# 주간 기록/랭킹은 ISO 주(월요일 시작) 기준으로 조회 시점에 나뉘므로 월요일에 사용자 기록을 다시 쓰지 않습니다.
+# 지난 주 날짜는 각 사용자의 다음 기록 때 주간 보관소로 옮겨집니다 (storage.py, weekly_archive.py).
+# 매주 월요일 00:00 KST 에는 지난주 그래프 캐시만 비움 (사용자 수와 무관)
 @tasks.loop(time=time(hour=0, minute=0, tzinfo=ZoneInfo("Asia/Seoul")))
+@metrics.timed("bot_task_duration_seconds", task="weekly_reset_loop")
 async def weekly_reset_loop():
     await bot.wait_until_ready()
+    task_monitor.mark("weekly_reset_loop")
+    if not is_job_leader(): # 샤드 모드: 리더 프로세스만 실행
+        return
     now = get_now()
     # 정확히 월요일인지 확인
     if now.weekday() == 0:
-        print(f"주간 기록 초기화 시작: {now.strftime('%Y-%m-%d %H:%M:%S')}")
-        backup_data = {}
-        users_to_reset = list(user_data.keys()) # 반복 중 변경 대비
-
-        for uid_str in users_to_reset: # 키는 문자열이므로 uid_str 사용
-            if uid_str in user_data and "weekly" in user_data[uid_str] and user_data[uid_str]["weekly"]:
-                # 백업할 데이터가 있는 경우에만 백업
-                backup_data[uid_str] = {
-                    "username": user_data[uid_str].get("username", f"Unknown ({uid_str})"),
-                    "weekly_data": user_data[uid_str]["weekly"]
-                }
-                user_data[uid_str]["weekly"] = {} # 해당 유저의 주간 기록 초기화
-
-        # 백업 데이터 저장 (주차 정보 포함)
-        if backup_data: # 백업할 내용이 있을 때만 파일 생성
-            # 해당 주의 시작일(월요일)을 정확히 계산
-            today = now.date()
-            start_of_last_week = today - timedelta(days=today.weekday() + 7) # 지난주 월요일
-            backup_filename = f"weekly_backup_{start_of_last_week.strftime('%Y-W%U')}.json"
-            try:
-                with open(backup_filename, 'w', encoding='utf-8') as f:
-                    json.dump(backup_data, f, ensure_ascii=False, indent=2)
-                print(f"주간 기록 백업 완료: {backup_filename}")
-            except Exception as e:
-                 print(f"주간 기록 백업 실패: {e}")
+        chart_renderer.cache.clear() # 지난주 그래프 캐시 비우기
+        print(f"✅ 주간 기록 전환: {iso_week_key(now.date().isoformat())} 시작")
+
+
+# ------------------ 서버별 스터디 알림 ------------------
+# 서버마다 설정된 시간대/시각/요일에 알림 채널로 발송 (기본: 주중 20:00 Asia/Seoul).
+# 서버마다 루프를 만들지 않고 서버별 다음 알림 시각 하나만 스케줄러에 넣어 두고 하나의 태스크가 처리합니다.
+# 같은 시각(예: 여러 서버의 20:00)에 마감된 서버는 한 번에 모아 ChannelBroadcaster 로 나눠 보냅니다.
+reminder_scheduler = DeadlineScheduler()
+reminder_scheduler_task = None
+reminder_broadcaster = ChannelBroadcaster(bot.get_channel, bot.fetch_channel) # 알림 채널 객체 캐시
+
+def schedule_guild_reminder(guild_id):
+    # 다음 알림 시각 예약 (알림 채널이 없으면 예약 취소). payload 는 예정 시각 (발송 지연 측정용)
+    next_at = guild_configs.get(guild_id).next_reminder()
+    if next_at is None:
+        reminder_scheduler.cancel(guild_id)
+    else:
+        reminder_scheduler.schedule(guild_id, next_at.timestamp(), next_at.timestamp())
 
-        # 초기화된 user_data 저장
-        save_user_data()
-        print("✅ 주간 기록 초기화 완료")
 
+def render_reminder_message(config, active_users):
+    return (f"📢 저녁 {config.reminder_time} 입니다! 스터디 시작할 시간이에요.\n"
+            f"오늘도 목표를 향해 함께 달려봐요! {command_hint('입장')}으로 시작하세요.\n"
+            f"(현재 {active_users}명 공부 중 🔥)")
 
-# ------------------ 매일 저녁 8시 스터디 알림 (주중만) ------------------
-# 매일 20:00 KST 에 실행되지만, 실제 알림은 주중에만 발송
-@tasks.loop(time=time(hour=20, minute=0, tzinfo=ZoneInfo("Asia/Seoul")))
-async def daily_study_reminder():
-    await bot.wait_until_ready()
-    # --- 오늘 요일 확인 ---
-    now = get_now()
-    # weekday()는 월요일이 0, 일요일이 6입니다. 0~4가 주중(월~금)입니다.
-    if now.weekday() >= 5: # 5 이상이면 토요일 또는 일요일
-        # 주말에는 알림을 보내지 않고 조용히 종료
-        # print(f"{now.strftime('%Y-%m-%d %A')} - 주말이므로 스터디 알림을 건너<0xEB><0x9B><0x89>니다.") # 확인 로그 필요시 주석 해제
-        return
 
-    # --- 이하 로직은 주중(월~금)에만 실행됨 ---
+@metrics.timed("bot_task_duration_seconds", task="daily_study_reminder")
+async def daily_study_reminder(due):
+    # due: 같은 때 마감된 [(guild_id, 예정 시각)] 목록
+    task_monitor.mark("daily_study_reminder")
+    try:
+        # 발송 목록을 먼저 만듦: 채널(캐시), 서버별 입장 인원(배치당 한 번 집계), 메시지
+        # 입장 기록의 서버 기준 (기존 기록/DM 은 기본 서버로 집계)
+        counts = await attendance_store_call(attendance_store.count_by_guild)
+        targets = []
+        for guild_id, scheduled_at in due:
+            config = guild_configs.get(guild_id)
+            if SHARDED and bot.get_channel(config.channel_id) is None:
+                # 샤드 모드: 이 프로세스의 게이트웨이 캐시에 없는 채널(다른 샤드의 서버)이면 보내지 않음.
+                # 그 서버를 맡은 프로세스가 보내므로, API 조회로 찾아 보내면 같은 알림이 중복 발송됨
+                print(f"스터디 알림 채널(ID: {config.channel_id}, 서버: {guild_id})이 이 프로세스의 샤드에 없어 건너뜁니다.")
+                continue
+            channel = await reminder_broadcaster.resolve(config.channel_id)
+            if not isinstance(channel, discord.TextChannel):
+                print(f"스터디 알림 채널(ID: {config.channel_id}, 서버: {guild_id})을 찾을 수 없거나 텍스트 채널이 아닙니다.")
+                continue
+            active_users = counts.get(guild_id, 0) + (counts.get(None, 0) if guild_configs.partition(guild_id) is None else 0)
+            targets.append((guild_id, channel, render_reminder_message(config, active_users), scheduled_at))
+        if not targets:
+            return
+
+        stats = await reminder_broadcaster.broadcast(targets)
+        latencies = sorted(stats["latencies"])
+        for latency in latencies:
+            metrics.observe("bot_reminder_delivery_seconds", latency)
+        latency_text = (f", 지연 p50 {latencies[len(latencies) // 2]:.2f}초 / "
+                        f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.2f}초 / "
+                        f"최대 {latencies[-1]:.2f}초" if latencies else "")
+        print(f"스터디 시작 알림 전송 완료: {stats['sent']}/{len(targets)}개 채널, 실패 {stats['failed']}건, "
+              f"재시도 {stats['retries']}건, {stats['elapsed']}초{latency_text}")
+    except Exception as e:
+        print(f"Error in daily_study_reminder ({len(due)}개 서버): {e}")
+    finally:
+        for guild_id, _ in due:
+            schedule_guild_reminder(guild_id) # 다음 알림 예약
+
+
+async def resolve_home_guild():
+    # 기존 기록이 속한 서버(home guild)를 명령어를 받기 전(state_ready 전)에 정함. on_ready 까지 미루면 그 사이
+    # 처리한 명령어가 접두어 없는 기존 기록 대신 "서버ID:사용자ID" 키를 써서 같은 사용자의 기록이 둘로 나뉨.
+    # 정하는 순서 (한 번 정하면 저장하고 바꾸지 않음):
+    #   1) HOME_GUILD_ID 환경 변수 또는 이전에 정해 저장한 값
+    #   2) STUDY_CHANNEL_ID 채널이 속한 서버 (REST 조회)
+    #   3) 샤드 모드가 아니고 봇이 들어간 서버가 하나뿐이면 그 서버
+    # 여러 서버에 들어가 있어 정할 수 없으면 기본 서버 없음으로 정함: 모든 서버가 "서버ID:사용자ID" 키를 쓰고
+    # 기존 기록은 DM 에서만 보이므로, 기존 서버가 있다면 HOME_GUILD_ID 로 지정해야 함.
+    # API 조회가 실패하면 정하지 않고 두며, on_ready 의 migrate_legacy_reminder_channel() 이 게이트웨이 캐시로 다시 시도
+    if guild_configs.home_decided:
+        return
     channel_id_str = os.getenv("STUDY_CHANNEL_ID")
-    if not channel_id_str:
-        print("환경 변수 'STUDY_CHANNEL_ID'가 설정되지 않았습니다. 스터디 알림을 보낼 수 없습니다.")
+    try:
+        home_id = None
+        if channel_id_str and channel_id_str.isdigit():
+            channel = await bot.fetch_channel(int(channel_id_str))
+            home_id = getattr(getattr(channel, "guild", None), "id", None)
+        if home_id is None and not SHARDED:
+            guilds = [guild async for guild in bot.fetch_guilds(limit=2)]
+            if len(guilds) == 1:
+                home_id = guilds[0].id
+            elif guilds:
+                print("경고: 봇이 여러 서버에 있어 기존 공부 기록의 서버를 정할 수 없습니다. "
+                      "기존 기록은 DM 에서만 조회되며, 원래 서버가 있다면 HOME_GUILD_ID 환경 변수로 지정하세요.")
+    except discord.HTTPException as e:
+        print(f"기존 공부 기록의 서버 조회 실패 (게이트웨이 연결 후 다시 시도): {e}")
         return
+    await asyncio.to_thread(guild_configs.set_home_guild, home_id) # 설정 저장 (fsync/SQLite) 은 스레드에서
+    print(f"기존 공부 기록의 서버: {home_id if home_id is not None else '없음'}")
 
-    try:
-        channel_id = int(channel_id_str)
-        channel = bot.get_channel(channel_id)
-
-        if channel and isinstance(channel, discord.TextChannel):
-            active_users = len(attendance_log)
-            message = (f"📢 저녁 8시입니다! 스터디 시작할 시간이에요.\n"
-                       f"오늘도 목표를 향해 함께 달려봐요! `!입장`으로 시작하세요.\n"
-                       f"(현재 {active_users}명 공부 중 🔥)")
-            await channel.send(message)
-            print(f"스터디 시작 알림 전송 완료 (채널: {channel.name}) - 주중 알림")
-        else:
-            print(f"스터디 알림 채널(ID: {channel_id})을 찾을 수 없거나 텍스트 채널이 아닙니다.")
 
-    except ValueError:
-         print(f"환경 변수 'STUDY_CHANNEL_ID'({channel_id_str})가 올바른 숫자 형식이 아닙니다.")
-    except discord.Forbidden:
-         print(f"스터디 알림 채널(ID: {channel_id})에 메시지를 보낼 권한이 없습니다.")
-    except Exception as e:
-        print(f"Error in daily_study_reminder: {e}")
+async def migrate_legacy_reminder_channel():
+    # 기존 STUDY_CHANNEL_ID 환경 변수: 해당 채널의 서버 설정이 없으면 알림 채널로 등록.
+    # 기존 기록이 속한 서버(home guild)는 보통 resolve_home_guild() 가 이미 정함. 그때 API 조회가 실패했으면
+    # 여기서 정함: 그 채널의 서버, 없으면 서버가 하나뿐일 때 그 서버
+    channel_id_str = os.getenv("STUDY_CHANNEL_ID")
+    channel = None
+    if channel_id_str:
+        try:
+            channel = bot.get_channel(int(channel_id_str))
+        except ValueError:
+            print(f"환경 변수 'STUDY_CHANNEL_ID'({channel_id_str})가 올바른 숫자 형식이 아닙니다.")
+    legacy_guild = getattr(channel, "guild", None)
+    if legacy_guild is not None and legacy_guild.id not in guild_configs.configs:
+        await asyncio.to_thread(guild_configs.set, legacy_guild.id, GuildConfig(channel_id=channel.id))
+        print(f"STUDY_CHANNEL_ID 를 서버 {legacy_guild.name} 의 알림 채널로 등록했습니다.")
+    if not guild_configs.home_decided:
+        if legacy_guild is None and len(bot.guilds) == 1 and not SHARDED:
+            legacy_guild = bot.guilds[0]
+        await asyncio.to_thread(guild_configs.set_home_guild, legacy_guild.id if legacy_guild is not None else None)
+        print(f"기존 공부 기록의 서버: {legacy_guild.name if legacy_guild is not None else '없음'}")
 
 
 # ------------------ 주간 요약 자동 DM ------------------
-# 매주 토요일 08:00 KST 에 실행
-@tasks.loop(time=time(hour=8, minute=0, tzinfo=ZoneInfo("Asia/Seoul")))
+# 매주 토요일 08:00 KST 에 실행. 토요일 08:00 이후에 재시작하면 다음 실행이 일요일이 되므로,
+# on_ready 에서 이번 주 발송이 끝나지 않았으면 이어서 보냄 (catch_up_weekly_summary)
+WEEKLY_SUMMARY_WEEKDAY = 5 # 토요일
+WEEKLY_SUMMARY_TIME = time(hour=8, minute=0, tzinfo=ZoneInfo("Asia/Seoul"))
+weekly_summary_lock = asyncio.Lock() # 정각 실행과 재시작 후 이어 보내기가 겹치지 않도록
+
+def weekly_summary_run_id(now):
+    iso_year, iso_week, _ = now.isocalendar()
+    return f"weekly_summary_{iso_year}-W{iso_week:02d}"
+
+def weekly_summary_pending(now):
+    # 이번 주 발송 시각이 지났는데 완료 표시가 없으면 True (아직 시작하지 않은 경우 포함)
+    if now.weekday() != WEEKLY_SUMMARY_WEEKDAY or now.time() < WEEKLY_SUMMARY_TIME.replace(tzinfo=None):
+        return False
+    return not is_run_complete(weekly_summary_run_id(now))
+
+@tasks.loop(time=WEEKLY_SUMMARY_TIME)
+@metrics.timed("bot_task_duration_seconds", task="weekly_summary_dm")
 async def weekly_summary_dm():
     await bot.wait_until_ready()
+    task_monitor.mark("weekly_summary_dm")
+    if not is_job_leader(): # 샤드 모드: 리더 프로세스만 실행
+        return
     now = get_now()
-    # 토요일(weekday 5)인지 확인
-    if now.weekday() == 5:
-        print(f"주간 요약 DM 발송 시작: {now.strftime('%Y-%m-%d %H:%M:%S')}")
-        users_to_dm = list(user_data.keys()) # 반복 중 변경 대비
-
-        for uid_str in users_to_dm:
-            # weekly 데이터는 월요일 0시에 초기화되므로, 토요일 아침에는 '이번 주'의 데이터가 맞음.
-            if uid_str not in user_data: continue # 혹시 모를 데이터 불일치
+    if now.weekday() == WEEKLY_SUMMARY_WEEKDAY:
+        await run_weekly_summary(now)
 
-            data = user_data[uid_str]
-            username = data.get("username", f"User {uid_str}") # 이름 가져오기
-            weekly_data = data.get("weekly", {})
-
-            if not weekly_data: # 이번 주 기록이 없으면 건너뛰기
-                continue
-
-            try:
-                uid = int(uid_str) # DM 발송 위해 int로 변환
-            except ValueError:
-                print(f"Invalid user ID format found: {uid_str}. Skipping weekly summary.")
-                continue
 
-            # 날짜 기준으로 정렬
-            try:
-                sorted_weekly_data = dict(sorted(weekly_data.items()))
-            except Exception as sort_err:
-                print(f"Error sorting weekly data for user {uid_str}: {sort_err}. Skipping.")
-                continue
-
-            days = list(sorted_weekly_data.keys())
-            values = list(sorted_weekly_data.values())
-            weekly_sum = sum(values)
+async def catch_up_weekly_summary():
+    # 재시작/재연결 후: 이번 주 발송이 중간에 끊겼거나 정각 실행을 놓쳤으면 남은 사용자에게 이어서 발송
+    if not is_job_leader() or weekly_summary_lock.locked():
+        return
+    now = get_now()
+    if await asyncio.to_thread(weekly_summary_pending, now):
+        print("이번 주 주간 요약 DM 발송이 끝나지 않아 이어서 보냅니다.")
+        await run_weekly_summary(now)
 
-            # 데이터가 없을 경우 max() 오류 방지
-            if not values:
-                max_value = 0
-            else:
-                max_value = max(values) if max(values) > 0 else 60 # 최소 y축 높이 확보
 
-            filename = f"weekly_summary_{uid_str}.png"
-            try:
-                # --- 시각화 차트 생성 ---
-                plt.figure(figsize=(10, 5))
-                bars = plt.bar(days, values, color='mediumpurple')
-                plt.title(f"{username}님의 이번 주 공부 시간 요약", fontsize=16)
-                plt.xlabel("날짜", fontsize=12)
-                plt.ylabel("공부 시간 (분)", fontsize=12)
-                plt.xticks(rotation=45, ha='right')
-                plt.yticks(range(0, max_value + 60, 60)) # +60 해서 상단 여유 확보
-                plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-                for bar in bars:
-                    yval = bar.get_height()
-                    if yval > 0:
-                        plt.text(bar.get_x() + bar.get_width()/2.0, yval, int(yval), va='bottom', ha='center', fontsize=10)
-
-                plt.tight_layout()
-                plt.savefig(filename)
-                plt.close() # 중요: plt 메모리 해제
-
-                # --- DM 발송 ---
-                user = None
-                try:
-                    user = await bot.fetch_user(uid)
-                    if user:
-                        summary_message = (f"📈 **{username}**님, 이번 주 공부 시간 요약입니다!\n"
-                                           f" • 총 공부 시간: **{weekly_sum}분**\n"
-                                           f"주말 잘 보내시고 다음 주도 파이팅이에요! 👍")
-                        await user.send(summary_message, file=discord.File(filename))
-                        print(f"주간 요약 DM 발송 성공: {username} ({uid})")
-                    else:
-                        print(f"주간 요약 DM 발송 실패: 사용자 {uid} 객체를 가져올 수 없음")
-                except discord.NotFound:
-                     print(f"주간 요약 DM 발송 실패: 사용자 {uid}를 찾을 수 없음 (서버 나감 등)")
-                except discord.Forbidden: # DM 차단 등 권한 문제
-                     print(f"주간 요약 DM 발송 실패 (Forbidden): {username} ({uid}). DM이 차단되었을 수 있습니다.")
-                except Exception as dm_err:
-                    print(f"Error sending weekly summary DM to {uid} ({username}): {dm_err}")
+async def run_weekly_summary(now):
+    if weekly_summary_lock.locked(): # 이미 발송 중
+        return
+    async with weekly_summary_lock:
+        print(f"주간 요약 DM 발송 시작: {now.strftime('%Y-%m-%d %H:%M:%S')}")
+        # weekly 데이터는 월요일 0시에 초기화되므로, 토요일 아침에는 '이번 주'의 데이터가 맞음.
+        # 같은 주 재시작 시 이어서 발송 (이전 실행에서 실패한 사용자는 다시 시도)
+        dispatcher = BulkDMDispatcher(weekly_summary_run_id(now), needs_dm_channel=needs_dm_channel)
+        week_start = current_week_start(now)
+        weekly_rows = await run_storage(lambda: list(storage.iter_weekly(week_start)))
+        stats = await dispatcher.run(
+            ((uid_str, (username, weekly_data)) for uid_str, username, weekly_data in weekly_rows),
+            prepare_weekly_summary, send_weekly_summary)
+        print(f"주간 요약 DM 발송 완료: 성공 {stats['sent']}건, 실패 {stats['failed']}건, 발송 불가 {stats['undeliverable']}건, "
+              f"이전 실행에서 완료 {stats['resumed']}건 / 실패 후 재발송 {stats['resent']}건, "
+              f"재시도 {stats['retries']}건 (429: {stats['rate_limited']}건), "
+              f"{stats['elapsed']}초, {stats['throughput']}건/초")
+        print(f"사용자 조회: 캐시 {user_resolver.api_calls_avoided()}건 / API {user_resolver.stats['api_fetches']}건")
+
+
+def needs_dm_channel(uid_str):
+    # 캐시된 User 에 DM 채널이 이미 있으면 발송 시 채널 생성 요청이 나가지 않음
+    _, user_id = split_storage_key(uid_str)
+    user = user_resolver.cached(user_id)
+    return user is None or user.dm_channel is None
+
+
+async def prepare_weekly_summary(uid_str, item):
+    # 주간 요약 DM 내용 준비 (차트 렌더링은 프로세스 풀에서)
+    username, weekly_data = item
+    weekly_sum = sum(weekly_data.values())
+    png_bytes = await chart_renderer.render_weekly(weekly_data, username, style="summary", owner=uid_str)
+    guild_id, _ = split_storage_key(uid_str)
+    guild = bot.get_guild(guild_id) if guild_id is not None else None
+    guild_label = f" ({guild.name})" if guild is not None else ""
+    summary_message = (f"📈 **{username}**님, 이번 주{guild_label} 공부 시간 요약입니다!\n"
+                       f" • 총 공부 시간: **{weekly_sum}분**\n"
+                       f"주말 잘 보내시고 다음 주도 파이팅이에요! 👍")
+    return summary_message, png_bytes
+
+
+async def send_weekly_summary(uid_str, prepared):
+    # 실패 시 예외를 그대로 올려 발송기가 재시도 여부를 판단하도록 함
+    summary_message, png_bytes = prepared
+    _, user_id = split_storage_key(uid_str) # 서버별 기록 키 → 사용자 ID
+    await user_resolver.send(int(user_id), summary_message, file=discord.File(io.BytesIO(png_bytes), filename=f"weekly_summary_{user_id}.png"))
+
+# ------------------ 상태 확인 서버 ------------------
+# Flask 스레드 대신 봇과 같은 이벤트 루프에서 실행 (/, /health, /live, /metrics)
+def collect_bot_metrics():
+    scheduler_running = attendance_scheduler_task is not None and not attendance_scheduler_task.done()
+    cache_stats = chart_renderer.cache.stats()
+    samples = [
+        ("bot_attendance_active_users", "gauge", "Users currently checked in", None, len(attendance_log)),
+        ("bot_attendance_scheduled", "gauge", "Pending encouragement/auto-checkout deadlines", None,
+         len(attendance_scheduler)),
+        ("bot_attendance_scheduler_running", "gauge", "1 if the attendance scheduler task is alive", None,
+         int(scheduler_running)),
+        ("bot_attendance_events_processed_total", "counter", "Scheduled attendance events handled", None,
+         attendance_scheduler.processed),
+    ]
+    for task_name, loop in (("weekly_reset_loop", weekly_reset_loop), ("weekly_summary_dm", weekly_summary_dm)):
+        samples.append(("bot_task_running", "gauge", "1 if the task loop is running", {"task": task_name},
+                        int(loop.is_running())))
+    reminder_running = reminder_scheduler_task is not None and not reminder_scheduler_task.done()
+    samples.append(("bot_task_running", "gauge", "1 if the task loop is running", {"task": "daily_study_reminder"},
+                    int(reminder_running)))
+    samples.append(("bot_reminders_scheduled", "gauge", "Guilds with a pending daily reminder", None,
+                    len(reminder_scheduler)))
+    voice_running = voice_tracker_task is not None and not voice_tracker_task.done()
+    samples.append(("bot_task_running", "gauge", "1 if the task loop is running", {"task": "voice_sessions"},
+                    int(voice_running)))
+    samples.append(("bot_voice_pending_transitions", "gauge", "Voice joins/leaves waiting for the next batch", None,
+                    len(voice_tracker)))
+    for key, value in voice_tracker.stats.items():
+        samples.append((f"bot_voice_{key}_total", "counter", f"Voice state {key} handled", None, value))
+    for key in ("hits", "misses"):
+        samples.append((f"bot_chart_cache_{key}_total", "counter", f"Chart cache {key}", None, cache_stats[key]))
+    for key in ("entries", "bytes"):
+        samples.append((f"bot_chart_cache_{key}", "gauge", f"Chart cache {key}", None, cache_stats[key]))
+    for key, value in user_resolver.stats.items():
+        samples.append((f"bot_user_resolver_{key}_total", "counter", f"User lookups served by {key}", None, value))
+    samples.append(("bot_job_leader", "gauge", "1 if this process runs the scheduled jobs", None, int(is_job_leader())))
+    for phase, seconds in startup_timer.durations().items():
+        samples.append(("bot_startup_phase_seconds", "gauge", "Time spent in each startup phase", {"phase": phase}, seconds))
+    if startup_timer.ready_at is not None:
+        samples.append(("bot_startup_ready_seconds", "gauge", "Time from process import to the first on_ready", None,
+                        round(startup_timer.ready_at, 3)))
+    samples.extend(metrics.samples()) # 명령어/작업/저장/렌더링 히스토그램, API 호출 수
+    return samples
+
+health_server = HealthServer(bot, task_monitor, metrics_provider=collect_bot_metrics, snapshot_provider=metrics.snapshot)
+loop_watchdog = LoopWatchdog() # LOOP_WATCHDOG_THRESHOLD 가 설정된 경우에만 동작
+profiler = SamplingProfiler()
+
+
+# ------------------ 명령어 계측 ------------------
+# 모든 명령어의 실행 시간을 히스토그램으로 기록 (after_invoke 는 오류가 나도 호출됨)
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.command_started_at = time_module.perf_counter()
+    await state_ready.wait() # 시작 직후 상태 로드 전에 들어온 명령어는 로드가 끝난 뒤 처리
+
+@bot.after_invoke
+async def record_command_timer(ctx):
+    started_at = getattr(ctx, "command_started_at", None)
+    if started_at is not None:
+        metrics.observe("bot_command_duration_seconds", time_module.perf_counter() - started_at,
+                        command=ctx.command.name)
 
-            except Exception as plot_err:
-                print(f"Error generating plot or sending summary for user {uid_str}: {plot_err}")
-                plt.close() # 오류 발생 시에도 plt 리소스 해제 시도
-            finally:
-                # 임시 파일 삭제
-                if os.path.exists(filename):
-                    try:
-                        os.remove(filename)
-                    except Exception as remove_err:
-                        print(f"Error removing temp summary file {filename}: {remove_err}")
 
 # ======================================================================
 #                       봇 이벤트 및 명령어 정의
@@ -433,28 +825,113 @@ async def weekly_summary_dm():
 # ------------------ 봇 준비 ------------------
 @bot.event
 async def on_ready():
+    global attendance_scheduler_task, reminder_scheduler_task, voice_tracker_task
+    await state_ready.wait() # 로그인과 동시에 진행한 상태 로드가 끝날 때까지
+    startup_timer.finish("gateway_connect")
+    if startup_timer.mark_ready():
+        print(f"시작 단계별 소요 시간:\n{startup_timer.report()}")
+        if startup_timer.ready_at > startup_timer.target:
+            print(f"경고: on_ready 까지 {startup_timer.ready_at:.1f}초로 목표({startup_timer.target:.0f}초)를 넘었습니다.")
+        if SLASH_COMMANDS and SLASH_SYNC and (not SHARDED or 0 in (SHARD_IDS or [0])): # 샤드 0 프로세스만
+            asyncio.create_task(sync_slash_commands())
     print(f'{bot.user} 작동 시작!')
     print(f"현재 {len(attendance_log)}명의 사용자가 입장 상태입니다.")
+    # 차트 워커 프로세스 미리 준비 (폰트 로드 포함)
+    asyncio.create_task(chart_renderer.warmup())
     # 정의된 태스크 루프 시작
-    encourage_message_loop.start()
+    if attendance_scheduler_task is None or attendance_scheduler_task.done(): # 재연결 시 중복 실행 방지
+        attendance_scheduler_task = asyncio.create_task(attendance_scheduler.run(handle_attendance_event))
     weekly_reset_loop.start()
-    daily_study_reminder.start()
     weekly_summary_dm.start()
+    asyncio.create_task(catch_up_weekly_summary()) # 토요일 08:00 이후 재시작 시 이번 주 발송 이어 보내기
+    # 서버별 저녁 알림 예약 (이 프로세스가 맡은 서버만)
+    await migrate_legacy_reminder_channel()
+    for guild in bot.guilds:
+        schedule_guild_reminder(guild.id)
+    if reminder_scheduler_task is None or reminder_scheduler_task.done():
+        reminder_scheduler_task = asyncio.create_task(reminder_scheduler.run_batches(daily_study_reminder))
+    # 음성 채널 자동 기록 (공부 채널을 지정한 서버만)
+    reconcile_voice_sessions(bot.guilds)
+    if voice_tracker_task is None or voice_tracker_task.done():
+        voice_tracker_task = asyncio.create_task(voice_tracker.run(apply_voice_transitions))
     print("자동화 작업 루프 시작됨.")
 
 
+@bot.event
+async def on_guild_join(guild):
+    schedule_guild_reminder(guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    reminder_scheduler.cancel(guild.id)
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    # 공부용 음성 채널 입장/퇴장만 전환으로 예약 (음소거, 공부 채널끼리 이동 등은 무시). 디스크 기록은 배치에서
+    if member.bot or not state_ready.is_set(): # 로드 전 이벤트는 on_ready 의 reconcile 이 반영
+        return
+    study_channels = guild_configs.get(member.guild.id).voice_channel_ids
+    if not study_channels:
+        return
+    was_in = before.channel is not None and before.channel.id in study_channels
+    now_in = after.channel is not None and after.channel.id in study_channels
+    if was_in == now_in:
+        return
+    guild_id = member.guild.id
+    if now_in:
+        voice_tracker.joined(member.id, guild_id, str(member), guild_now(guild_id), active=member.id in attendance_log)
+    else:
+        voice_tracker.left(member.id, str(member), guild_now(guild_id), active=is_voice_session(member.id))
+
+
 # ------------------ 입장 / 퇴장 ------------------
+async def record_study_session(uid, username, guild_id, start_time, now):
+    # 퇴장 한 건을 저장소/그래프 캐시/랭킹에 반영하고 (공부 시간(분), CSV 행) 반환
+    minutes = int((now - start_time).total_seconds() / 60)
+
+    # 분이 음수인 경우 방지 (시스템 시간 변경 등 예외 상황)
+    if minutes < 0: minutes = 0
+
+    uid_str = guild_configs.storage_key(guild_id, uid) # 저장소 키 ("서버ID:사용자ID", 기본 서버는 사용자 ID)
+    today_str = now.date().isoformat()
+    month_str = now.strftime("%Y-%m")
+
+    # 시간 누적 (일간/주간/월간/총합)
+    with metrics.timer("bot_storage_duration_seconds", op="record_session"):
+        await run_storage(storage.record_session, uid_str, username, today_str, month_str, minutes,
+                          start_time.strftime('%H:%M:%S'), now.strftime('%H:%M:%S'))
+    chart_renderer.cache.invalidate(uid_str) # 주간 데이터가 바뀌었으므로 캐시된 그래프 폐기
+    # 랭킹 갱신 O(log n). 저장소와 같은 (서버 시간대 기준) 날짜로 주를 정함
+    get_ranking_board(guild_id).record(str(uid), username, minutes, month_str, current_week_start(now))
+    csv_row = [uid, username, today_str, start_time.strftime('%H:%M:%S'), now.strftime('%H:%M:%S'), minutes,
+               guild_configs.partition(guild_id) or '']
+    return minutes, csv_row
+
+
+def append_csv_rows(rows):
+    # CSV 로그 기록 (여러 행이면 파일을 한 번만 열어 기록)
+    try:
+        with open(CSV_FILE, 'a', newline='', encoding='utf-8-sig') as f:
+            csv.writer(f).writerows(rows)
+    except Exception as e:
+        print(f"Error writing to CSV file: {e}")
+
+
 @bot.command(name="입장")
 async def check_in(ctx):
-    now = get_now()
+    guild_id = ctx_guild_id(ctx)
+    now = guild_now(guild_id)
     uid = ctx.author.id
+    await sync_attendance(uid) # 샤드 모드: 다른 프로세스에서 입장했는지 확인
     if uid in attendance_log:
         await ctx.send(f"{ctx.author.mention} 이미 입장 상태입니다. 퇴장 후 다시 시도해주세요.")
         return
 
     try:
-        attendance_log[uid] = {"입장": now, "마지막_격려": 0}
-        save_attendance_log() # 입장 시 파일 저장
+        attendance_log[uid] = {"입장": now, "마지막_격려": 0, "서버": guild_id} # 퇴장 시 이 서버에 기록
+        voice_tracker.forget(uid) # 명령어 입장이 음성 채널 자동 입장보다 우선
+        await save_attendance_log(uid, "check_in") # 입장 이벤트 기록
+        schedule_attendance_event(uid) # 1시간 뒤 첫 격려 메시지 예약
         await ctx.send(
             f"{ctx.author.mention} 입장 시간 기록 완료! 🟢 {now.strftime('%H:%M:%S')}")
     except Exception as e:
@@ -462,17 +939,21 @@ async def check_in(ctx):
         # 실패 시 메모리에서도 제거 시도 (선택적)
         if uid in attendance_log:
             del attendance_log[uid]
+            await save_attendance_log(uid, "remove")
+        attendance_scheduler.cancel(uid)
         await ctx.send("입장 기록 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.")
 
 
 @bot.command(name="퇴장")
 async def check_out(ctx):
-    now = get_now()
     uid = ctx.author.id
+    await sync_attendance(uid) # 샤드 모드: 다른 프로세스에서 입장했을 수 있음
 
     if uid not in attendance_log:
-        await ctx.send(f"{ctx.author.mention} 입장 기록이 없습니다. 먼저 `!입장`을 입력해주세요.")
+        await ctx.send(f"{ctx.author.mention} 입장 기록이 없습니다. 먼저 {command_hint('입장')}을 입력해주세요.")
         return
+    guild_id = attendance_log[uid].get("서버") # 입장한 서버 기준으로 기록 (퇴장은 DM/다른 채널에서도 가능)
+    now = guild_now(guild_id)
 
     try:
         # attendance_log 에는 datetime 객체가 저장되어 있음 (load 시 변환했으므로)
@@ -485,68 +966,29 @@ async def check_out(ctx):
              # 문제가 있는 로그 제거
              if uid in attendance_log:
                  del attendance_log[uid]
-                 save_attendance_log()
+                 await save_attendance_log(uid, "remove")
+             attendance_scheduler.cancel(uid)
              return
 
-        minutes = int((now - start_time).total_seconds() / 60)
-
-        # 분이 음수인 경우 방지 (시스템 시간 변경 등 예외 상황)
-        if minutes < 0: minutes = 0
-
-        # 사용자 데이터 구조 초기화 (처음 기록 시)
-        uid_str = str(uid) # JSON 키는 문자열이어야 함
-        if uid_str not in user_data:
-            user_data[uid_str] = {
-                "username": str(ctx.author), # 사용자 이름도 저장
-                "total": 0,
-                "weekly": {},
-                "daily": {},
-                "monthly": {}
-            }
-        # 사용자 이름 업데이트 (닉네임 변경 대비)
-        user_data[uid_str]["username"] = str(ctx.author)
-
-        today_str = now.date().isoformat()
-        month_str = now.strftime("%Y-%m")
-        udata = user_data[uid_str]
-
-        # 시간 누적 (없는 키 접근 방지 위해 .get 사용)
-        udata["total"] = udata.get("total", 0) + minutes
-        udata["weekly"] = udata.get("weekly", {})
-        udata["daily"] = udata.get("daily", {})
-        udata["monthly"] = udata.get("monthly", {})
-
-        udata["weekly"][today_str] = udata["weekly"].get(today_str, 0) + minutes
-        udata["daily"][today_str] = udata["daily"].get(today_str, 0) + minutes
-        udata["monthly"][month_str] = udata["monthly"].get(month_str, 0) + minutes
-
-        save_user_data() # 유저 데이터 저장
-
-        # CSV 로그 기록
-        try:
-            with open(CSV_FILE, 'a', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    uid, str(ctx.author), today_str,
-                    start_time.strftime('%H:%M:%S'),
-                    now.strftime('%H:%M:%S'), minutes
-                ])
-        except Exception as e:
-            print(f"Error writing to CSV file: {e}")
+        minutes, csv_row = await record_study_session(uid, str(ctx.author), guild_id, start_time, now)
+        append_csv_rows([csv_row])
 
         await ctx.send(
             f"{ctx.author.mention} 퇴장 기록 완료! 🔴 총 공부 시간: {minutes}분")
 
         # 출석 로그에서 제거 및 파일 저장
         del attendance_log[uid]
-        save_attendance_log()
+        await save_attendance_log(uid, "check_out")
+        attendance_scheduler.cancel(uid) # 예약된 격려/자동 퇴장 취소
+        voice_tracker.forget(uid)
 
     except KeyError: # 혹시 모를 동시성 문제나 데이터 오류
          await ctx.send(f"{ctx.author.mention} 퇴장 처리 중 오류가 발생했습니다. (KeyError)")
          # 문제가 지속되면 로그 확인 필요
          if uid in attendance_log: # 안전하게 제거 시도
              del attendance_log[uid]
-             save_attendance_log()
+             await save_attendance_log(uid, "remove")
+         attendance_scheduler.cancel(uid)
     except Exception as e:
         print(f"Error in 퇴장 command for user {uid}: {e}")
         await ctx.send("퇴장 기록 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.")
@@ -554,35 +996,35 @@ async def check_out(ctx):
 
 # ------------------ 통계/시각화 (통합) ------------------
 @bot.command(name="통계")
+@token_bucket_check(stats_user_limiter, stats_channel_limiter)
 async def stats(ctx, 기간: str = "주간"):
-    uid = str(ctx.author.id)
-    now = get_now()
+    guild_id = ctx_guild_id(ctx)
+    uid = guild_configs.storage_key(guild_id, ctx.author.id) # 이 서버의 기록
+    now = guild_now(guild_id)
     기간 = 기간.lower() # 입력값 소문자 변환
 
-    if uid not in user_data:
+    summary = await run_storage(storage.get_summary, uid)
+    if summary is None:
         await ctx.send(f"{ctx.author.mention} 아직 기록된 공부 시간이 없습니다.")
         return
 
-    udata = user_data[uid]
-    username = udata.get("username", ctx.author.display_name) # 저장된 이름 또는 현재 이름
+    username = summary.get("username") or ctx.author.display_name # 저장된 이름 또는 현재 이름
 
     try:
         if 기간 == "일간":
             today_str = now.date().isoformat()
-            daily_data = udata.get("daily", {})
-            daily_minutes = daily_data.get(today_str, 0)
+            daily_minutes = await run_storage(storage.get_daily_minutes, uid, today_str)
             await ctx.send(f"📅 **{username}**님의 오늘 공부 시간: **{daily_minutes}분**")
 
         elif 기간 == "월간":
             month_str = now.strftime("%Y-%m")
-            monthly_data = udata.get("monthly", {})
-            monthly_minutes = monthly_data.get(month_str, 0)
+            monthly_minutes = await run_storage(storage.get_monthly_minutes, uid, month_str)
             await ctx.send(f"📆 **{username}**님의 이번 달 총 공부 시간: **{monthly_minutes}분**")
 
         elif 기간 == "주간":
-            weekly_data = udata.get("weekly", {})
+            weekly_data = await get_weekly_minutes(uid, current_week_start(now))
             weekly_sum = sum(weekly_data.values())
-            total_sum = udata.get("total", 0)
+            total_sum = summary.get("total", 0)
 
             # --- 주간 시각화 생성 ---
             if not weekly_data:
@@ -593,98 +1035,405 @@ async def stats(ctx, 기간: str = "주간"):
                                f" 이번 주 기록이 아직 없습니다.")
                  return
 
-            # 날짜 기준으로 정렬하여 시각화
             try:
-                sorted_weekly_data = dict(sorted(weekly_data.items()))
-            except Exception as sort_err:
-                print(f"Error sorting weekly data for stats command (user {uid}): {sort_err}")
-                await ctx.send("주간 통계 데이터 정렬 중 오류가 발생했습니다.")
-                return
-
-            days = list(sorted_weekly_data.keys())
-            values = list(sorted_weekly_data.values())
-
-            # 데이터가 없을 경우 max() 오류 방지
-            if not values:
-                max_value = 0
-            else:
-                max_value = max(values) if max(values) > 0 else 60 # 최소 y축 높이 확보
-
-            filename = f"weekly_chart_{uid}.png"
-            try:
-                plt.figure(figsize=(10, 5)) # 크기 조정
-                bars = plt.bar(days, values, color='skyblue') # 색상 지정
-                plt.title(f"{username}님의 이번 주 공부 시간", fontsize=16)
-                plt.xlabel("날짜", fontsize=12)
-                plt.ylabel("공부 시간 (분)", fontsize=12)
-                plt.xticks(rotation=45, ha='right') # 라벨 회전 및 정렬
-                plt.yticks(range(0, max_value + 60, 60)) # y축 눈금 간격 조정 (+60으로 상단 여유)
-                plt.grid(axis='y', linestyle='--', alpha=0.7) # 가로선 추가
-
-                # 막대 위에 값 표시
-                for bar in bars:
-                    yval = bar.get_height()
-                    if yval > 0: # 0 이상인 값만 표시
-                        plt.text(bar.get_x() + bar.get_width()/2.0, yval, int(yval), va='bottom', ha='center', fontsize=10)
-
-                plt.tight_layout() # 레이아웃 자동 조정
-                plt.savefig(filename)
-                plt.close() # 중요: plt 메모리 해제
+                # 프로세스 풀에서 렌더링 (대기열이 가득 차면 CHART_BUSY_TIMEOUT 초 후 포기)
+                png_bytes = await chart_renderer.render_weekly(weekly_data, username, style="stats",
+                                                               timeout=CHART_BUSY_TIMEOUT, owner=uid)
 
                 # 텍스트 메시지와 함께 파일 전송
                 summary_message = (f"📊 **{username}**님의 공부 통계\n"
                                    f" • 총 누적 공부 시간: **{total_sum}분**\n"
                                    f" • 이번 주 총 공부 시간: **{weekly_sum}분**")
-                await ctx.send(summary_message, file=discord.File(filename))
+                await ctx.send(summary_message, file=discord.File(io.BytesIO(png_bytes), filename=f"weekly_chart_{ctx.author.id}.png"))
 
             except Exception as plot_err:
-                print(f"Error generating plot for user {uid}: {plot_err}")
-                plt.close() # 오류 발생 시에도 plt 리소스 해제 시도
-                await ctx.send("주간 공부 시간 그래프 생성 중 오류가 발생했습니다.")
+                if isinstance(plot_err, ChartRendererBusy):
+                    await ctx.send("요청이 많아 그래프를 생성하지 못했습니다. 잠시 후 다시 시도해주세요.")
+                else:
+                    print(f"Error generating plot for user {uid}: {plot_err}")
+                    await ctx.send("주간 공부 시간 그래프 생성 중 오류가 발생했습니다.")
                 # 오류 시에도 텍스트 통계는 보여주도록
                 await ctx.send(f"📊 **{username}**님의 공부 통계\n"
                                f" • 총 누적 공부 시간: **{total_sum}분**\n"
                                f" • 이번 주 공부 시간: **{weekly_sum}분**")
-            finally:
-                # 파일 전송 성공 여부와 관계없이 임시 파일 삭제
-                if os.path.exists(filename):
-                    try:
-                        os.remove(filename)
-                    except Exception as remove_err:
-                         print(f"Error removing temp file {filename}: {remove_err}")
+
+        elif 기간 == "지난주":
+            # 지난 주 기록 (JSON 백엔드는 주간 보관소에서 해당 주 구간만 읽음)
+            last_week_start = current_week_start(now - timedelta(days=7))
+            last_week = await get_weekly_minutes(uid, last_week_start)
+            days_text = "\n".join(f" • {date_str}: {minutes}분" for date_str, minutes in sorted(last_week.items()))
+            await ctx.send(f"🗂️ **{username}**님의 지난주({iso_week_key(last_week_start)}) 공부 시간: "
+                           f"**{sum(last_week.values())}분**" + (f"\n{days_text}" if days_text else ""))
+
+        elif 기간 == "연간":
+            # study_log.csv 스트리밍 집계 (블로킹 I/O 는 스레드에서)
+            log_summary = await asyncio.to_thread(study_log_analytics.user_summary, uid)
+            yearly_minutes = log_summary["years"].get(str(now.year), 0) if log_summary else 0
+            await ctx.send(f"🗓️ **{username}**님의 {now.year}년 총 공부 시간: **{yearly_minutes}분**")
+
+        elif 기간 == "전체":
+            log_summary = await asyncio.to_thread(study_log_analytics.user_summary, uid)
+            server_summary = await asyncio.to_thread(study_log_analytics.server_summary,
+                                                     guild_configs.partition(guild_id))
+            log_total = log_summary["total"] if log_summary else 0
+            log_sessions = log_summary["sessions"] if log_summary else 0
+            await ctx.send(f"📚 **{username}**님의 전체 공부 기록\n"
+                           f" • 총 공부 시간: **{log_total}분** ({log_sessions}회)\n"
+                           f" • 서버 전체: **{server_summary['total']}분** "
+                           f"({server_summary['users']}명, {server_summary['sessions']}회)")
+
+        elif DATE_RANGE_PATTERN.match(기간):
+            # 기간 지정 조회: !통계 2025-01-01~2025-03-31
+            start_str, end_str = 기간.split("~")
+            try:
+                start_date = datetime.strptime(start_str, "%Y-%m-%d").date()
+                end_date = datetime.strptime(end_str, "%Y-%m-%d").date()
+            except ValueError:
+                await ctx.send(f"날짜 형식이 올바르지 않습니다. 예: {command_hint('통계', '2025-01-01~2025-03-31')}")
+                return
+            if start_date > end_date:
+                await ctx.send("시작 날짜가 종료 날짜보다 늦습니다.")
+                return
+            range_minutes, range_sessions = await asyncio.to_thread(
+                study_log_analytics.range_minutes, uid, start_date.isoformat(), end_date.isoformat())
+            await ctx.send(f"🔎 **{username}**님의 {start_date} ~ {end_date} 공부 시간: "
+                           f"**{range_minutes}분** ({range_sessions}회)")
 
         else:
-            await ctx.send("잘못된 기간입니다. `!통계 [일간/주간/월간]` 또는 `!통계` 형식으로 입력해주세요.")
+            await ctx.send(f"잘못된 기간입니다. {command_hint('통계', '[일간/주간/지난주/월간/연간/전체]')}, "
+                           f"{command_hint('통계', 'YYYY-MM-DD~YYYY-MM-DD')} 또는 {command_hint('통계')} 형식으로 입력해주세요.")
 
     except Exception as e:
         print(f"Error in 통계 command for user {uid}: {e}")
         await ctx.send("통계 조회 중 오류가 발생했습니다.")
 
 
+# ------------------ 랭킹 ------------------
+RANKING_TOP_N = 10
+
+@bot.command(name="랭킹")
+async def ranking(ctx, 기간: str = "주간", 옵션: str = None):
+    uid = str(ctx.author.id)
+    guild_id = ctx_guild_id(ctx)
+    if 기간 not in RANKING_PERIODS:
+        await ctx.send(f"잘못된 기간입니다. {command_hint('랭킹', '[주간/월간/전체]', '[그래프]')} 형식으로 입력해주세요.")
+        return
+
+    global ranking_loaded_at
+    if SHARDED and time_module.monotonic() - ranking_loaded_at > RANKING_RELOAD_SECONDS:
+        boards = await asyncio.to_thread(build_ranking_boards, storage.iter_ranking_rows)
+        ranking_boards.clear()
+        ranking_boards.update(boards)
+        ranking_loaded_at = time_module.monotonic()
+    ranking_board = get_ranking_board(guild_id)
+    index = ranking_board.get(기간, *ranking_periods(guild_id))
+    top_entries = index.top(RANKING_TOP_N)
+    if not top_entries:
+        await ctx.send(f"🏆 {기간} 랭킹에 아직 기록이 없습니다.")
+        return
+
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    lines = [f"🏆 **{기간} 공부 시간 랭킹** (총 {len(index)}명)"]
+    for rank, (entry_uid, minutes) in enumerate(top_entries, 1):
+        name = ranking_board.usernames.get(entry_uid, f"User {entry_uid}")
+        lines.append(f"{medals.get(rank, f'{rank}.')} **{name}** - {minutes}분")
+    my_rank = index.rank(uid)
+    if my_rank is not None:
+        lines.append(f"\n{ctx.author.mention} 내 순위: **{my_rank}위** ({index.scores[uid]}분)")
+    message = "\n".join(lines)
+
+    if 옵션 == "그래프":
+        # 순위표 이미지 (주간 차트와 같은 프로세스 풀/캐시 사용)
+        try:
+            entries = [(ranking_board.usernames.get(entry_uid, f"User {entry_uid}"), minutes)
+                       for entry_uid, minutes in top_entries]
+            png_bytes = await chart_renderer.render_leaderboard(entries, f"{기간} 공부 시간 랭킹",
+                                                                timeout=CHART_BUSY_TIMEOUT)
+            await ctx.send(message, file=discord.File(io.BytesIO(png_bytes), filename="ranking.png"))
+            return
+        except Exception as plot_err:
+            print(f"Error generating ranking chart: {plot_err}")
+    await ctx.send(message)
+
+
 # ------------------ 도움말 ------------------
 @bot.command(name="도움말")
 async def help_command(ctx):
     # Embed 사용 예시 (더 보기 좋게)
     embed = discord.Embed(title="📌 스터디 봇 명령어 안내", color=discord.Color.blue())
-    embed.add_field(name="`!입장`", value="공부 시작 시간을 기록합니다.", inline=False)
-    embed.add_field(name="`!퇴장`", value="공부 종료 시간을 기록하고, 공부 시간을 계산하여 저장합니다.", inline=False)
-    embed.add_field(name="`!통계` 또는 `!통계 주간`", value="이번 주 공부 시간 통계와 그래프를 함께 보여줍니다.", inline=False)
-    embed.add_field(name="`!통계 일간`", value="오늘의 공부 시간을 보여줍니다.", inline=False)
-    embed.add_field(name="`!통계 월간`", value="이번 달의 총 공부 시간을 보여줍니다.", inline=False)
+    embed.add_field(name=command_hint("입장"), value="공부 시작 시간을 기록합니다.", inline=False)
+    embed.add_field(name=command_hint("퇴장"), value="공부 종료 시간을 기록하고, 공부 시간을 계산하여 저장합니다.", inline=False)
+    embed.add_field(name=f"{command_hint('통계')} 또는 {command_hint('통계', '주간')}", value="이번 주 공부 시간 통계와 그래프를 함께 보여줍니다.", inline=False)
+    embed.add_field(name=command_hint("통계", "일간"), value="오늘의 공부 시간을 보여줍니다.", inline=False)
+    embed.add_field(name=command_hint("통계", "월간"), value="이번 달의 총 공부 시간을 보여줍니다.", inline=False)
+    embed.add_field(name=command_hint("통계", "지난주"), value="지난주의 요일별 공부 시간을 보여줍니다.", inline=False)
+    embed.add_field(name=command_hint("랭킹", "[주간/월간/전체]", "[그래프]"), value="서버 공부 시간 순위와 내 순위를 보여줍니다.", inline=False)
+    embed.add_field(name=f"{command_hint('통계', '연간')} / {command_hint('통계', '전체')}", value="올해 / 전체 기간의 공부 시간을 보여줍니다.", inline=False)
+    embed.add_field(name=command_hint("통계", "2025-01-01~2025-03-31"), value="지정한 기간의 공부 시간을 보여줍니다.", inline=False)
+    embed.add_field(name=command_hint("설정", "[채널/시간대/알림/자동퇴장/요일/음성]", "[값]"),
+                    value="서버 설정을 보거나 바꿉니다. (서버 관리 권한 필요)", inline=False)
+    if SLASH_COMMANDS and MESSAGE_CONTENT_INTENT:
+        embed.add_field(name="`/입장` `/퇴장` `/통계 [기간]` `/랭킹 [기간] [옵션]` `/설정 [항목] [값]` `/도움말`",
+                        value="슬래시 명령어로도 사용할 수 있습니다. (응답은 나에게만 보입니다)", inline=False)
+    elif not MESSAGE_CONTENT_INTENT:
+        embed.add_field(name=f"`@{bot.user.name if bot.user else '봇'} 명령어`",
+                        value="DM 에서는 `!명령어`, 서버에서는 봇을 멘션해서도 사용할 수 있습니다.", inline=False)
     embed.set_footer(text="괄호 안은 선택 옵션입니다. | 문의: [봇 개발자 또는 서버 관리자]") # 문의처 수정
 
     # 자동 기능 설명 추가
     embed.add_field(name="⏰ 자동 기능", value=(
         "• 1시간마다 공부 격려 메시지 발송 (DM)\n"
-        "• 6시간 초과 시 자동 퇴장 처리 (DM 알림)\n"
-        "• 매일 저녁 8시 스터디 시작 알림 (지정 채널, 주중만)\n" # 주중만 알림 명시
-        "• 매주 월요일 00시 주간 기록 초기화 (백업 후 초기화)\n"
+        "• 6시간 초과 시 자동 퇴장 처리 (DM 알림, 서버 설정으로 변경 가능)\n"
+        "• 매일 저녁 8시 스터디 시작 알림 (지정 채널, 주중만, 서버 설정으로 변경 가능)\n"
+        f"• 공부용 음성 채널 입장/퇴장 시 자동 입장/퇴장 기록 ({command_hint('설정', '음성')} 으로 지정한 서버만)\n"
+        "• 매주 월요일 00시 주간 기록 새로 시작 (지난 기록은 보관)\n"
         "• 매주 토요일 오전 8시 주간 요약 리포트 발송 (DM, 그래프 포함)"
     ), inline=False)
 
     await ctx.send(embed=embed)
 
+# ------------------ 슬래시 명령어 ------------------
+# 위의 명령어 함수를 InteractionContext 로 그대로 호출 (응답은 명령어를 쓴 사용자에게만 보임)
+async def run_slash_command(interaction, command, *args, defer=False, **kwargs):
+    ctx = InteractionContext(interaction)
+    if defer or not state_ready.is_set():
+        await ctx.defer() # 그래프 생성/상태 로드 대기로 3초 응답 기한을 넘길 수 있음
+    await state_ready.wait()
+    started_at = time_module.perf_counter()
+    try:
+        await command.callback(ctx, *args, **kwargs)
+    except Exception as e:
+        print(f"Error in slash command /{command.name}: {e}")
+        await ctx.send("명령어 실행 중 내부 오류가 발생했습니다. 관리자에게 문의해주세요.")
+    finally:
+        metrics.observe("bot_command_duration_seconds", time_module.perf_counter() - started_at,
+                        command=command.name)
+
+async def sync_slash_commands():
+    try:
+        synced = await bot.tree.sync()
+        print(f"슬래시 명령어 {len(synced)}개 동기화 완료: {', '.join(command.name for command in synced)}")
+    except discord.HTTPException as e:
+        print(f"슬래시 명령어 동기화 실패: {e}")
+
+if SLASH_COMMANDS:
+    @bot.tree.command(name="입장", description="공부 시작 시간을 기록합니다.")
+    async def slash_check_in(interaction: discord.Interaction):
+        await run_slash_command(interaction, check_in)
+
+    @bot.tree.command(name="퇴장", description="공부 종료 시간을 기록하고 공부 시간을 저장합니다.")
+    async def slash_check_out(interaction: discord.Interaction):
+        await run_slash_command(interaction, check_out)
+
+    @bot.tree.command(name="통계", description="공부 시간 통계를 보여줍니다. (주간은 그래프 포함)")
+    @app_commands.describe(기간="일간/주간/지난주/월간/연간/전체 또는 YYYY-MM-DD~YYYY-MM-DD")
+    async def slash_stats(interaction: discord.Interaction, 기간: str = "주간"):
+        try:
+            check_rate_limits(stats_user_limiter, stats_channel_limiter, interaction.user.id, interaction.channel_id)
+        except CommandRateLimited as error:
+            metrics.inc("bot_command_rate_limited_total", command=stats.name, scope=error.scope)
+            await interaction.response.send_message(rate_limited_message(error, interaction.user.mention), ephemeral=True)
+            return
+        await run_slash_command(interaction, stats, 기간, defer=True)
+
+    @bot.tree.command(name="랭킹", description="서버 공부 시간 순위와 내 순위를 보여줍니다.")
+    @app_commands.describe(기간="주간/월간/전체", 옵션="그래프: 순위표 이미지 포함")
+    @app_commands.choices(기간=[app_commands.Choice(name=period, value=period) for period in RANKING_PERIODS],
+                          옵션=[app_commands.Choice(name="그래프", value="그래프")])
+    async def slash_ranking(interaction: discord.Interaction, 기간: str = "주간", 옵션: str = None):
+        await run_slash_command(interaction, ranking, 기간, 옵션, defer=옵션 == "그래프")
+
+    @bot.tree.command(name="설정", description="서버 설정을 보거나 바꿉니다. (서버 관리 권한 필요)")
+    @app_commands.describe(항목="채널/시간대/알림/자동퇴장/요일/음성", 값="예: #채널, Asia/Seoul, 20:00, 360, 월화수목금, 끄기")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_guild=True)
+    async def slash_guild_config(interaction: discord.Interaction, 항목: str = None, 값: str = None):
+        # 명령어 권한은 서버 관리자가 바꿀 수 있으므로 !설정 과 같은 권한을 직접 확인
+        if not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("이 명령어를 실행할 권한이 없습니다.", ephemeral=True)
+            return
+        await run_slash_command(interaction, guild_config_command, 항목, 값=값)
+
+    @bot.tree.command(name="도움말", description="스터디 봇 명령어 안내를 보여줍니다.")
+    async def slash_help(interaction: discord.Interaction):
+        await run_slash_command(interaction, help_command)
+
+# ------------------ 서버 설정 (서버 관리 권한 필요) ------------------
+def describe_guild_config(config):
+    channel = f"<#{config.channel_id}>" if config.channel_id else "없음"
+    weekdays = "".join(WEEKDAY_NAMES[day] for day in config.reminder_weekdays)
+    voice_channels = " ".join(f"<#{channel_id}>" for channel_id in sorted(config.voice_channel_ids)) or "끔"
+    return (f" • 알림 채널: {channel}\n"
+            f" • 시간대: {config.timezone}\n"
+            f" • 알림 시각: {config.reminder_time} ({weekdays})\n"
+            f" • 자동 퇴장: {config.auto_checkout_minutes}분\n"
+            f" • 음성 채널 자동 기록: {voice_channels}")
+
+
+def mentioned_channels(guild, text):
+    # "#채널 멘션(<#ID>)" 또는 채널 ID 들 → 채널 목록 (없는 채널은 None). 슬래시 명령어 값도 같은 형식
+    return [guild.get_channel(int(channel_id)) for channel_id in re.findall(r"\d{15,}", text)]
+
+
+@bot.command(name="설정")
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def guild_config_command(ctx, 항목: str = None, *, 값: str = None):
+    # !설정 : 현재 설정 / !설정 채널 #채널(또는 끄기) / 시간대 Asia/Seoul / 알림 20:00 / 자동퇴장 360 / 요일 월화수목금
+    #         음성 #음성채널 [#음성채널 ...](또는 끄기)
+    guild_id = ctx.guild.id
+    config = guild_configs.get(guild_id)
+    if 항목 is None:
+        await ctx.send(f"⚙️ **{ctx.guild.name}** 서버 설정\n{describe_guild_config(config)}")
+        return
+    if 값 is None:
+        await ctx.send(f"설정할 값을 입력해주세요. 예: {command_hint('설정', '알림', '20:00')}")
+        return
+
+    updated = GuildConfig.from_dict(config.to_dict())
+    try:
+        if 항목 == "채널":
+            if 값 == "끄기":
+                updated.channel_id = None
+            else:
+                channels = mentioned_channels(ctx.guild, 값)
+                channel = channels[0] if channels else None
+                if not isinstance(channel, discord.TextChannel):
+                    raise ValueError(값)
+                updated.channel_id = channel.id
+        elif 항목 == "시간대":
+            ZoneInfo(값) # 알 수 없는 시간대면 예외
+            updated.timezone = 값
+        elif 항목 == "알림":
+            updated.reminder_time = parse_reminder_time(값).strftime("%H:%M")
+        elif 항목 == "자동퇴장":
+            minutes = int(값)
+            if not 30 <= minutes <= 24 * 60:
+                raise ValueError(값)
+            updated.auto_checkout_minutes = minutes
+        elif 항목 == "요일":
+            updated.reminder_weekdays = parse_weekdays(값)
+        elif 항목 == "음성":
+            if 값 == "끄기":
+                updated.voice_channel_ids = frozenset()
+            else:
+                channels = mentioned_channels(ctx.guild, 값)
+                if not channels or not all(isinstance(channel, (discord.VoiceChannel, discord.StageChannel))
+                                           for channel in channels):
+                    raise ValueError(값)
+                updated.voice_channel_ids = frozenset(channel.id for channel in channels)
+        else:
+            await ctx.send("설정 항목은 `채널`, `시간대`, `알림`, `자동퇴장`, `요일`, `음성` 중 하나입니다.")
+            return
+    except (ValueError, ZoneInfoNotFoundError):
+        await ctx.send(f"`{값}` 은(는) {항목} 값으로 사용할 수 없습니다.")
+        return
+
+    if updated.channel_id != config.channel_id:
+        reminder_broadcaster.invalidate(config.channel_id)
+    await asyncio.to_thread(guild_configs.set, guild_id, updated) # 설정 저장 (fsync/SQLite) 은 스레드에서
+    schedule_guild_reminder(guild_id) # 알림 채널/시간대/시각/요일 변경 반영
+    if updated.voice_channel_ids != config.voice_channel_ids:
+        reconcile_voice_sessions([ctx.guild]) # 이미 채널에 있는 사용자 입장 / 빠진 채널의 음성 세션 퇴장
+    await ctx.send(f"✅ 설정을 변경했습니다.\n{describe_guild_config(updated)}")
+
+# ------------------ 상태 (봇 소유자 전용) ------------------
+def format_histogram(histogram):
+    # "12회 · p50 3ms · p99 40ms" 형태의 한 줄 요약
+    if histogram is None or not histogram.count:
+        return "기록 없음"
+    return (f"{histogram.count}회 · p50 {histogram.quantile(0.5) * 1000:.1f}ms · "
+            f"p99 {histogram.quantile(0.99) * 1000:.1f}ms · 최대 {histogram.max * 1000:.1f}ms")
+
+
+@bot.command(name="상태")
+@commands.is_owner()
+async def status_command(ctx, 형식="요약"):
+    # !상태 : 요약 embed / !상태 json : 전체 계측 데이터를 파일로 전송
+    status = health_server.status()
+    if 형식.lower() == "json":
+        payload = json.dumps({"health": status, "metrics": metrics.snapshot(),
+                              "loop_blocks": loop_watchdog.recent_events()}, ensure_ascii=False, indent=2)
+        await ctx.send(file=discord.File(io.BytesIO(payload.encode('utf-8')), filename="metrics.json"))
+        return
+
+    embed = discord.Embed(title="🩺 봇 상태", color=discord.Color.green() if status["status"] == "ok" else discord.Color.red())
+    latency = f"{status['latency'] * 1000:.0f}ms" if status["latency"] is not None else "연결 안 됨"
+    heartbeat = (f"{status['last_heartbeat_ack_age']:.0f}초 전" if status["last_heartbeat_ack_age"] is not None
+                 else "기록 없음")
+    embed.add_field(name="게이트웨이", value=f"지연 {latency} · 마지막 heartbeat ACK {heartbeat}", inline=False)
+    embed.add_field(name="출석", value=f"입장 중 {len(attendance_log)}명 · 예약된 알림 {len(attendance_scheduler)}건", inline=False)
+    embed.add_field(name="이벤트 루프 지연", value=format_histogram(metrics.histogram("bot_event_loop_lag_seconds")), inline=False)
+    if loop_watchdog.enabled:
+        events = loop_watchdog.recent_events()
+        last_block = (f" · 마지막 {datetime.fromtimestamp(events[-1]['at'], ZoneInfo('Asia/Seoul')).strftime('%m-%d %H:%M:%S')}"
+                      f" ({events[-1]['blocked']}초)" if events else "")
+        embed.add_field(name="루프 블로킹", value=(f"{metrics.counter('bot_event_loop_blocked_total')}회 감지 "
+                                               f"(기준 {loop_watchdog.threshold}초){last_block}"), inline=False)
+
+    if startup_timer.ready_at is not None:
+        phases = " · ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timer.durations().items())
+        embed.add_field(name="시작 시간", value=f"on_ready 까지 {startup_timer.ready_at:.2f}초\n{phases}", inline=False)
+    embed.add_field(name="명령어", value="\n".join(
+        f"`!{name}` {format_histogram(metrics.histogram('bot_command_duration_seconds', command=name))}"
+        for name in ("입장", "퇴장", "통계", "도움말")), inline=False)
+
+    task_lines = []
+    for task_name in ("attendance_scheduler", "weekly_reset_loop", "daily_study_reminder", "weekly_summary_dm",
+                      "voice_sessions"):
+        last_run = status["tasks"].get(task_name)
+        last_run_text = (datetime.fromtimestamp(last_run, ZoneInfo("Asia/Seoul")).strftime('%m-%d %H:%M:%S')
+                         if last_run else "실행 전")
+        task_lines.append(f"`{task_name}` 마지막 {last_run_text} · "
+                          f"{format_histogram(metrics.histogram('bot_task_duration_seconds', task=task_name))}")
+    embed.add_field(name="작업 루프", value="\n".join(task_lines), inline=False)
+    embed.add_field(name="저녁 알림", value=(f"예약 {len(reminder_scheduler)}개 서버 · 발송 지연 "
+                                        f"{format_histogram(metrics.histogram('bot_reminder_delivery_seconds'))}"),
+                    inline=False)
+    embed.add_field(name="음성 채널", value=(f"이벤트 {voice_tracker.stats['events']}건 · 입장 {voice_tracker.stats['joins']}건 · "
+                                         f"퇴장 {voice_tracker.stats['leaves']}건 · 재연결 {voice_tracker.stats['reconnects']}건 · "
+                                         f"대기 {len(voice_tracker)}건"), inline=False)
+
+    storage_lines = [f"`{labels['op']}{'/' + labels['file'] if 'file' in labels else ''}` {format_histogram(histogram)}"
+                     for labels, histogram in metrics.histograms_named("bot_storage_duration_seconds")]
+    embed.add_field(name="저장", value="\n".join(storage_lines) or "기록 없음", inline=False)
+    chart_lines = [f"`{labels['chart']}` {format_histogram(histogram)}"
+                   for labels, histogram in metrics.histograms_named("bot_chart_render_seconds")]
+    cache_stats = chart_renderer.cache.stats()
+    chart_lines.append(f"백엔드 {chart_renderer.backend} · 캐시 적중률 {cache_stats['hit_rate'] * 100:.0f}% ({cache_stats['entries']}개) · "
+                       f"합친 요청 {chart_renderer.coalesced}건 · 한도 초과 {stats_user_limiter.rejected + stats_channel_limiter.rejected}건")
+    if chart_renderer.asset_status is not None:
+        chart_lines.append(chart_assets.describe(chart_renderer.asset_status))
+    embed.add_field(name="차트 렌더링", value="\n".join(chart_lines), inline=False)
+
+    embed.add_field(name="Discord API", value=(
+        f"요청 {metrics.counter_total('discord_api_requests_total')}건 · "
+        f"실패 {metrics.counter_total('discord_api_errors_total')}건 · "
+        f"429 {metrics.counter_total('discord_api_rate_limited_total')}건 · "
+        f"fetch_user 절약 {user_resolver.api_calls_avoided()}건"), inline=False)
+    if not metrics.enabled:
+        embed.set_footer(text="METRICS_ENABLED=0 : 계측이 꺼져 있어 지연 시간 기록이 없습니다.")
+    await ctx.send(embed=embed)
+
+@bot.command(name="프로파일")
+@commands.is_owner()
+async def profile_command(ctx, 초: int = 10):
+    # 지정한 시간 동안 모든 스레드를 샘플링해 collapsed-stack 파일(flamegraph.pl, speedscope 호환)로 전송
+    seconds = max(1, min(초, PROFILER_MAX_SECONDS))
+    if profiler.running:
+        await ctx.send("이미 프로파일링이 진행 중입니다.")
+        return
+    await ctx.send(f"🔬 {seconds}초 동안 프로파일링합니다...")
+    collapsed = await profiler.profile(seconds)
+    filename = f"profile_{get_now().strftime('%Y%m%d_%H%M%S')}.collapsed"
+    await ctx.send(f"샘플 {profiler.sample_count}회 · 고유 스택 {len(profiler.samples)}개",
+                   file=discord.File(io.BytesIO(collapsed.encode('utf-8')), filename=filename))
+
 # ------------------ 오류 처리 ------------------
+def rate_limited_message(error, mention):
+    target = "이 채널의 요청이" if error.scope == "channel" else "요청이"
+    return f"⏳ {mention} {target} 너무 많습니다. {max(1, round(error.retry_after))}초 후에 다시 시도해주세요."
+
 @bot.event
 async def on_command_error(ctx, error):
     if isinstance(error, commands.CommandNotFound):
@@ -693,9 +1442,12 @@ async def on_command_error(ctx, error):
         print(f"CommandNotFound: {ctx.message.content} by {ctx.author}") # 로그만 남기기
         return # 조용히 무시
     elif isinstance(error, commands.MissingRequiredArgument):
-        await ctx.send(f"명령어 사용법이 잘못되었습니다. '{ctx.command.name}' 명령어는 추가 정보가 필요합니다. `!도움말`을 확인해주세요.")
+        await ctx.send(f"명령어 사용법이 잘못되었습니다. '{ctx.command.name}' 명령어는 추가 정보가 필요합니다. {command_hint('도움말')}을 확인해주세요.")
     elif isinstance(error, commands.BadArgument):
-         await ctx.send(f"명령어에 잘못된 인자가 전달되었습니다. `!도움말`을 확인해주세요.")
+         await ctx.send(f"명령어에 잘못된 인자가 전달되었습니다. {command_hint('도움말')}을 확인해주세요.")
+    elif isinstance(error, CommandRateLimited):
+         metrics.inc("bot_command_rate_limited_total", command=ctx.command.name, scope=error.scope)
+         await ctx.send(rate_limited_message(error, ctx.author.mention), delete_after=10)
     elif isinstance(error, commands.CheckFailure):
          await ctx.send("이 명령어를 실행할 권한이 없습니다.")
     elif isinstance(error, commands.CommandInvokeError):
@@ -717,13 +1469,54 @@ async def on_command_error(ctx, error):
 
 
 # ------------------ 봇 실행 ------------------
+async def run_bot(token):
+    # 상태 확인 서버를 로그인 전에 먼저 열어 배포 환경의 헬스 체크가 바로 응답하도록 함
+    async with bot:
+        try:
+            # SIGTERM(배포 환경 종료 등)도 Ctrl+C 처럼 봇을 정상 종료해 __main__ 의 flush_all_data() 가 실행되도록 함
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError: # Windows 이벤트 루프는 시그널 처리기를 지원하지 않음
+            pass
+        await health_server.start()
+        instrument_http(bot)
+        lease_task = asyncio.create_task(job_lease.run()) if job_lease is not None else None
+        lag_task = asyncio.create_task(sample_loop_lag()) if metrics.enabled else None
+        loop_watchdog.start()
+        try:
+            # 상태 로드(스레드)와 로그인/게이트웨이 연결을 동시에 진행
+            state_task = asyncio.create_task(asyncio.to_thread(load_state))
+            with startup_timer.phase("login"):
+                await bot.login(token)
+            startup_timer.begin("gateway_connect") # 첫 on_ready 에서 끝남
+            connect_task = asyncio.create_task(bot.connect())
+            try:
+                await state_task
+                await resolve_home_guild() # 명령어를 받기 전에 기존 기록의 서버를 정함
+            except BaseException:
+                connect_task.cancel()
+                raise
+            state_ready.set()
+            await connect_task
+        finally:
+            loop_watchdog.stop()
+            if lease_task is not None:
+                lease_task.cancel()
+                job_lease.release() # 다른 프로세스가 TTL 을 기다리지 않고 바로 이어받도록
+            if lag_task is not None:
+                lag_task.cancel()
+            await health_server.stop()
+
+
 if __name__ == "__main__":
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         print("오류: DISCORD_TOKEN 환경 변수를 찾을 수 없습니다. Replit의 Secrets 탭에 DISCORD_TOKEN을 추가해주세요.")
     else:
         try:
-            bot.run(token)
+            discord.utils.setup_logging() # bot.run() 과 같은 기본 로그 설정
+            asyncio.run(run_bot(token))
+        except KeyboardInterrupt:
+            pass
         except discord.LoginFailure:
              print("오류: 잘못된 토큰입니다. DISCORD_TOKEN 환경 변수를 확인해주세요.")
         except discord.PrivilegedIntentsRequired:
@@ -731,4 +1524,6 @@ if __name__ == "__main__":
              print("Discord Developer Portal (https://discord.com/developers/applications)에서 해당 봇의 설정을 확인하고")
              print("'Privileged Gateway Intents' 섹션의 'PRESENCE INTENT'와 'SERVER MEMBERS INTENT'를 활성화해주세요.")
         except Exception as e:
-             print(f"봇 실행 중 치명적인 오류 발생: {e}")
\ No newline at end of file
+             print(f"봇 실행 중 치명적인 오류 발생: {e}")
+        finally:
+            flush_all_data() # 종료 시 대기 중인 데이터 모두 저장
\ No newline at end of file
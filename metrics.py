@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# ------------------ 핫패스 계측 (히스토그램 / 카운터) ------------------
+# 명령어 지연, 작업 루프 1회 실행 시간, 저장 시간, 차트 렌더링 시간, Discord API 호출/429, 이벤트 루프 지연을
+# 고정 버킷 히스토그램과 카운터로 모읍니다. 외부 의존성 없이 /metrics(Prometheus), /metrics.json, !상태 에서 사용합니다.
+# METRICS_ENABLED=0 이면 observe/inc/timer 가 바로 반환되어 비용이 거의 없습니다.
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5")) # 이벤트 루프 지연 측정 주기(초)
+# 초 단위 버킷: 수 ms 의 명령어 처리부터 수 초 걸리는 주간 DM 발송까지
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP_TEXTS = {
+    "bot_command_duration_seconds": "Command latency from invoke to completion",
+    "bot_task_duration_seconds": "Duration of one task loop tick or scheduled event",
+    "bot_storage_duration_seconds": "Time spent persisting study and attendance data",
+    "bot_chart_render_seconds": "Chart render time in the worker pool, excluding cache hits",
+    "bot_reminder_delivery_seconds": "Delay from a guild's scheduled reminder time to the message being sent",
+    "bot_event_loop_lag_seconds": "Delay between a scheduled wakeup and when the loop ran it",
+    "bot_event_loop_blocked_seconds": "How long the event loop stayed blocked past the watchdog threshold",
+    "bot_event_loop_blocked_total": "Times the watchdog caught the event loop blocked",
+    "discord_api_requests_total": "Discord REST API requests issued by the bot",
+    "discord_api_errors_total": "Discord REST API requests that failed, by status",
+    "discord_api_rate_limited_total": "429 responses reported by discord.py (retried internally)",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # 마지막 칸은 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        for index, bound in enumerate(self.buckets): # 버킷 수가 적어 선형 탐색이 더 빠름
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        # 버킷 안에서 선형 보간한 근사 분위수
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.max
+            if count and cumulative + count >= target:
+                return min(lower + (upper - lower) * (target - cumulative) / count, self.max)
+            cumulative += count
+            lower = upper
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 6),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.histograms = {} # (이름, 라벨 튜플) -> Histogram
+        self.counters = {}   # (이름, 라벨 튜플) -> 값
+        self._lock = threading.Lock() # 저장 스레드에서도 기록하므로 보호
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def timer(self, name, **labels):
+        # with metrics.timer(...): 블록 실행 시간을 기록
+        if not self.enabled:
+            return nullcontext()
+        return _Timer(self, name, labels)
+
+    def timed(self, name, **labels):
+        # 코루틴 함수용 데코레이터 (tasks.loop 본문 등)
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def histograms_named(self, name):
+        # [(라벨 dict, Histogram), ...] : 라벨 종류를 미리 알 수 없는 항목(저장 대상, 차트 종류) 조회용
+        with self._lock:
+            return [(dict(labels), histogram) for (hist_name, labels), histogram in sorted(self.histograms.items())
+                    if hist_name == name]
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def counter_total(self, name):
+        return sum(value for (counter_name, _), value in self.counters.items() if counter_name == name)
+
+    # --- 내보내기 ---
+    def samples(self):
+        # keep_alive.format_prometheus 에 넘길 (이름, 종류, 설명, 라벨, 값) 목록
+        samples = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for (name, labels), histogram in histograms:
+            help_text = HELP_TEXTS.get(name, name)
+            cumulative = 0
+            for index, count in enumerate(histogram.counts):
+                cumulative += count
+                le = str(histogram.buckets[index]) if index < len(histogram.buckets) else "+Inf"
+                samples.append((f"{name}_bucket", "histogram", help_text, dict(labels, le=le), cumulative))
+            samples.append((f"{name}_sum", "histogram", help_text, dict(labels), round(histogram.sum, 6)))
+            samples.append((f"{name}_count", "histogram", help_text, dict(labels), histogram.count))
+        for (name, labels), value in counters:
+            samples.append((name, "counter", HELP_TEXTS.get(name, name), dict(labels), value))
+        return samples
+
+    def snapshot(self):
+        # JSON 으로 내보낼 수 있는 요약 (!상태 json, /metrics.json)
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        return {
+            "enabled": self.enabled,
+            "histograms": [dict(name=name, labels=dict(labels), **histogram.summary())
+                           for (name, labels), histogram in histograms],
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters],
+        }
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+# 모듈 전역 레지스트리 (main.py, persistence.py, charts.py 가 같은 인스턴스를 사용)
+registry = MetricsRegistry()
+
+
+# ------------------ 이벤트 루프 지연 측정 ------------------
+async def sample_loop_lag(interval=LOOP_LAG_INTERVAL):
+    # interval 마다 잠들었다 깨어난 시각이 예정보다 얼마나 늦었는지 기록. 루프가 막히면 크게 늘어남
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        registry.observe("bot_event_loop_lag_seconds", max(0.0, loop.time() - expected))
+
+
+# ------------------ Discord API 호출 계측 ------------------
+class _RateLimitLogCounter(logging.Filter):
+    # discord.py 는 429 를 내부에서 재시도하고 경고 로그만 남기므로 그 로그를 세어 집계
+    def filter(self, record):
+        message = record.getMessage()
+        if record.levelno >= logging.WARNING and ("429" in message or "rate limit" in message.lower()):
+            registry.inc("discord_api_rate_limited_total")
+        return True
+
+
+def instrument_http(bot):
+    # bot.http.request 를 감싸 경로 템플릿(/channels/{channel_id}/messages 등)별 호출 수와 실패 상태 코드를 기록
+    if not registry.enabled or getattr(bot.http, "_metrics_instrumented", False):
+        return
+    import discord # 지연 import: metrics 는 차트 워커 프로세스에서도 import 됨
+
+    original_request = bot.http.request
+
+    async def request(route, **kwargs):
+        registry.inc("discord_api_requests_total", method=route.method, route=route.path)
+        try:
+            return await original_request(route, **kwargs)
+        except discord.HTTPException as e:
+            registry.inc("discord_api_errors_total", status=str(e.status))
+            raise
+
+    bot.http.request = request
+    bot.http._metrics_instrumented = True
+    logging.getLogger("discord.http").addFilter(_RateLimitLogCounter())
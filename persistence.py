@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# ------------------ Write-behind 영속화 엔진 ------------------
+# 명령어마다 전체 JSON 파일을 다시 쓰는 대신, 변경된 키(사용자)만 표시해 두고
+# 백그라운드 스레드가 주기적으로(또는 변경 건수가 임계값을 넘으면) 한 번에 기록합니다.
+# 이벤트 루프에서는 변경된 사용자 한 명의 레코드만 직렬화하므로 비용이 전체 사용자 수와 무관합니다.
+# 변경되지 않은 레코드의 JSON 조각은 메모리에 사본을 두거나(기본), 사본 없이 기존 파일에서 위치로 잘라 씁니다.
+import json
+import os
+import tempfile
+import threading
+import time
+
+from metrics import registry as metrics
+
+# --- 기본 설정 (환경 변수로 조정 가능) ---
+# 최대 유실 가능 구간(초): 이 시간 안에 발생한 변경은 반드시 디스크에 기록됨
+DEFAULT_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "5"))
+# 이 건수 이상 변경이 쌓이면 주기를 기다리지 않고 즉시 기록
+DEFAULT_MAX_PENDING = int(os.getenv("PERSIST_MAX_PENDING", "500"))
+
+
+def atomic_write_text(path, text):
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+
+def atomic_write_bytes(path, data):
+    # 임시 파일에 먼저 쓰고 fsync 후 rename → 쓰는 도중 종료되어도 기존 파일이 깨지지 않음
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class WriteBehindJsonStore:
+    """{키: 레코드} 형태의 JSON 파일을 배치로 기록하는 저장소.
+
+    encode 는 메모리 내 레코드를 JSON 직렬화 가능한 값으로 바꾸는 함수입니다.
+    mark_dirty() 는 이벤트 루프에서 호출되며, 레코드 하나만 직렬화해 대기열에 넣습니다.
+    cache_fragments=False 이면 조각 사본 대신 파일 안의 위치만 기억하고, 기록할 때 기존 파일에서
+    바뀌지 않은 조각을 그대로 복사합니다 (상주 메모리가 키당 위치 두 개로 줄어듦).
+    """
+
+    def __init__(self, path, encode=None, flush_interval=None, max_pending=None, cache_fragments=True):
+        self.path = path
+        self.encode = encode or (lambda record: record)
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.max_pending = DEFAULT_MAX_PENDING if max_pending is None else max_pending
+        self.cache_fragments = cache_fragments
+
+        self._fragments = {}  # 키 -> 직렬화된 JSON 조각 (디스크 상태의 메모리 사본)
+        self._offsets = {}    # cache_fragments=False: 키 -> 파일 안 조각의 (시작, 끝) 바이트 위치
+        self._pending = {}    # 키 -> 직렬화된 JSON 조각 또는 None(삭제)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # 백그라운드 스레드와 수동 flush() 동시 실행 방지
+        self._thread = None
+        self._closed = False
+        self.flush_count = 0
+        self.last_flush = None
+
+    # --- 로드 ---
+    def load(self):
+        # 파일 전체를 읽어 dict 로 반환하고, 이후 기록을 위해 조각 캐시(또는 위치)를 채움
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+        if not self.cache_fragments:
+            self._offsets = self._index_fragments(raw, data)
+            if self._offsets is not None:
+                return data
+            # 이 저장소가 쓴 형식이 아니면 첫 기록 때 형식을 맞출 때까지만 조각 사본을 둠
+            self._offsets = {}
+        self._fragments = {str(k): json.dumps(v, ensure_ascii=False) for k, v in data.items()}
+        return data
+
+    @staticmethod
+    def _index_fragments(raw, data):
+        # flush() 가 쓰는 형식('  "키": 조각' 한 줄에 하나)이면 조각마다 바이트 위치를 반환, 아니면 None
+        lines = raw.split(b"\n")
+        if raw.strip() == b"{}":
+            return {}
+        if lines[0] != b"{" or lines[-2:] != [b"}", b""]:
+            return None
+        decoder = json.JSONDecoder()
+        offsets = {}
+        position = len(lines[0]) + 1
+        for line in lines[1:-2]:
+            text = line.decode('utf-8')
+            try:
+                key, end = decoder.raw_decode(text, 2)
+            except ValueError:
+                return None
+            if not text.startswith('  "') or text[end:end + 2] != ": ":
+                return None
+            start = position + len(text[:end + 2].encode('utf-8'))
+            offsets[key] = (start, position + len(line) - (1 if line.endswith(b",") else 0))
+            position += len(line) + 1
+        return offsets if offsets.keys() == data.keys() else None
+
+    # --- 변경 표시 ---
+    def mark_dirty(self, key, record):
+        fragment = json.dumps(self.encode(record), ensure_ascii=False)
+        with self._cond:
+            self._pending[str(key)] = fragment
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def discard(self, key):
+        with self._cond:
+            self._pending[str(key)] = None
+            if len(self._pending) >= self.max_pending:
+                self._cond.notify()
+
+    def replace_all(self, data):
+        # 대량 변경(예: 주간 초기화) 시 전체를 한 번에 대기열에 올림
+        encoded = {str(k): json.dumps(self.encode(v), ensure_ascii=False) for k, v in data.items()}
+        # _fragments/_offsets 는 기록 스레드가 _flush_lock 안에서(_cond 밖에서) 바꾸므로 같은 잠금으로 키 목록을 읽음
+        with self._flush_lock, self._cond:
+            for key in set(self._fragments) | set(self._offsets) | set(self._pending):
+                if key not in encoded:
+                    self._pending[key] = None
+            self._pending.update(encoded)
+            self._cond.notify()
+
+    @property
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    # --- 기록 ---
+    def flush(self):
+        with self._flush_lock:
+            return self._flush_locked()
+
+    def _flush_locked(self):
+        with self._cond:
+            reformat = not self.cache_fragments and bool(self._fragments) # 형식이 다른 파일을 처음 다시 쓰는 경우
+            if not self._pending and not reformat:
+                return False
+            pending, self._pending = self._pending, {}
+        try:
+            with metrics.timer("bot_storage_duration_seconds", op="flush", file=os.path.basename(self.path)):
+                if self.cache_fragments:
+                    for key, fragment in pending.items():
+                        if fragment is None:
+                            self._fragments.pop(key, None)
+                        else:
+                            self._fragments[key] = fragment
+                    body = ",\n".join(f"  {json.dumps(k)}: {v}" for k, v in self._fragments.items())
+                    atomic_write_text(self.path, "{\n" + body + "\n}\n" if body else "{}\n")
+                else:
+                    self._write_from_offsets(pending)
+        except Exception as e:
+            print(f"Error flushing {self.path}: {e}")
+            # 실패한 변경은 다음 기록 때 다시 시도 (그 사이 들어온 최신 변경이 우선)
+            with self._cond:
+                for key, fragment in pending.items():
+                    self._pending.setdefault(key, fragment)
+            return False
+        self.flush_count += 1
+        self.last_flush = time.time()
+        return True
+
+    def _write_from_offsets(self, pending):
+        # 바뀐 조각은 대기열에서, 나머지는 기존 파일의 같은 위치에서 가져와 새 파일을 만들고 위치를 갱신
+        old = b""
+        if self._offsets and os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                old = f.read()
+        keys = dict.fromkeys(list(self._offsets) + list(self._fragments) + list(pending))
+        out = bytearray(b"{\n")
+        offsets = {}
+        for key in keys:
+            if key in pending:
+                if pending[key] is None:
+                    continue
+                fragment = pending[key].encode('utf-8')
+            elif key in self._fragments:
+                fragment = self._fragments[key].encode('utf-8')
+            else:
+                start, end = self._offsets[key]
+                fragment = old[start:end]
+            if offsets:
+                out += b",\n"
+            out += f"  {json.dumps(key)}: ".encode('utf-8')
+            offsets[key] = (len(out), len(out) + len(fragment))
+            out += fragment
+        atomic_write_bytes(self.path, bytes(out + b"\n}\n") if offsets else b"{}\n")
+        self._offsets = offsets
+        self._fragments = {}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.max_pending:
+                    self._cond.wait(timeout=self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def start(self):
+        if not self.cache_fragments and self._fragments:
+            with self._cond:
+                self._cond.notify() # 형식이 다른 파일은 바로 다시 써서 조각 사본을 비움
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"write-behind:{os.path.basename(self.path)}", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        # 종료 시 남은 변경을 모두 기록
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# ------------------ Pillow 차트 렌더러 (CHART_BACKEND=pillow) ------------------
+# 주간 그래프(7개 막대)와 랭킹 그래프는 배치가 고정되어 있으므로 matplotlib 의 Figure/레이아웃 계산 없이
+# 같은 크기(100dpi 기준 10x5 / 8xN 인치)와 배치로 Pillow 에 직접 그립니다.
+# 글자 크기는 study.mplstyle 의 pt 값을 100dpi 픽셀로 바꾼 값이고, 색상은 charts.CHART_STYLES 를 그대로 씁니다.
+# Pillow 는 matplotlib 의존성으로 함께 설치되며, charts.py 와 같이 워커 프로세스 안에서만 import 합니다.
+import io
+
+import chart_assets
+import charts
+
+DPI = 100
+TITLE_PX, LABEL_PX, TICK_PX = 22, 17, 14 # 16pt / 12pt / 10pt @ 100dpi
+GRID_COLOR = (196, 196, 196)             # matplotlib 기본 격자색(#b0b0b0) alpha 0.7
+TEXT_COLOR = (0, 0, 0)
+
+_fonts = {}
+
+
+def _font(size):
+    # 크기별 글꼴 캐시 (워커 프로세스당 한 번 로드)
+    font = _fonts.get(size)
+    if font is None:
+        from PIL import ImageFont
+        try:
+            font = ImageFont.truetype(chart_assets.FONT_PATH, size)
+        except OSError: # 한글 폰트가 없으면 Pillow 기본 글꼴
+            font = ImageFont.load_default(size)
+        _fonts[size] = font
+    return font
+
+
+def _text_size(draw, text, font):
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    return right - left, bottom - top
+
+
+def _dashed_line(draw, start, end, color, dash=7, gap=3):
+    # 가로/세로 점선 (matplotlib linestyle='--')
+    (x0, y0), (x1, y1) = start, end
+    length = max(abs(x1 - x0), abs(y1 - y0))
+    position = 0
+    while position < length:
+        stop = min(position + dash, length)
+        if y0 == y1:
+            draw.line([(x0 + position, y0), (x0 + stop, y0)], fill=color)
+        else:
+            draw.line([(x0, y0 - position), (x0, y0 - stop)], fill=color)
+        position += dash + gap
+
+
+def _rotated_text(image, text, font, angle, anchor, corner):
+    # 회전한 글자를 corner("top_right"/"center") 가 anchor 에 오도록 붙임
+    from PIL import Image, ImageDraw
+    left, top, right, bottom = font.getbbox(text)
+    tile = Image.new("L", (max(right - left, 1), max(bottom - top, 1)), 0)
+    ImageDraw.Draw(tile).text((-left, -top), text, font=font, fill=255)
+    rotated = tile.rotate(angle, expand=True, resample=Image.BICUBIC)
+    x, y = anchor
+    if corner == "top_right":
+        box = (int(x - rotated.width), int(y))
+    else:
+        box = (int(x - rotated.width / 2), int(y - rotated.height / 2))
+    image.paste(TEXT_COLOR, box, mask=rotated)
+
+
+def _to_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="png", dpi=(DPI, DPI))
+    return buffer.getvalue()
+
+
+def render_weekly_chart(days, values, username, style="stats"):
+    # charts.render_weekly_chart 와 같은 배치: 제목, 60분 간격 y축 눈금/점선 격자, 막대 위 값, 45도 날짜 라벨
+    from PIL import Image, ImageDraw
+
+    chart_style = charts.CHART_STYLES[style]
+    max_value = (max(values) if max(values) > 0 else 60) if values else 0 # 최소 y축 높이 확보
+    last_tick = max(60 * ((max_value + 59) // 60), 60) # range(0, max_value + 60, 60) 의 마지막 눈금
+    y_top = max(last_tick, max_value * 1.05)           # 막대 위 5% 여백 (matplotlib 기본 margin)
+    width, height = 10 * DPI, 5 * DPI
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    title_font, label_font, tick_font = _font(TITLE_PX), _font(LABEL_PX), _font(TICK_PX)
+
+    # 날짜 라벨 높이(45도 회전)만큼 아래 여백 확보
+    label_extent = max((_text_size(draw, day, tick_font)[0] for day in days), default=0) * 0.71 + TICK_PX
+    left, right, top, bottom = 80, width - 20, 50, height - int(label_extent) - LABEL_PX - 20
+    plot_height = bottom - top
+
+    title = chart_style["title"].format(username=username)
+    title_width, _ = _text_size(draw, title, title_font)
+    draw.text(((left + right - title_width) / 2, 12), title, font=title_font, fill=TEXT_COLOR)
+
+    def y_of(value):
+        return bottom - plot_height * value / y_top
+
+    for tick in range(0, last_tick + 1, 60):
+        y = y_of(tick)
+        if tick:
+            _dashed_line(draw, (left, y), (right, y), GRID_COLOR)
+        draw.line([(left - 4, y), (left, y)], fill=TEXT_COLOR)
+        tick_width, tick_height = _text_size(draw, str(tick), tick_font)
+        draw.text((left - 8 - tick_width, y - tick_height / 2 - 2), str(tick), font=tick_font, fill=TEXT_COLOR)
+    draw.rectangle([left, top, right, bottom], outline=TEXT_COLOR)
+
+    slot = (right - left) / max(len(days), 1)
+    for index, (day, value) in enumerate(zip(days, values)):
+        center = left + slot * (index + 0.5)
+        if value > 0:
+            draw.rectangle([center - slot * 0.4, y_of(value), center + slot * 0.4, bottom], fill=chart_style["color"])
+            value_width, value_height = _text_size(draw, str(int(value)), tick_font)
+            draw.text((center - value_width / 2, y_of(value) - value_height - 6), str(int(value)),
+                      font=tick_font, fill=TEXT_COLOR)
+        draw.line([(center, bottom), (center, bottom + 4)], fill=TEXT_COLOR)
+        _rotated_text(image, day, tick_font, 45, (center + 4, bottom + 6), "top_right")
+
+    xlabel_width, _ = _text_size(draw, "날짜", label_font)
+    draw.text(((left + right - xlabel_width) / 2, height - LABEL_PX - 12), "날짜", font=label_font, fill=TEXT_COLOR)
+    _rotated_text(image, "공부 시간 (분)", label_font, 90, (18, (top + bottom) / 2), "center")
+    return _to_png(image)
+
+
+def render_leaderboard_chart(names, values, title):
+    # charts.render_leaderboard_chart 와 같은 배치: 1위가 맨 위인 가로 막대 + 막대 끝 값
+    from PIL import Image, ImageDraw
+
+    width, height = 8 * DPI, int(max(3, 0.5 * len(names) + 1.5) * DPI)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    title_font, label_font, tick_font = _font(TITLE_PX), _font(LABEL_PX), _font(TICK_PX)
+    labels = [f"{rank}. {name}" for rank, name in enumerate(names, 1)]
+
+    label_width = max((_text_size(draw, label, tick_font)[0] for label in labels), default=0)
+    max_value = max(values, default=0) or 60
+    left, right, top, bottom = label_width + 20, width - 60, 50, height - LABEL_PX - 45
+    title_width, _ = _text_size(draw, title, title_font)
+    draw.text(((left + right - title_width) / 2, 12), title, font=title_font, fill=TEXT_COLOR)
+
+    def x_of(value):
+        return left + (right - left) * value / (max_value * 1.05)
+
+    step = max(1, int(max_value / 5 // 60 + 1) * 60) # 60분 단위 눈금 5개 안팎
+    for tick in range(0, int(max_value * 1.05) + 1, step):
+        x = x_of(tick)
+        if tick:
+            _dashed_line(draw, (x, bottom), (x, top), GRID_COLOR)
+        tick_width, _ = _text_size(draw, str(tick), tick_font)
+        draw.text((x - tick_width / 2, bottom + 6), str(tick), font=tick_font, fill=TEXT_COLOR)
+    draw.rectangle([left, top, right, bottom], outline=TEXT_COLOR)
+
+    slot = (bottom - top) / max(len(labels), 1)
+    for index, (label, value) in enumerate(zip(labels, values)):
+        center = top + slot * (index + 0.5)
+        draw.rectangle([left, center - slot * 0.4, x_of(value), center + slot * 0.4], fill="goldenrod")
+        text_width, text_height = _text_size(draw, label, tick_font)
+        draw.text((left - 8 - text_width, center - text_height / 2 - 2), label, font=tick_font, fill=TEXT_COLOR)
+        draw.text((x_of(value) + 4, center - text_height / 2 - 2), str(int(value)), font=tick_font, fill=TEXT_COLOR)
+
+    xlabel = "공부 시간 (분)"
+    xlabel_width, _ = _text_size(draw, xlabel, label_font)
+    draw.text(((left + right - xlabel_width) / 2, height - LABEL_PX - 12), xlabel, font=label_font, fill=TEXT_COLOR)
+    return _to_png(image)
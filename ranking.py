@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# ------------------ 서버 랭킹 인덱스 ------------------
+# 요청마다 전체 사용자를 정렬하는 대신 기간별로 (-공부 시간, uid) 정렬 상태를 항상 유지합니다.
+#   - 퇴장 기록 시 갱신: O(log n)
+#   - 상위 N명 조회: O(log n + N), 내 순위 조회: O(log n)
+#   - 주간 초기화 / 월 변경 시 일괄 비우기
+# sortedcontainers 가 설치되어 있으면 SortedList 를 사용하고, 없으면 bisect 기반 목록으로 대체합니다.
+import bisect
+
+try:
+    from sortedcontainers import SortedList
+except ImportError: # 선택 의존성
+    class SortedList:
+        """sortedcontainers.SortedList 에서 사용하는 기능만 구현한 대체 클래스 (bisect 기반)."""
+
+        def __init__(self, iterable=()):
+            self._items = sorted(iterable)
+
+        def __len__(self):
+            return len(self._items)
+
+        def __getitem__(self, index):
+            return self._items[index]
+
+        def add(self, value):
+            bisect.insort(self._items, value)
+
+        def remove(self, value):
+            index = bisect.bisect_left(self._items, value)
+            if index == len(self._items) or self._items[index] != value:
+                raise ValueError(f"{value!r} not in list")
+            del self._items[index]
+
+        def bisect_left(self, value):
+            return bisect.bisect_left(self._items, value)
+
+        def clear(self):
+            self._items.clear()
+
+RANKING_PERIODS = ("주간", "월간", "전체")
+
+
+class RankingIndex:
+    def __init__(self):
+        self.scores = {}             # uid_str -> 분
+        self._order = SortedList()   # (-분, uid_str): 공부 시간이 많은 순, 같으면 uid 순
+
+    def __len__(self):
+        return len(self.scores)
+
+    def set(self, uid_str, minutes):
+        old = self.scores.get(uid_str)
+        if old is not None:
+            self._order.remove((-old, uid_str))
+        self.scores[uid_str] = minutes
+        self._order.add((-minutes, uid_str))
+
+    def add(self, uid_str, minutes):
+        self.set(uid_str, self.scores.get(uid_str, 0) + minutes)
+
+    def top(self, n):
+        return [(uid_str, -neg) for neg, uid_str in self._order[:n]]
+
+    def rank(self, uid_str):
+        # 1부터 시작하는 순위 (기록이 없으면 None)
+        minutes = self.scores.get(uid_str)
+        if minutes is None:
+            return None
+        return self._order.bisect_left((-minutes, uid_str)) + 1
+
+    def clear(self):
+        self.scores.clear()
+        self._order.clear()
+
+
+class RankingBoard:
+    """주간/월간/전체 랭킹 인덱스 묶음. 주간/월간 인덱스는 주(월요일 날짜)/달이 바뀌면 자동으로 비워집니다."""
+
+    def __init__(self):
+        self.indexes = {period: RankingIndex() for period in RANKING_PERIODS}
+        self.usernames = {}
+        self.month_str = None
+        self.week_start = None
+
+    def load(self, rows, month_str, week_start=None):
+        # rows: (uid_str, username, 주간 합계, 이번 달 합계, 총합) 반복자. 시작 시 한 번 O(n log n)
+        self.month_str = month_str
+        self.week_start = week_start
+        for index in self.indexes.values():
+            index.clear()
+        for uid_str, username, weekly_sum, monthly_sum, total in rows:
+            self.usernames[uid_str] = username
+            if weekly_sum:
+                self.indexes["주간"].set(uid_str, weekly_sum)
+            if monthly_sum:
+                self.indexes["월간"].set(uid_str, monthly_sum)
+            if total:
+                self.indexes["전체"].set(uid_str, total)
+
+    def _roll_month(self, month_str):
+        if month_str != self.month_str:
+            self.indexes["월간"].clear()
+            self.month_str = month_str
+
+    def _roll_week(self, week_start):
+        if week_start is not None and week_start != self.week_start:
+            self.indexes["주간"].clear()
+            self.week_start = week_start
+
+    def record(self, uid_str, username, minutes, month_str, week_start=None):
+        # 퇴장 기록 시 호출
+        self._roll_month(month_str)
+        self._roll_week(week_start)
+        self.usernames[uid_str] = username
+        for index in self.indexes.values():
+            index.add(uid_str, minutes)
+
+    def get(self, period, month_str, week_start=None):
+        if period == "월간":
+            self._roll_month(month_str)
+        elif period == "주간":
+            self._roll_week(week_start)
+        return self.indexes[period]
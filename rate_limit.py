@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# ------------------ 명령어 요청 한도 (토큰 버킷) ------------------
+# 키(사용자 ID, 채널 ID)마다 토큰 버킷을 두고 명령어 한 번에 토큰 하나를 씁니다.
+# 버킷은 burst 개까지 차 있고 refill_seconds 초마다 하나씩 다시 찹니다 (짧은 연속 요청은 허용, 도배는 차단).
+# discord.py 명령어 check 로 붙이며, 한도를 넘으면 CheckFailure 의 하위 클래스인 CommandRateLimited 를
+# 발생시켜 on_command_error 에서 남은 대기 시간을 안내합니다 (슬래시 명령어는 check_rate_limits 를 직접 호출).
+import time
+
+from discord.ext import commands
+
+
+class CommandRateLimited(commands.CheckFailure):
+    """토큰 버킷이 비어 명령어를 실행할 수 없을 때 발생 (retry_after: 다음 토큰까지 남은 초)."""
+
+    def __init__(self, scope, retry_after):
+        self.scope = scope # "user" / "channel"
+        self.retry_after = retry_after
+        super().__init__(f"{scope} rate limited, retry after {retry_after:.1f}s")
+
+
+class TokenBucketLimiter:
+    def __init__(self, burst, refill_seconds, clock=time.monotonic):
+        self.burst = burst                   # 버킷 크기 (0 이면 제한 없음)
+        self.refill_seconds = refill_seconds # 토큰 하나가 다시 차는 시간(초)
+        self.clock = clock
+        self._buckets = {}                   # 키 -> [남은 토큰, 마지막 갱신 시각]
+        self._prune_at = 1024                # 이 수를 넘으면 가득 찬(=없는 것과 같은) 버킷 정리
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return self.burst > 0
+
+    def _tokens(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        tokens, updated_at = bucket
+        return min(float(self.burst), tokens + (now - updated_at) / self.refill_seconds)
+
+    def retry_after(self, key, now=None):
+        # 토큰을 쓰지 않고 확인만: 0 이면 지금 실행 가능, 아니면 다음 토큰까지 남은 초
+        if not self.enabled:
+            return 0.0
+        now = self.clock() if now is None else now
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) * self.refill_seconds
+
+    def take(self, key, now=None):
+        if not self.enabled:
+            return
+        now = self.clock() if now is None else now
+        self._buckets[key] = [self._tokens(key, now) - 1, now]
+        if len(self._buckets) > self._prune_at:
+            self._prune(now)
+
+    def _prune(self, now):
+        full_after = self.burst * self.refill_seconds
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < full_after}
+        self._prune_at = max(1024, len(self._buckets) * 2)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def check_rate_limits(user_limiter, channel_limiter, user_id, channel_id):
+    # 사용자/채널 버킷을 모두 확인한 뒤 둘 다 여유가 있을 때만 토큰을 씀
+    # (채널 한도로 거절된 요청이 사용자 토큰을 깎지 않도록). 슬래시 명령어에서도 직접 호출
+    now = user_limiter.clock()
+    for scope, limiter, key in (("user", user_limiter, user_id), ("channel", channel_limiter, channel_id)):
+        wait = limiter.retry_after(key, now)
+        if wait > 0:
+            limiter.rejected += 1
+            raise CommandRateLimited(scope, wait)
+    user_limiter.take(user_id, now)
+    channel_limiter.take(channel_id, now)
+
+
+def token_bucket_check(user_limiter, channel_limiter):
+    # 접두사 명령어용 check: 한도를 넘으면 CommandRateLimited → on_command_error
+    async def predicate(ctx):
+        check_rate_limits(user_limiter, channel_limiter, ctx.author.id, ctx.channel.id)
+        return True
+
+    return commands.check(predicate)
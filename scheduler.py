@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# ------------------ 마감 시각 기반 스케줄러 (min-heap) ------------------
+# 주기적으로 모든 항목을 훑는 대신, 키마다 "다음에 처리할 시각" 하나만 힙에 넣어 두고
+# 가장 이른 시각까지 잠들었다가 마감이 된 항목만 꺼내 처리합니다.
+# 한 번 깨어날 때의 작업량은 (마감된 항목 수 × log n) 이며 전체 항목 수와 무관합니다.
+# 취소/재예약은 키별 세대 번호로 처리(lazy deletion)하여 힙에서 직접 찾아 지우지 않습니다.
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class DeadlineScheduler:
+    def __init__(self, clock=time.time):
+        self.clock = clock           # 마감 시각 기준 (epoch 초)
+        self._heap = []              # (마감 시각, 순번, 키, 세대)
+        self._entries = {}           # 키 -> (세대, payload) : 현재 유효한 예약
+        self._generation = itertools.count()
+        self._sequence = itertools.count()
+        self._wakeup = None          # 더 이른 예약이 들어오면 잠든 run() 을 깨우는 이벤트
+        self.last_run = None         # 마지막으로 마감 항목을 처리한 시각 (상태 확인용)
+        self.processed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, deadline, payload=None):
+        # 같은 키의 기존 예약은 자동으로 무효화됨
+        generation = next(self._generation)
+        self._entries[key] = (generation, payload)
+        heapq.heappush(self._heap, (deadline, next(self._sequence), key, generation))
+        if self._wakeup is not None and self._heap[0][2] == key:
+            self._wakeup.set() # 가장 이른 예약이 바뀌었으므로 대기 시간 재계산
+
+    def get(self, key, default=None):
+        # 현재 유효한 예약의 payload (없으면 default)
+        entry = self._entries.get(key)
+        return default if entry is None else entry[1]
+
+    def cancel(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+
+    def next_deadline(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        # 힙 맨 앞의 취소/재예약된 항목 정리
+        while self._heap:
+            _, _, key, generation = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now=None):
+        # 마감이 지난 항목을 (키, payload) 목록으로 꺼냄
+        now = self.clock() if now is None else now
+        due = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, _, key, _ = heapq.heappop(self._heap)
+            _, payload = self._entries.pop(key)
+            due.append((key, payload))
+
+    async def run(self, handler):
+        # handler(key, payload) 코루틴을 마감 시각에 호출. 처리 중 같은 키를 다시 예약해도 됨
+        async def handle_each(due):
+            for key, payload in due:
+                try:
+                    await handler(key, payload)
+                except Exception as e:
+                    print(f"Error handling scheduled event for {key}: {e}")
+
+        await self.run_batches(handle_each)
+
+    async def run_batches(self, handler):
+        # 같은 시각에 마감된 항목을 한 번에 handler([(키, payload), ...]) 로 넘김 (일괄 발송용)
+        self._wakeup = asyncio.Event()
+        while True:
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - self.clock())
+            self._wakeup.clear()
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    continue # 새 예약으로 깨어남 → 대기 시간 다시 계산
+                except asyncio.TimeoutError:
+                    pass
+
+            due = self.pop_due()
+            try:
+                await handler(due)
+            except Exception as e:
+                print(f"Error handling {len(due)} scheduled events: {e}")
+            self.processed += len(due)
+            self.last_run = self.clock()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# ------------------ 샤드 모드 실행기 ------------------
+# 한 호스트에서 봇을 여러 프로세스로 나눠 실행합니다. 각 프로세스는 main.py 를 AutoShardedBot 으로 실행하며
+# 담당 샤드(SHARD_IDS)만 게이트웨이에 연결하고, 공부 기록/출석 상태는 같은 SQLite 파일(WAL)을 공유합니다.
+# 전역 예약 작업(주간 초기화, 주간 요약 DM)은 SQLite 임대로 선출된 프로세스 하나만 실행하고,
+# 서버별 저녁 알림은 그 서버의 샤드를 맡은 프로세스가 보냅니다.
+#
+# 사용법:
+#   SHARD_COUNT=4 SHARD_PROCESSES=2 python shard_runner.py
+#     SHARD_COUNT     : 전체 샤드 수 (길드 2,500개당 1개 이상 필요)
+#     SHARD_PROCESSES : 프로세스 수 (기본값 SHARD_COUNT). 샤드는 프로세스에 번갈아 배정
+#     PORT            : 첫 프로세스의 상태 확인 포트 (다음 프로세스부터 +1)
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from journal import AttendanceJournal, ATTENDANCE_JOURNAL_FILE, ATTENDANCE_SNAPSHOT_FILE
+from shared_state import SqliteAttendanceStore
+from storage import create_storage
+
+# main.py 와 같은 파일 이름 (출석 저널/스냅샷 파일 이름은 journal.py 에서 가져옴)
+DATA_FILE = 'user_data.json'
+CSV_FILE = 'study_log.csv'
+ATTENDANCE_FILE = 'attendance_log.json'
+
+RESTART_BACKOFF_MAX = 60 # 비정상 종료한 프로세스 재시작 대기 최대(초)
+
+
+def plan_shards(shard_count, processes):
+    # 샤드 번호를 프로세스에 번갈아 배정: 4샤드/2프로세스 → [[0, 2], [1, 3]]
+    return [list(range(i, shard_count, processes)) for i in range(processes)]
+
+
+def worker_name(index):
+    return f"worker-{index}"
+
+
+def prepare_shared_store(db_file, processes):
+    # 작업 프로세스를 띄우기 전에 한 번만: SQLite 생성 및 기존 JSON/CSV 기록, 출석 상태 가져오기
+    storage = create_storage("sqlite", DATA_FILE, CSV_FILE, db_file)
+    storage.close()
+
+    journal = AttendanceJournal(ATTENDANCE_JOURNAL_FILE, ATTENDANCE_SNAPSHOT_FILE)
+    states = journal.recover(legacy_file=ATTENDANCE_FILE)
+    journal.close()
+    # 가져온 입장 상태의 격려/자동 퇴장 담당 프로세스는 사용자 ID 로 고르게 나눔
+    owners = {uid_str: worker_name(int(uid_str) % processes) for uid_str in states}
+    store = SqliteAttendanceStore(db_file, owner=worker_name(0))
+    imported = store.import_states(states, owners)
+    store.close()
+    if imported:
+        print(f"기존 출석 상태 {imported}건을 공유 저장소로 가져왔습니다.")
+
+
+class Worker:
+    def __init__(self, index, shard_ids, shard_count, db_file, port):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.env = dict(os.environ,
+                        SHARD_COUNT=str(shard_count),
+                        SHARD_IDS=",".join(map(str, shard_ids)),
+                        SHARD_WORKER=worker_name(index),
+                        STORAGE_BACKEND="sqlite",
+                        SQLITE_DB_FILE=db_file,
+                        PORT=str(port))
+        self.process = None
+        self.restarts = 0
+        self.restart_at = 0.0
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, "main.py"], env=self.env)
+        print(f"{worker_name(self.index)} 시작 (pid {self.process.pid}, 샤드 {self.shard_ids}, 포트 {self.env['PORT']})")
+
+
+def main():
+    load_dotenv()
+    shard_count = int(os.getenv("SHARD_COUNT", "2"))
+    processes = min(int(os.getenv("SHARD_PROCESSES", str(shard_count))), shard_count)
+    db_file = os.getenv("SQLITE_DB_FILE", 'study.db')
+    base_port = int(os.getenv("PORT", "8080"))
+
+    prepare_shared_store(db_file, processes)
+    workers = [Worker(i, shard_ids, shard_count, db_file, base_port + i)
+               for i, shard_ids in enumerate(plan_shards(shard_count, processes))]
+    for worker in workers:
+        worker.start()
+
+    stopping = False
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for worker in workers:
+            if worker.process and worker.process.poll() is None:
+                worker.process.send_signal(signal.SIGINT) # main.py 가 종료 처리(데이터 기록, 임대 반납)를 하도록
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        time.sleep(1)
+        now = time.monotonic()
+        for worker in workers:
+            code = worker.process.poll()
+            if code is None:
+                continue
+            if worker.restart_at == 0.0:
+                delay = min(RESTART_BACKOFF_MAX, 2 ** worker.restarts)
+                print(f"{worker_name(worker.index)} 종료됨 (코드 {code}). {delay}초 뒤 다시 시작합니다.")
+                worker.restart_at = now + delay
+            elif now >= worker.restart_at:
+                worker.restarts += 1
+                worker.restart_at = 0.0
+                worker.start()
+
+    for worker in workers:
+        try:
+            worker.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+    print("모든 샤드 프로세스가 종료되었습니다.")
+
+
+if __name__ == "__main__":
+    main()
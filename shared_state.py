@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# ------------------ 다중 프로세스(샤드) 공유 상태 ------------------
+# 샤드 모드에서는 여러 프로세스가 같은 SQLite 파일(WAL)을 공유합니다.
+#   - SqliteAttendanceStore: 출석(입장 중) 상태. AttendanceJournal 과 같은 인터페이스로 main.py 에서 교체해 사용.
+#     각 행에는 입장을 처리한 프로세스(owner)가 기록되고, 격려/자동 퇴장 예약은 owner 프로세스만 처리합니다.
+#   - SqliteLease: 만료 시각이 있는 임대(lease) 행으로 전역 예약 작업(주간 초기화/요약 DM)을
+#     정확히 한 프로세스만 실행하도록 리더를 선출합니다. 리더가 죽으면 TTL 뒤 다른 프로세스가 이어받습니다.
+import asyncio
+import json
+import os
+import sqlite3
+import time
+
+LEASE_TTL = float(os.getenv("LEASE_TTL", "30")) # 리더 임대 유지 시간(초). TTL/3 마다 갱신
+SQLITE_BUSY_TIMEOUT = 30 # 다른 프로세스가 쓰는 중이면 최대 이 시간(초)까지 대기
+
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    user_id TEXT PRIMARY KEY,
+    owner   TEXT NOT NULL,
+    state   TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_owner ON attendance (owner);
+CREATE TABLE IF NOT EXISTS leases (
+    name    TEXT PRIMARY KEY,
+    holder  TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS guild_config (
+    guild_id TEXT PRIMARY KEY,
+    config   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def connect_shared(db_file):
+    conn = sqlite3.connect(db_file, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SHARED_SCHEMA)
+    conn.commit()
+    return conn
+
+
+class SqliteAttendanceStore:
+    def __init__(self, db_file, owner):
+        self.db_file = db_file
+        self.owner = owner # 이 프로세스 이름 (예: worker-0)
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = connect_shared(self.db_file)
+        return self.conn
+
+    def recover(self, legacy_file=None):
+        # 이 프로세스가 담당하는 입장 상태만 반환 (다른 프로세스의 사용자는 get() 으로 필요할 때 조회)
+        # legacy_file 은 단일 프로세스 모드와의 인터페이스 호환용이며, 기존 데이터는 shard_runner 가 가져옴
+        rows = self._connect().execute("SELECT user_id, state FROM attendance WHERE owner = ?", (self.owner,))
+        return {uid_str: json.loads(state) for uid_str, state in rows}
+
+    def import_states(self, states, owners):
+        # 기존 단일 프로세스 출석 상태를 한 번만 가져옴. owners: uid_str -> 담당 프로세스 이름
+        conn = self._connect()
+        with conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'attendance_imported'").fetchone():
+                return 0
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO attendance (user_id, owner, state, updated) VALUES (?, ?, ?, ?)",
+                [(uid_str, owners[uid_str], json.dumps(state, ensure_ascii=False), now)
+                 for uid_str, state in states.items()])
+            conn.execute("INSERT INTO meta (key, value) VALUES ('attendance_imported', ?)", (str(now),))
+        return len(states)
+
+    def append(self, event_type, uid, state=None):
+        # state 가 None 이면 삭제(퇴장). 상태를 기록한 프로세스가 이후 예약 처리 담당이 됨
+        self.append_many([(event_type, uid, state)])
+
+    def append_many(self, events):
+        # [(event_type, uid, state)] 를 트랜잭션 하나로 반영
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            for _, uid, state in events:
+                if state is None:
+                    conn.execute("DELETE FROM attendance WHERE user_id = ?", (str(uid),))
+                else:
+                    conn.execute(
+                        "INSERT INTO attendance (user_id, owner, state, updated) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET owner = excluded.owner, state = excluded.state, "
+                        "updated = excluded.updated",
+                        (str(uid), self.owner, json.dumps(state, ensure_ascii=False), now))
+
+    def get(self, uid_str):
+        row = self._connect().execute("SELECT state FROM attendance WHERE user_id = ?", (uid_str,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def owns(self, uid_str):
+        row = self._connect().execute("SELECT owner FROM attendance WHERE user_id = ?", (uid_str,)).fetchone()
+        return row is not None and row[0] == self.owner
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+
+    def count_by_guild(self):
+        # {서버 ID(DM 은 None): 입장 중 인원}
+        rows = self._connect().execute(
+            "SELECT json_extract(state, '$.\"서버\"') AS guild_id, COUNT(*) FROM attendance GROUP BY guild_id")
+        return {guild_id: count for guild_id, count in rows}
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SqliteLease:
+    def __init__(self, db_file, name, holder, ttl=LEASE_TTL):
+        self.db_file = db_file
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.expires = 0.0 # 이 프로세스가 리더로 인정받는 마지막 시각 (time.time 기준)
+        self.conn = None
+
+    @property
+    def is_leader(self):
+        # 갱신이 늦어진 경우에도 만료 시각이 지나면 스스로 리더가 아니라고 판단 (두 리더 방지)
+        return time.time() < self.expires
+
+    def try_acquire(self):
+        # 비어 있거나 만료된 임대를 가져오거나, 이미 가진 임대를 연장
+        if self.conn is None:
+            self.conn = connect_shared(self.db_file)
+        now = time.time()
+        expires = now + self.ttl
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO leases (name, holder, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires = excluded.expires "
+                "WHERE leases.holder = excluded.holder OR leases.expires < ?",
+                (self.name, self.holder, expires, now))
+            holder, = self.conn.execute("SELECT holder FROM leases WHERE name = ?", (self.name,)).fetchone()
+        was_leader = self.is_leader
+        self.expires = expires if holder == self.holder else 0.0
+        if self.is_leader != was_leader:
+            print(f"예약 작업 리더 {'획득' if self.is_leader else '상실'}: {self.holder} (현재 리더: {holder})")
+        return self.is_leader
+
+    async def run(self):
+        # TTL/3 마다 임대 갱신 (SQLite 잠금 대기가 이벤트 루프를 막지 않도록 스레드에서 실행)
+        while True:
+            try:
+                await asyncio.to_thread(self.try_acquire)
+            except sqlite3.Error as e:
+                print(f"리더 임대 갱신 실패: {e}")
+            await asyncio.sleep(self.ttl / 3)
+
+    def release(self):
+        if self.conn is None:
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+        self.expires = 0.0
+        self.conn.close()
+        self.conn = None
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# ------------------ 시작 단계별 시간 측정 ------------------
+# main.py import 시작부터 on_ready 까지를 단계별로 기록합니다 (import, 상태 로드, 로그인, 게이트웨이 연결).
+# 상태 로드는 로그인/게이트웨이 연결과 동시에 진행되므로 단계 시간의 합이 전체 시간보다 클 수 있습니다.
+# 목표(STARTUP_TARGET_SECONDS)를 넘으면 on_ready 때 경고를 출력합니다.
+import os
+import time
+from contextlib import contextmanager
+
+STARTUP_TARGET_SECONDS = float(os.getenv("STARTUP_TARGET_SECONDS", "10")) # import 시작 → on_ready 목표(초)
+
+
+class StartupTimer:
+    def __init__(self, target=STARTUP_TARGET_SECONDS):
+        self.started = time.perf_counter()
+        self.target = target
+        self.phases = {}      # 단계 이름 -> (시작, 끝) : import 시작 기준 초
+        self.ready_at = None  # 첫 on_ready 까지 걸린 시간(초)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def record(self, name, start, end=None):
+        self.phases[name] = (start, self.elapsed() if end is None else end)
+
+    def begin(self, name):
+        # 다른 곳에서 끝나는 단계 (예: 게이트웨이 연결 → on_ready)
+        self.phases[name] = (self.elapsed(), None)
+
+    def finish(self, name):
+        start, end = self.phases.get(name, (None, None))
+        if start is not None and end is None:
+            self.phases[name] = (start, self.elapsed())
+
+    @contextmanager
+    def phase(self, name):
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def mark_ready(self):
+        # 첫 on_ready 만 기록 (재연결 시의 on_ready 는 무시). 처음이면 True
+        if self.ready_at is not None:
+            return False
+        self.ready_at = self.elapsed()
+        return True
+
+    def durations(self):
+        return {name: round(end - start, 3) for name, (start, end) in self.phases.items() if end is not None}
+
+    def report(self):
+        # 단계별 [시작 → 끝] (소요) 표와 목표 대비 결과
+        lines = [f"  {name:<20} {start:7.3f}s → {end:7.3f}s ({end - start:.3f}s)"
+                 for name, (start, end) in sorted(self.phases.items(), key=lambda item: item[1][0]) if end is not None]
+        if self.ready_at is not None:
+            verdict = "목표 이내" if self.ready_at <= self.target else "목표 초과"
+            lines.append(f"  on_ready 까지 {self.ready_at:.3f}s (목표 {self.target:.0f}s, {verdict})")
+        return "\n".join(lines)
@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+# ------------------ 공부 기록 저장소 (교체 가능한 백엔드) ------------------
+# STORAGE_BACKEND 환경 변수로 선택:
+#   json   : 기존 user_data.json (메모리에 전체 로드, write-behind 기록)
+#   sqlite : study.db (WAL 모드, 인덱스 기반 조회, 메모리 사용량이 기록 길이와 무관)
+# 기존 JSON/CSV 데이터를 SQLite 로 옮기려면: python storage.py migrate
+#
+# 주간 기록은 ISO 주(월요일 시작) 기준이며 week_start("YYYY-MM-DD", 그 주 월요일)로 조회합니다.
+# 월요일에 모두 비우지 않고, 지난 주 날짜는 조회에서 제외되다가
+#   json   : 그 사용자가 다음에 기록할 때 주간 보관소(weekly_archive.py)로 옮겨짐
+#            (보관소 쓰기/읽기는 gzip 압축과 fsync 가 있으므로 전용 스레드 하나에서 순서대로 실행)
+#   sqlite : 주간 기록을 따로 두지 않고 daily_totals 의 해당 주 날짜를 날짜 색인으로 합산 (지난 주도 같은 방식)
+import abc
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from persistence import WriteBehindJsonStore
+from user_record import UserRecord, day_index, day_key, month_index
+from weekly_archive import WeeklyArchive, iter_legacy_backups, iso_week_key, split_by_week, week_start_of
+
+
+class StudyStorage(abc.ABC):
+    """공부 기록 저장소 인터페이스. 사용자 ID 는 문자열(uid_str)로 다룹니다.
+
+    blocking 이 True 인 백엔드는 조회/기록이 디스크 I/O 나 잠금 대기를 하므로 이벤트 루프 밖에서 호출합니다.
+    """
+
+    blocking = False
+
+    @abc.abstractmethod
+    def load(self):
+        pass
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def record_session(self, uid_str, username, date_str, month_str, minutes, start_time=None, end_time=None):
+        pass
+
+    @abc.abstractmethod
+    def get_summary(self, uid_str):
+        # {"username": str, "total": int} 또는 기록이 없으면 None
+        pass
+
+    @abc.abstractmethod
+    def get_daily_minutes(self, uid_str, date_str):
+        pass
+
+    @abc.abstractmethod
+    def get_monthly_minutes(self, uid_str, month_str):
+        pass
+
+    @abc.abstractmethod
+    def get_weekly(self, uid_str, week_start):
+        # week_start 주의 {날짜: 분} (이번 주 또는 지난 주)
+        pass
+
+    def get_recent_weekly(self, uid_str, week_start):
+        # 디스크를 읽지 않고 알 수 있는 주간 기록 (blocking 이 False 인 백엔드가 이벤트 루프에서 호출).
+        # 비어 있으면 read_archived_weekly 를 스레드에서 호출
+        return self.get_weekly(uid_str, week_start)
+
+    def read_archived_weekly(self, uid_str, week_start):
+        # get_recent_weekly 에 없는 (보관소로 옮겨진) 주의 {날짜: 분}. 디스크를 읽으므로 스레드에서 호출
+        return {}
+
+    @abc.abstractmethod
+    def iter_weekly(self, week_start):
+        # week_start 주에 기록이 있는 사용자마다 (uid_str, username, {날짜: 분})
+        pass
+
+    @abc.abstractmethod
+    def iter_ranking_rows(self, month_str, week_start):
+        # 랭킹 인덱스 초기화용: 사용자마다 (uid_str, username, 주간 합계, 해당 월 합계, 총합)
+        pass
+
+    def archive_stale_weeks(self, week_start):
+        # week_start 이전 주간 기록을 모두 보관 처리 (오프라인 정리용, 사용자 수에 비례)
+        pass
+
+
+def week_end_of(week_start):
+    return (date.fromisoformat(week_start) + timedelta(days=7)).isoformat()
+
+
+# ------------------ JSON 백엔드 (기존 방식) ------------------
+# 파일 형식은 그대로이며, 메모리에는 사용자마다 배열 기반 UserRecord(user_record.py)로 들고 있음
+class JsonStorage(StudyStorage):
+    def __init__(self, data_file, archive=None):
+        self.data_file = data_file
+        self.user_data = {} # uid_str -> UserRecord
+        self.store = WriteBehindJsonStore(data_file, encode=UserRecord.to_dict, cache_fragments=False)
+        self.archive = archive or WeeklyArchive()
+        # 보관소 덧붙이기(gzip + fsync)와 읽기는 이벤트 루프 밖의 스레드 하나에서 순서대로
+        # → 읽기는 앞서 넘긴 덧붙이기가 끝난 뒤 실행되므로 메모리에서 지운 날짜가 보이지 않는 순간이 없음
+        self.archive_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weekly-archive")
+
+    def load(self):
+        try:
+            self.user_data = {uid_str: UserRecord.from_dict(udata) for uid_str, udata in self.store.load().items()}
+        except json.JSONDecodeError:
+            print(f"경고: {self.data_file}이 비어있거나 잘못된 형식입니다. 새 데이터 파일을 생성합니다.")
+            self.user_data = {}
+        except Exception as e:
+            print(f"Error loading user data: {e}")
+            self.user_data = {} # 오류 발생 시 빈 딕셔너리로 초기화
+        self.archive.load()
+        for path, rows in iter_legacy_backups(os.path.dirname(os.path.abspath(self.data_file))):
+            # 예전 방식의 주간 백업 파일은 보관소로 옮기고 삭제 (한 번만)
+            self.archive.append([{"week": week, "user": uid_str, "username": username, "days": days}
+                                 for uid_str, username, weekly in rows
+                                 for week, days in split_by_week(weekly).items()])
+            os.remove(path)
+            print(f"주간 백업 {os.path.basename(path)} 을 주간 보관소로 옮겼습니다.")
+
+    def start(self):
+        self.store.start()
+
+    def close(self):
+        # 넘긴 보관소 기록을 먼저 마친 뒤 (지난 주 날짜를 지운) 사용자 기록 저장
+        self.archive_io.shutdown(wait=True)
+        self.archive.close()
+        self.store.close()
+
+    def _append_archive(self, records):
+        try:
+            self.archive.append(records)
+        except Exception as e:
+            # 메모리에서는 이미 지웠으므로 로그에라도 남김
+            print(f"Error appending weekly archive: {e}: {json.dumps(records, ensure_ascii=False)}")
+
+    def flush_archive(self):
+        # 지금까지 넘긴 보관소 기록이 끝날 때까지 대기 (테스트/벤치마크용)
+        self.archive_io.submit(lambda: None).result()
+
+    @staticmethod
+    def _username(uid_str, record):
+        return record.username if record.username is not None else f"User {uid_str}"
+
+    def _roll_weekly(self, uid_str, record, week_start):
+        # 지난 주 날짜를 보관소로 옮김 (해당 사용자가 기록할 때만 → 월요일 일괄 처리 없음)
+        start_index = day_index(week_start)
+        stale = {day_key(index): minutes for index, minutes in record.weekly.items(hi=start_index)}
+        if not stale:
+            return False
+        records = [{"week": week, "user": uid_str, "username": self._username(uid_str, record), "days": days}
+                   for week, days in split_by_week(stale).items()]
+        record.weekly.discard_before(start_index)
+        self.archive_io.submit(self._append_archive, records)
+        return True
+
+    def save(self, uid_str):
+        # 해당 사용자만 기록 대기열에 추가
+        try:
+            self.store.mark_dirty(uid_str, self.user_data[uid_str])
+        except Exception as e:
+            print(f"Error saving user data: {e}")
+
+    def record_session(self, uid_str, username, date_str, month_str, minutes, start_time=None, end_time=None):
+        record = self.user_data.get(uid_str)
+        if record is None: # 처음 기록 시
+            record = self.user_data[uid_str] = UserRecord(username)
+        record.username = username # 닉네임 변경 대비
+        self._roll_weekly(uid_str, record, week_start_of(date_str))
+        record.add_minutes(date_str, month_str, minutes) # 일간/주간/월간/총합 누적 O(1)
+        self.save(uid_str)
+
+    def get_summary(self, uid_str):
+        record = self.user_data.get(uid_str)
+        if record is None:
+            return None
+        return {"username": record.username, "total": record.total}
+
+    def get_daily_minutes(self, uid_str, date_str):
+        record = self.user_data.get(uid_str)
+        return record.daily.get(day_index(date_str)) if record else 0
+
+    def get_monthly_minutes(self, uid_str, month_str):
+        record = self.user_data.get(uid_str)
+        return record.monthly.get(month_index(month_str)) if record else 0
+
+    @staticmethod
+    def _week_days(record, week_start):
+        start_index = day_index(week_start)
+        return {day_key(index): minutes for index, minutes in record.weekly.items(start_index, start_index + 7)}
+
+    def get_weekly(self, uid_str, week_start):
+        return self.get_recent_weekly(uid_str, week_start) or self.read_archived_weekly(uid_str, week_start)
+
+    def get_recent_weekly(self, uid_str, week_start):
+        record = self.user_data.get(uid_str)
+        return self._week_days(record, week_start) if record else {}
+
+    def read_archived_weekly(self, uid_str, week_start):
+        # 이미 보관소로 옮겨진 주: 보관소 스레드에서 읽음 (대기 중인 덧붙이기 이후)
+        week = self.archive_io.submit(self.archive.read_week, iso_week_key(week_start)).result()
+        return week.get(uid_str, {}).get("days", {})
+
+    def iter_weekly(self, week_start):
+        for uid_str in list(self.user_data.keys()): # 반복 중 변경 대비
+            record = self.user_data.get(uid_str)
+            days = self._week_days(record, week_start) if record else None
+            if days:
+                yield uid_str, self._username(uid_str, record), days
+
+    def iter_ranking_rows(self, month_str, week_start):
+        start_index, month = day_index(week_start), month_index(month_str)
+        for uid_str, record in list(self.user_data.items()):
+            yield (uid_str, self._username(uid_str, record), record.weekly.range_sum(start_index, start_index + 7),
+                   record.monthly.get(month), record.total)
+
+    def archive_stale_weeks(self, week_start):
+        moved = 0
+        for uid_str, record in list(self.user_data.items()):
+            if self._roll_weekly(uid_str, record, week_start):
+                self.save(uid_str)
+                moved += 1
+        return moved
+
+
+# ------------------ SQLite 백엔드 ------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id  TEXT PRIMARY KEY,
+    username TEXT,
+    total    INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id    TEXT NOT NULL,
+    date       TEXT NOT NULL,
+    start_time TEXT,
+    end_time   TEXT,
+    minutes    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_date ON sessions (user_id, date);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id TEXT NOT NULL,
+    date    TEXT NOT NULL,
+    minutes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_daily_totals_date ON daily_totals (date);
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    user_id TEXT NOT NULL,
+    month   TEXT NOT NULL,
+    minutes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteStorage(StudyStorage):
+    # 연결은 load() 를 실행한 스레드(시작 시 상태 로드 스레드)에서 열리지만 이후에는 이벤트 루프와
+    # asyncio.to_thread 작업 스레드에서 쓰이므로, check_same_thread=False 로 열고 모든 접근을 잠금 하나로 직렬화
+    blocking = True # 다른 프로세스의 쓰기 잠금을 최대 30초 기다릴 수 있음 → main.py 는 스레드에서 호출
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.conn = None
+        self._lock = threading.RLock()
+
+    def load(self):
+        with self._lock:
+            # timeout: 샤드 모드에서 다른 프로세스의 쓰기 잠금 대기
+            self.conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL") # WAL 에서는 커밋마다 fsync 하지 않아도 손상되지 않음
+            self.conn.executescript(SCHEMA)
+            self.conn.commit()
+            self._drop_weekly_totals()
+            self._import_legacy_backups()
+
+    def _drop_weekly_totals(self):
+        # 예전 스키마의 weekly_totals 는 daily_totals 와 같은 (사용자, 날짜) 값을 한 번 더 저장하면서 정리되지 않았음.
+        # 주간 합계는 daily_totals 에서 계산하므로 daily_totals 에 없는 날짜만 옮기고 테이블 삭제 (한 번만).
+        # 샤드 모드에서 여러 프로세스가 동시에 시작해도 한 프로세스만 옮기도록 쓰기 잠금을 먼저 잡음
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            exists = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weekly_totals'").fetchone()
+            if exists:
+                self.conn.execute("INSERT OR IGNORE INTO daily_totals (user_id, date, minutes) "
+                                  "SELECT user_id, date, minutes FROM weekly_totals")
+                self.conn.execute("DROP TABLE weekly_totals")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if exists:
+            print("주간 기록(weekly_totals)을 일별 기록으로 합치고 테이블을 삭제했습니다.")
+
+    def _import_legacy_backups(self):
+        # 예전 주간 초기화가 지운 주간 기록은 백업 파일에만 있으므로 daily_totals 로 되돌리고 파일 삭제 (한 번만).
+        # 같은 날짜의 일별 기록이 이미 있으면 그 값이 그날 전체이므로 그대로 둠
+        directory = os.path.dirname(os.path.abspath(self.db_file))
+        for path, rows in iter_legacy_backups(directory):
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO daily_totals (user_id, date, minutes) VALUES (?, ?, ?)",
+                    ((uid_str, date_str, minutes) for uid_str, _, weekly in rows for date_str, minutes in weekly.items()))
+            os.remove(path)
+            print(f"주간 백업 {os.path.basename(path)} 을 SQLite 일별 기록으로 옮겼습니다.")
+
+    def close(self):
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def _add_minutes(self, uid_str, username, date_str, month_str, minutes):
+        self.conn.execute(
+            "INSERT INTO users (user_id, username, total) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, total = total + excluded.total",
+            (uid_str, username, minutes))
+        self.conn.execute(
+            "INSERT INTO daily_totals (user_id, date, minutes) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, date) DO UPDATE SET minutes = minutes + excluded.minutes",
+            (uid_str, date_str, minutes))
+        self.conn.execute(
+            "INSERT INTO monthly_totals (user_id, month, minutes) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, month) DO UPDATE SET minutes = minutes + excluded.minutes",
+            (uid_str, month_str, minutes))
+
+    def record_session(self, uid_str, username, date_str, month_str, minutes, start_time=None, end_time=None):
+        with self._lock, self.conn: # 하나의 트랜잭션으로 세션과 집계를 함께 반영
+            self.conn.execute(
+                "INSERT INTO sessions (user_id, date, start_time, end_time, minutes) VALUES (?, ?, ?, ?, ?)",
+                (uid_str, date_str, start_time, end_time, minutes))
+            self._add_minutes(uid_str, username, date_str, month_str, minutes)
+
+    def _fetchone(self, sql, params):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        # 커서를 잠금 밖으로 넘기지 않도록 결과를 모두 읽어서 반환
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def get_summary(self, uid_str):
+        row = self._fetchone("SELECT username, total FROM users WHERE user_id = ?", (uid_str,))
+        if row is None:
+            return None
+        return {"username": row[0], "total": row[1]}
+
+    def get_daily_minutes(self, uid_str, date_str):
+        row = self._fetchone(
+            "SELECT minutes FROM daily_totals WHERE user_id = ? AND date = ?", (uid_str, date_str))
+        return row[0] if row else 0
+
+    def get_monthly_minutes(self, uid_str, month_str):
+        row = self._fetchone(
+            "SELECT minutes FROM monthly_totals WHERE user_id = ? AND month = ?", (uid_str, month_str))
+        return row[0] if row else 0
+
+    def get_weekly(self, uid_str, week_start):
+        rows = self._fetchall(
+            "SELECT date, minutes FROM daily_totals WHERE user_id = ? AND date >= ? AND date < ? ORDER BY date",
+            (uid_str, week_start, week_end_of(week_start)))
+        return dict(rows)
+
+    def iter_weekly(self, week_start):
+        # 한 주는 사용자당 최대 7행이므로 한 번에 읽고, 사용자 단위로 묶어서 반환 (날짜 색인으로 해당 주만 읽음)
+        rows = self._fetchall(
+            "SELECT w.user_id, u.username, w.date, w.minutes FROM daily_totals w "
+            "LEFT JOIN users u ON u.user_id = w.user_id WHERE w.date >= ? AND w.date < ? ORDER BY w.user_id, w.date",
+            (week_start, week_end_of(week_start)))
+        current_uid, current_name, weekly = None, None, {}
+        for uid_str, username, date_str, minutes in rows:
+            if uid_str != current_uid:
+                if current_uid is not None and weekly:
+                    yield current_uid, current_name, weekly
+                current_uid, current_name, weekly = uid_str, username or f"User {uid_str}", {}
+            weekly[date_str] = minutes
+        if current_uid is not None and weekly:
+            yield current_uid, current_name, weekly
+
+    def iter_ranking_rows(self, month_str, week_start):
+        rows = self._fetchall(
+            "SELECT u.user_id, u.username, COALESCE(w.minutes, 0), COALESCE(m.minutes, 0), u.total FROM users u "
+            "LEFT JOIN (SELECT user_id, SUM(minutes) AS minutes FROM daily_totals "
+            "WHERE date >= ? AND date < ? GROUP BY user_id) w ON w.user_id = u.user_id "
+            "LEFT JOIN monthly_totals m ON m.user_id = u.user_id AND m.month = ?",
+            (week_start, week_end_of(week_start), month_str))
+        for uid_str, username, weekly_sum, monthly_sum, total in rows:
+            yield uid_str, username or f"User {uid_str}", weekly_sum, monthly_sum, total
+
+    # --- JSON/CSV 가져오기 ---
+    def import_legacy(self, data_file, csv_file):
+        # user_data.json 의 집계와 study_log.csv 의 세션을 한 번에 가져옴 (이미 가져온 적이 있으면 건너뜀)
+        with self._lock:
+            return self._import_legacy_locked(data_file, csv_file)
+
+    def _import_legacy_locked(self, data_file, csv_file):
+        if self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            print("SQLite DB에 이미 데이터가 있어 가져오기를 건너뜁니다.")
+            return False
+
+        user_count = session_count = 0
+        with self.conn:
+            if os.path.exists(data_file):
+                with open(data_file, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+                for uid_str, udata in legacy.items():
+                    self.conn.execute("INSERT INTO users (user_id, username, total) VALUES (?, ?, ?)",
+                                      (uid_str, udata.get("username"), udata.get("total", 0)))
+                    # 주간 기록은 일별 기록의 일부이므로 일별 기록에 없는 날짜만 더함
+                    for table, column, values in (("daily_totals", "date", udata.get("daily", {})),
+                                                  ("daily_totals", "date", udata.get("weekly", {})),
+                                                  ("monthly_totals", "month", udata.get("monthly", {}))):
+                        self.conn.executemany(
+                            f"INSERT OR IGNORE INTO {table} (user_id, {column}, minutes) VALUES (?, ?, ?)",
+                            ((uid_str, key, minutes) for key, minutes in values.items()))
+                    user_count += 1
+
+            if os.path.exists(csv_file):
+                with open(csv_file, 'r', newline='', encoding='utf-8-sig') as f:
+                    reader = csv.reader(f)
+                    next(reader, None) # 헤더 건너뛰기
+                    before = self.conn.total_changes
+                    self.conn.executemany(
+                        "INSERT INTO sessions (user_id, date, start_time, end_time, minutes) VALUES (?, ?, ?, ?, ?)",
+                        self._iter_csv_sessions(reader, csv_file))
+                    session_count = self.conn.total_changes - before
+
+        print(f"가져오기 완료: 사용자 {user_count}명, 세션 {session_count}건")
+        return True
+
+    @staticmethod
+    def _iter_csv_sessions(reader, csv_file):
+        # (user_id, date, start, end, minutes). 열이 모자라거나 공부 시간이 숫자가 아닌 줄은 건너뛰고 알림
+        skipped = 0
+        for row in reader:
+            try:
+                yield row[0], row[2], row[3], row[4], int(row[5])
+            except (IndexError, ValueError):
+                skipped += 1
+                print(f"경고: {csv_file} {reader.line_num}번째 줄을 가져오지 못해 건너뜁니다: {row}")
+        if skipped:
+            print(f"{csv_file}: 잘못된 줄 {skipped}개를 건너뛰었습니다.")
+
+
+# ------------------ 백엔드 생성 ------------------
+def create_storage(backend, data_file, csv_file, db_file):
+    backend = (backend or "json").lower()
+    if backend == "sqlite":
+        is_new_db = not os.path.exists(db_file)
+        storage = SqliteStorage(db_file)
+        storage.load()
+        if is_new_db:
+            # 처음 SQLite 로 전환할 때 기존 JSON/CSV 기록을 자동으로 가져옴
+            storage.import_legacy(data_file, csv_file)
+        return storage
+    if backend != "json":
+        print(f"경고: 알 수 없는 STORAGE_BACKEND '{backend}'. JSON 백엔드를 사용합니다.")
+    storage = JsonStorage(data_file)
+    storage.load()
+    return storage
+
+
+if __name__ == "__main__":
+    # 사용법: python storage.py migrate [user_data.json] [study_log.csv] [study.db]
+    #         python storage.py archive [user_data.json] : 한동안 기록이 없던 사용자의 지난 주간 기록도 보관소로 옮김
+    if len(sys.argv) >= 2 and sys.argv[1] == "archive":
+        json_storage = JsonStorage(sys.argv[2] if len(sys.argv) >= 3 else 'user_data.json')
+        json_storage.load()
+        json_storage.start()
+        moved = json_storage.archive_stale_weeks(week_start_of(date.today().isoformat()))
+        json_storage.close()
+        print(f"지난 주간 기록 보관 완료: {moved}명")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        args = sys.argv[2:] + [None] * 3
+        data_file = args[0] or 'user_data.json'
+        csv_file = args[1] or 'study_log.csv'
+        db_file = args[2] or os.getenv("SQLITE_DB_FILE", 'study.db')
+        target = SqliteStorage(db_file)
+        target.load()
+        target.import_legacy(data_file, csv_file)
+        target.close()
+    else:
+        print("사용법: python storage.py migrate [user_data.json] [study_log.csv] [study.db]\n"
+              "        python storage.py archive [user_data.json]")
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+
+from analytics import StudyLogAnalytics
+
+HEADER = ['User ID', 'Username', 'Date', 'Start Time', 'End Time', 'Duration (min)', 'Guild ID']
+
+
+def write_log(path, rows, mode='w'):
+    with open(path, mode, newline='', encoding='utf-8-sig' if mode == 'w' else 'utf-8') as f:
+        writer = csv.writer(f)
+        if mode == 'w':
+            writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def test_range_minutes_with_unsorted_dates(tmp_path):
+    csv_file = str(tmp_path / "study_log.csv")
+    write_log(csv_file, [
+        ["1", "alice", "2026-10-02", "09:00", "10:00", "60", ""],
+        ["1", "alice", "2026-10-05", "09:00", "09:30", "30", ""],
+        ["1", "alice", "2026-10-03", "23:00", "23:45", "45", ""], # 다른 시간대 서버의 늦게 끝난 세션
+        ["2", "bob", "2026-10-03", "09:00", "09:10", "10", ""],
+    ])
+    analytics = StudyLogAnalytics(csv_file, str(tmp_path / "checkpoint.json"))
+    assert analytics.range_minutes("1", "2026-10-01", "2026-10-03") == (105, 2)
+    assert analytics.range_minutes("1", "2026-10-04", "2026-10-31") == (30, 1)
+
+
+def test_checkpoint_written_at_most_once_per_interval(tmp_path):
+    csv_file = str(tmp_path / "study_log.csv")
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    write_log(csv_file, [["1", "alice", "2026-10-02", "09:00", "10:00", "60", ""]])
+    analytics = StudyLogAnalytics(csv_file, checkpoint_file, checkpoint_interval=3600)
+    assert analytics.user_summary("1")["total"] == 60
+    first_write = os.stat(checkpoint_file).st_mtime_ns
+
+    write_log(csv_file, [["1", "alice", "2026-10-03", "09:00", "09:30", "30", ""]], mode='a')
+    assert analytics.user_summary("1")["total"] == 90
+    assert os.stat(checkpoint_file).st_mtime_ns == first_write # 간격 안에서는 다시 쓰지 않음
+
+    analytics.save_checkpoint()
+    resumed = StudyLogAnalytics(csv_file, checkpoint_file)
+    assert resumed.user_summary("1") == {"username": "alice", "total": 90, "sessions": 2, "years": {"2026": 90}}
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import types
+
+import pytest
+
+import main
+from guild_config import GuildConfig
+
+
+class FakeCtx:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+
+
+@pytest.fixture
+def intent_off(monkeypatch):
+    monkeypatch.setattr(main, "MESSAGE_CONTENT_INTENT", False)
+    monkeypatch.setattr(main, "SLASH_COMMANDS", True)
+
+
+def test_hints_use_prefix_commands_when_intent_on(monkeypatch):
+    monkeypatch.setattr(main, "MESSAGE_CONTENT_INTENT", True)
+    assert main.command_hint("통계", "주간") == "`!통계 주간`"
+    assert "`!입장`" in main.render_reminder_message(GuildConfig(), 3)
+
+
+def test_hints_use_slash_commands_when_intent_off(intent_off):
+    assert main.command_hint("입장") == "`/입장`"
+    assert main.command_hint("랭킹", "월간", "그래프") == "`/랭킹 기간:월간 옵션:그래프`"
+    message = main.render_reminder_message(GuildConfig(), 3)
+    assert "`/입장`" in message and "!입장" not in message
+
+
+def test_hints_fall_back_to_mention_without_slash_commands(intent_off, monkeypatch):
+    monkeypatch.setattr(main, "SLASH_COMMANDS", False)
+    assert main.command_hint("퇴장").endswith(" 퇴장`")
+    assert main.command_hint("퇴장").startswith("`@")
+
+
+def test_help_lists_only_working_commands_when_intent_off(intent_off):
+    ctx = FakeCtx()
+    asyncio.run(main.help_command.callback(ctx))
+    embed = ctx.sent[0][1]["embed"]
+    text = " ".join(field.name + field.value for field in embed.fields)
+    assert "`/랭킹 기간:[주간/월간/전체] 옵션:[그래프]`" in text
+    assert "`/설정 항목:" in text
+    assert not any(f"`!{name}" in text for name in ("입장", "퇴장", "통계", "랭킹", "설정", "도움말"))
+
+
+def test_every_prefix_command_has_a_slash_command():
+    slash = {command.name for command in main.bot.tree.get_commands()}
+    assert {"입장", "퇴장", "통계", "랭킹", "설정", "도움말"} <= slash
+
+
+def test_channel_values_parse_from_mentions_and_ids():
+    channels = {111111111111111111: "text", 222222222222222222: "voice"}
+    guild = types.SimpleNamespace(get_channel=channels.get)
+    assert main.mentioned_channels(guild, "<#111111111111111111>") == ["text"]
+    assert main.mentioned_channels(guild, "111111111111111111 <#222222222222222222>") == ["text", "voice"]
+    assert main.mentioned_channels(guild, "general") == []
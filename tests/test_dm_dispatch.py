@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import types
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import discord
+import pytest
+
+from dm_dispatch import BulkDMDispatcher, DMProgressLog, TokenBucket, is_run_complete
+
+
+def http_error(cls, status):
+    response = types.SimpleNamespace(status=status, reason="error", headers={})
+    return cls(response, "error")
+
+
+def read_progress(tmp_path):
+    return DMProgressLog(str(tmp_path / "dm_progress_test.jsonl")).load()
+
+
+def run_dispatch(tmp_path, keys, send, needs_dm_channel=None, max_retries=0):
+    dispatcher = BulkDMDispatcher("test", concurrency=2, global_rate=1000, create_rate=1000,
+                                  max_retries=max_retries, progress_dir=str(tmp_path),
+                                  needs_dm_channel=needs_dm_channel)
+
+    async def prepare(key, item):
+        return item
+
+    return dispatcher, asyncio.run(dispatcher.run(((key, key) for key in keys), prepare, send))
+
+
+def test_token_bucket_limits_rate():
+    async def scenario():
+        bucket = TokenBucket(rate=50, burst=5)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(15):
+            await bucket.acquire()
+        return loop.time() - started
+
+    # 처음 5개는 즉시, 나머지 10개는 초당 50개 → 약 0.2초
+    assert 0.15 <= asyncio.run(scenario()) < 1.0
+
+
+def test_create_bucket_only_charged_for_new_dm_channels(tmp_path):
+    charged = []
+
+    async def send(key, prepared):
+        pass
+
+    dispatcher = BulkDMDispatcher("test", global_rate=1000, create_rate=1000, progress_dir=str(tmp_path),
+                                  needs_dm_channel=lambda key: key.startswith("new"))
+    original_acquire = dispatcher.create_bucket.acquire
+
+    async def counted_acquire():
+        charged.append(1)
+        await original_acquire()
+
+    dispatcher.create_bucket.acquire = counted_acquire
+
+    async def prepare(key, item):
+        return item
+
+    keys = ["new1", "old1", "old2", "new2", "old3"]
+    stats = asyncio.run(dispatcher.run(((key, key) for key in keys), prepare, send))
+    assert stats["sent"] == 5
+    assert len(charged) == 2
+
+
+def test_failed_users_are_retried_on_resume(tmp_path):
+    async def first_send(key, prepared):
+        if key == "b":
+            raise http_error(discord.HTTPException, 500)
+        if key == "c":
+            raise http_error(discord.Forbidden, 403)
+
+    _, stats = run_dispatch(tmp_path, ["a", "b", "c"], first_send)
+    assert (stats["sent"], stats["failed"], stats["undeliverable"]) == (1, 1, 1)
+    assert read_progress(tmp_path) == ({"a": "sent", "b": "failed", "c": "undeliverable"}, True)
+
+    resent = []
+
+    async def second_send(key, prepared):
+        resent.append(key)
+
+    _, stats = run_dispatch(tmp_path, ["a", "b", "c"], second_send)
+    assert resent == ["b"]
+    assert (stats["sent"], stats["resumed"], stats["resent"]) == (1, 2, 1)
+    assert read_progress(tmp_path)[0]["b"] == "sent"
+
+
+def test_resume_sends_only_remaining_users(tmp_path):
+    # 절반을 보낸 뒤 종료된 회차: 완료 표시 없이 sent 줄만 남고 마지막 줄은 기록 도중 잘림
+    with open(tmp_path / "dm_progress_test.jsonl", "w", encoding="utf-8") as f:
+        for key in ("u0", "u1", "u2"):
+            f.write(json.dumps({"key": key, "result": "sent"}) + "\n")
+        f.write('{"key": "u3", "res')
+    assert not is_run_complete("test", str(tmp_path))
+
+    sent = []
+
+    async def send(key, prepared):
+        sent.append(key)
+
+    _, stats = run_dispatch(tmp_path, [f"u{i}" for i in range(6)], send)
+    assert sorted(sent) == ["u3", "u4", "u5"]
+    assert (stats["sent"], stats["resumed"]) == (3, 3)
+    assert is_run_complete("test", str(tmp_path))
+
+
+def test_sent_is_on_disk_before_next_user(tmp_path):
+    # 발송 직후 강제 종료되어도 이미 보낸 사용자는 진행 파일에 남아 있어야 함
+    on_disk = []
+
+    async def send(key, prepared):
+        on_disk.append(dict(read_progress(tmp_path)[0]))
+
+    dispatcher = BulkDMDispatcher("test", concurrency=1, global_rate=1000, create_rate=1000,
+                                  progress_dir=str(tmp_path))
+
+    async def prepare(key, item):
+        return item
+
+    asyncio.run(dispatcher.run(((key, key) for key in ["a", "b", "c"]), prepare, send))
+    assert on_disk == [{}, {"a": "sent"}, {"a": "sent", "b": "sent"}]
+
+
+@pytest.mark.parametrize("now, complete, pending", [
+    (datetime(2026, 10, 17, 9, 30), False, True),   # 토요일 08:00 이후, 미완료 → 이어 보내기
+    (datetime(2026, 10, 17, 9, 30), True, False),   # 이미 완료
+    (datetime(2026, 10, 17, 7, 59), False, False),  # 정각 실행 전
+    (datetime(2026, 10, 18, 9, 30), False, False),  # 일요일
+])
+def test_weekly_summary_catch_up_window(monkeypatch, now, complete, pending):
+    import main
+
+    checked = []
+
+    def fake_is_run_complete(run_id):
+        checked.append(run_id)
+        return complete
+
+    monkeypatch.setattr(main, "is_run_complete", fake_is_run_complete)
+    assert main.weekly_summary_pending(now.replace(tzinfo=ZoneInfo("Asia/Seoul"))) is pending
+    assert checked in ([], ["weekly_summary_2026-W42"])
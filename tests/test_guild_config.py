@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+
+from guild_config import GuildConfig, GuildConfigStore
+
+
+def test_concurrent_saves_from_worker_threads_keep_every_guild(tmp_path):
+    path = str(tmp_path / "guild_config.json")
+    store = GuildConfigStore(path)
+    store.load()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for guild_id in range(1, 41):
+            pool.submit(store.set, guild_id, GuildConfig(channel_id=guild_id * 10))
+    store.set_home_guild(1)
+
+    reloaded = GuildConfigStore(path)
+    reloaded.load()
+    assert {gid: config.channel_id for gid, config in reloaded.configs.items()} == {
+        gid: gid * 10 for gid in range(1, 41)}
+    assert reloaded.home_decided and reloaded.home_guild_id == 1
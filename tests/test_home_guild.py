@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import types
+
+import pytest
+
+import main
+from guild_config import GuildConfigStore
+
+
+@pytest.mark.parametrize("minutes, text", [(90, "1시간 30분"), (360, "6시간"), (45, "45분")])
+def test_format_minutes(minutes, text):
+    assert main.format_minutes(minutes) == text
+
+
+@pytest.fixture
+def guild_configs(tmp_path, monkeypatch):
+    store = GuildConfigStore(str(tmp_path / "guild_config.json"))
+    store.load()
+    monkeypatch.setattr(main, "guild_configs", store)
+    monkeypatch.delenv("STUDY_CHANNEL_ID", raising=False)
+    return store
+
+
+def fake_guilds(monkeypatch, guild_ids):
+    async def fetch_guilds(limit=None):
+        for guild_id in guild_ids[:limit]:
+            yield types.SimpleNamespace(id=guild_id)
+
+    monkeypatch.setattr(main.bot, "fetch_guilds", fetch_guilds)
+
+
+def test_home_guild_resolved_from_study_channel(guild_configs, monkeypatch):
+    async def fetch_channel(channel_id):
+        return types.SimpleNamespace(id=channel_id, guild=types.SimpleNamespace(id=100))
+
+    monkeypatch.setenv("STUDY_CHANNEL_ID", "555")
+    monkeypatch.setattr(main.bot, "fetch_channel", fetch_channel)
+    asyncio.run(main.resolve_home_guild())
+    assert guild_configs.home_decided and guild_configs.home_guild_id == 100
+    assert guild_configs.storage_key(100, 7) == "7"
+
+
+def test_home_guild_single_guild_fallback(guild_configs, monkeypatch):
+    fake_guilds(monkeypatch, [200])
+    asyncio.run(main.resolve_home_guild())
+    assert guild_configs.home_guild_id == 200
+
+
+def test_home_guild_undecided_with_several_guilds(guild_configs, monkeypatch):
+    fake_guilds(monkeypatch, [200, 300])
+    asyncio.run(main.resolve_home_guild())
+    assert guild_configs.home_decided and guild_configs.home_guild_id is None
+    assert guild_configs.storage_key(200, 7) == "200:7"
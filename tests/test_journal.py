@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import json
+
+from journal import AttendanceJournal
+
+
+def make_journal(tmp_path, snapshot_every=3):
+    return AttendanceJournal(str(tmp_path / "attendance_journal.jsonl"), str(tmp_path / "attendance_snapshot.json"),
+                             snapshot_every=snapshot_every, fsync=False)
+
+
+def entry(hour):
+    return {"입장": f"2026-10-17T{hour:02d}:00:00+09:00", "마지막_격려": 0, "서버": None}
+
+
+def write_history(tmp_path):
+    # 스냅샷 두 번(3건마다) + 저널 꼬리 2건 → 최신/직전 스냅샷과 두 저널이 모두 생김
+    journal = make_journal(tmp_path)
+    journal.recover()
+    for uid in range(1, 8):
+        journal.append("check_in", uid, entry(uid))
+    journal.append("check_out", 2)
+    journal._file.close() # 종료 시 스냅샷 없이 끝난 것처럼 (close() 를 부르지 않음)
+    journal._file = None
+    expected = {str(uid): entry(uid) for uid in range(1, 8) if uid != 2}
+    return expected
+
+
+def test_recover_replays_journal_after_snapshot(tmp_path):
+    expected = write_history(tmp_path)
+    journal = make_journal(tmp_path)
+    assert journal.recover() == expected
+    assert journal.seq == 8
+
+
+def test_recover_ignores_truncated_last_line(tmp_path):
+    expected = write_history(tmp_path)
+    with open(tmp_path / "attendance_journal.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"seq": 9, "type": "check_in", "uid": "9", "sta')
+    assert make_journal(tmp_path).recover() == expected
+
+
+def test_recover_falls_back_to_previous_snapshot(tmp_path):
+    expected = write_history(tmp_path)
+    (tmp_path / "attendance_snapshot.json").write_text('{"seq": 6, "state": {"1": ', encoding="utf-8")
+    journal = make_journal(tmp_path)
+    assert journal.recover() == expected
+    assert (tmp_path / "attendance_snapshot.json.corrupt").exists()
+    # 복구 후 새로 저장한 스냅샷으로 다시 시작할 수 있음
+    assert make_journal(tmp_path).recover() == expected
+
+
+def test_recover_replays_journals_when_all_snapshots_are_lost(tmp_path):
+    write_history(tmp_path)
+    (tmp_path / "attendance_snapshot.json").write_text("", encoding="utf-8")
+    (tmp_path / "attendance_snapshot.json.prev").write_text("", encoding="utf-8")
+    state = make_journal(tmp_path).recover()
+    # 직전 스냅샷 이후의 이벤트만 남아 있음 (uid 4~7)
+    assert state == {str(uid): entry(uid) for uid in range(4, 8)}
+
+
+def test_recover_after_crash_between_rotation_steps(tmp_path):
+    expected = write_history(tmp_path)
+    # 저널은 직전 세대로 옮겼지만 스냅샷을 옮기기 전에 종료된 경우
+    (tmp_path / "attendance_journal.jsonl").replace(tmp_path / "attendance_journal.jsonl.prev")
+    assert make_journal(tmp_path).recover() == expected
+
+
+def test_legacy_attendance_log_imported_once(tmp_path):
+    legacy = tmp_path / "attendance_log.json"
+    legacy.write_text(json.dumps({"1": entry(9)}), encoding="utf-8")
+    journal = make_journal(tmp_path)
+    assert journal.recover(legacy_file=str(legacy)) == {"1": entry(9)}
+    journal.append("check_out", 1)
+    journal.close()
+    assert make_journal(tmp_path).recover(legacy_file=str(legacy)) == {}
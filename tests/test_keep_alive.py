@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import keep_alive
+from keep_alive import HealthServer, TaskMonitor
+
+
+class FakeBot:
+    def __init__(self, ready=False, latency=float("inf")):
+        self.ready = ready
+        self.latency = latency
+        self.guilds = []
+
+    def is_ready(self):
+        return self.ready
+
+    def is_closed(self):
+        return False
+
+
+def statuses(server):
+    async def fetch():
+        return (await server.handle_health(None)).status, (await server.handle_live(None)).status
+
+    return asyncio.run(fetch())
+
+
+def test_live_tolerates_startup_and_reconnects_but_not_a_dead_gateway(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(keep_alive.time, "time", lambda: now[0])
+    bot = FakeBot()
+    server = HealthServer(bot, TaskMonitor())
+
+    assert statuses(server) == (503, 200) # 시작 중: 준비 전이지만 살아 있음
+    bot.ready, bot.latency = True, 0.1
+    assert statuses(server) == (200, 200)
+
+    bot.ready = False # 게이트웨이 재연결
+    now[0] += keep_alive.HEALTH_LIVENESS_GRACE - 1
+    assert statuses(server) == (503, 200)
+    now[0] += 2 # 유예 시간을 넘겨 계속 끊겨 있음 → 플랫폼이 재시작하도록
+    assert statuses(server) == (503, 503)
+
+    bot.ready = True
+    assert statuses(server) == (200, 200)
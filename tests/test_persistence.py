@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+
+import pytest
+
+import persistence
+from persistence import WriteBehindJsonStore, atomic_write_text
+
+
+def test_atomic_write_keeps_old_file_on_failure(tmp_path, monkeypatch):
+    path = tmp_path / "data.json"
+    atomic_write_text(str(path), "old")
+
+    def broken_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(persistence.os, "replace", broken_replace)
+    with pytest.raises(OSError):
+        atomic_write_text(str(path), "new")
+    assert path.read_text(encoding="utf-8") == "old"
+    assert os.listdir(tmp_path) == ["data.json"] # 임시 파일이 남지 않음
+
+
+@pytest.mark.parametrize("cache_fragments", [True, False])
+def test_replace_all_races_with_background_flush(tmp_path, cache_fragments):
+    path = str(tmp_path / "data.json")
+    store = WriteBehindJsonStore(path, flush_interval=0.001, max_pending=1, cache_fragments=cache_fragments)
+    store.load()
+    store.start()
+    errors = []
+
+    def flusher():
+        try:
+            for _ in range(300):
+                store.flush()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=flusher)
+    thread.start()
+    for round_no in range(300):
+        data = {str(i): {"round": round_no} for i in range(round_no % 7, 40 + round_no % 5)}
+        store.replace_all(data)
+        store.mark_dirty("extra", round_no)
+    thread.join()
+    store.close()
+
+    assert errors == []
+    expected = {**data, "extra": 299}
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == expected
+    # 기록한 파일을 다시 읽어 위치 색인/조각 사본이 이어서 쓸 수 있는지 확인
+    reloaded = WriteBehindJsonStore(path, cache_fragments=cache_fragments)
+    assert reloaded.load() == expected
+    reloaded.discard("extra")
+    reloaded.close()
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == data
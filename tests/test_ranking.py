@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import main
+from guild_config import GuildConfig, GuildConfigStore
+from storage import JsonStorage
+from weekly_archive import WeeklyArchive
+
+KST = ZoneInfo("Asia/Seoul")
+NEW_YORK = ZoneInfo("America/New_York")
+NY_GUILD = 200
+# 월요일 05:00 KST = 뉴욕은 아직 일요일 16:00 (지난주)
+FROZEN_NOW = datetime(2026, 10, 19, 5, 0, tzinfo=KST)
+
+
+@pytest.fixture
+def bot_state(tmp_path, monkeypatch):
+    store = GuildConfigStore(str(tmp_path / "guild_config.json"))
+    store.load()
+    store.configs[NY_GUILD] = GuildConfig(timezone="America/New_York")
+    archive = WeeklyArchive(str(tmp_path / "weekly_archive.jsonl.gz"), str(tmp_path / "weekly_archive_index.json"))
+    storage = JsonStorage(str(tmp_path / "user_data.json"), archive=archive)
+    storage.load()
+    monkeypatch.setattr(main, "guild_configs", store)
+    monkeypatch.setattr(main, "storage", storage)
+    monkeypatch.setattr(main, "ranking_boards", {})
+    monkeypatch.setattr(main, "get_now", lambda tz=None: FROZEN_NOW.astimezone(tz or KST))
+    yield storage
+    storage.close()
+
+
+def record(guild_id, uid, start, end):
+    return asyncio.run(main.record_study_session(uid, f"user{uid}", guild_id, start, end))
+
+
+def test_non_kst_guild_ranks_sunday_session_in_its_own_week(bot_state):
+    now = main.guild_now(NY_GUILD)
+    assert now.weekday() == 6 # 뉴욕 기준 일요일
+    record(NY_GUILD, 1, now.replace(hour=15), now)
+    board = main.get_ranking_board(NY_GUILD)
+    assert board.week_start == "2026-10-12"
+    assert main.ranking_periods(NY_GUILD) == ("2026-10", "2026-10-12")
+    assert board.get("주간", *main.ranking_periods(NY_GUILD)).top(10) == [("1", 60)]
+    assert bot_state.get_weekly(f"{NY_GUILD}:1", "2026-10-12") == {"2026-10-18": 60}
+
+
+def test_ranking_boards_load_each_guild_week_in_its_timezone(bot_state):
+    ny_now = main.guild_now(NY_GUILD)
+    kst_now = main.guild_now(None)
+    record(NY_GUILD, 1, ny_now.replace(hour=15), ny_now)   # 뉴욕 일요일 (2026-10-12 주)
+    record(None, 2, kst_now.replace(hour=4), kst_now)      # 서울 월요일 (2026-10-19 주)
+
+    boards = main.build_ranking_boards(bot_state.iter_ranking_rows)
+    assert boards[NY_GUILD].week_start == "2026-10-12"
+    assert boards[NY_GUILD].get("주간", *main.ranking_periods(NY_GUILD)).top(10) == [("1", 60)]
+    assert boards[None].week_start == "2026-10-19"
+    assert boards[None].get("주간", *main.ranking_periods(None)).top(10) == [("2", 60)]
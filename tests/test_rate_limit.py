@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from rate_limit import CommandRateLimited, TokenBucketLimiter, check_rate_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_refill():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(burst=3, refill_seconds=10, clock=clock)
+    for _ in range(3):
+        assert limiter.retry_after("u") == 0
+        limiter.take("u")
+    assert limiter.retry_after("u") == pytest.approx(10)
+    clock.now = 4
+    assert limiter.retry_after("u") == pytest.approx(6)
+    clock.now = 10
+    assert limiter.retry_after("u") == 0
+    limiter.take("u")
+    assert limiter.retry_after("u") == pytest.approx(10)
+
+
+def test_zero_burst_disables_limit():
+    limiter = TokenBucketLimiter(burst=0, refill_seconds=10)
+    for _ in range(100):
+        limiter.take("u")
+    assert limiter.retry_after("u") == 0
+
+
+def test_channel_rejection_does_not_charge_user():
+    clock = FakeClock()
+    user_limiter = TokenBucketLimiter(burst=2, refill_seconds=10, clock=clock)
+    channel_limiter = TokenBucketLimiter(burst=1, refill_seconds=5, clock=clock)
+    check_rate_limits(user_limiter, channel_limiter, 1, 100)
+    with pytest.raises(CommandRateLimited) as excinfo:
+        check_rate_limits(user_limiter, channel_limiter, 1, 100)
+    assert excinfo.value.scope == "channel"
+    assert excinfo.value.retry_after == pytest.approx(5)
+    assert user_limiter.retry_after(1) == 0 # 거절된 요청은 사용자 토큰을 쓰지 않음
+    check_rate_limits(user_limiter, channel_limiter, 1, 200) # 다른 채널은 허용
+    with pytest.raises(CommandRateLimited) as excinfo:
+        check_rate_limits(user_limiter, channel_limiter, 1, 300)
+    assert excinfo.value.scope == "user"
+    assert (user_limiter.rejected, channel_limiter.rejected) == (1, 1)
+
+
+def test_full_buckets_are_pruned():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(burst=1, refill_seconds=1, clock=clock)
+    for key in range(1000):
+        limiter.take(key)
+    clock.now = 5 # 모두 다시 가득 참
+    for key in range(1000, 1030):
+        limiter.take(key)
+    assert len(limiter) == 30
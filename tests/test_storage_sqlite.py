@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+
+import pytest
+
+from storage import SqliteStorage, StudyStorage, create_storage
+
+
+def test_sqlite_storage_loaded_in_thread_is_usable_on_loop(tmp_path):
+    # main.load_state 처럼 작업 스레드에서 열고 이벤트 루프 스레드에서 사용
+    async def scenario():
+        storage = await asyncio.to_thread(
+            create_storage, "sqlite", str(tmp_path / "user_data.json"), str(tmp_path / "study_log.csv"),
+            str(tmp_path / "study.db"))
+        try:
+            storage.record_session("1", "alice", "2026-10-12", "2026-10", 30, "09:00", "09:30")
+            storage.record_session("1", "alice", "2026-10-13", "2026-10", 45)
+            assert storage.get_summary("1") == {"username": "alice", "total": 75}
+            assert storage.get_weekly("1", "2026-10-12") == {"2026-10-12": 30, "2026-10-13": 45}
+            assert await asyncio.to_thread(storage.get_daily_minutes, "1", "2026-10-13") == 45
+        finally:
+            storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_storage_concurrent_writers(tmp_path):
+    storage = create_storage("sqlite", str(tmp_path / "user_data.json"), str(tmp_path / "study_log.csv"),
+                             str(tmp_path / "study.db"))
+
+    def writer(uid):
+        for _ in range(50):
+            storage.record_session(uid, uid, "2026-10-12", "2026-10", 1)
+
+    threads = [threading.Thread(target=writer, args=(str(uid),)) for uid in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert [storage.get_summary(str(uid))["total"] for uid in range(4)] == [50] * 4
+        assert storage.get_monthly_minutes("0", "2026-10") == 50
+    finally:
+        storage.close()
+
+
+def test_import_legacy_skips_bad_csv_rows(tmp_path, capsys):
+    csv_file = tmp_path / "study_log.csv"
+    csv_file.write_text("User ID,Username,Date,Start Time,End Time,Duration (min)\n"
+                        "1,alice,2026-10-12,09:00,09:30,30\n"
+                        "1,alice,2026-10-12,10:00,10:20,twenty\n"
+                        "1,alice,2026-10-13\n"
+                        "2,bob,2026-10-13,09:00,10:00,60\n", encoding="utf-8-sig")
+    storage = SqliteStorage(str(tmp_path / "study.db"))
+    storage.load()
+    try:
+        assert storage.import_legacy(str(tmp_path / "missing.json"), str(csv_file))
+        rows = storage._fetchall("SELECT user_id, minutes FROM sessions ORDER BY id", ())
+        assert rows == [("1", 30), ("2", 60)]
+        assert "잘못된 줄 2개" in capsys.readouterr().out
+    finally:
+        storage.close()
+
+
+def test_study_storage_is_abstract():
+    with pytest.raises(TypeError):
+        StudyStorage()
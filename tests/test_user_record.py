@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from user_record import UserRecord
+
+
+@pytest.mark.parametrize("data", [
+    {"username": "alice", "total": 150,
+     "weekly": {"2026-10-12": 90, "2026-10-13": 60},
+     "daily": {"2026-01-01": 0, "2026-10-12": 90, "2026-10-13": 60},
+     "monthly": {"2025-12": 0, "2026-10": 150}},
+    {"username": "big", "total": 70000, "weekly": {}, "daily": {"2026-10-12": 70000}, "monthly": {"2026-10": 70000}},
+    {"total": 5, "daily": {"2026-10-12": 5}}, # 기본 키 일부가 없는 기존 항목
+    {"username": None, "total": 0, "weekly": {"bad-date": 3}, "daily": {"2026-10-12": -1},
+     "monthly": {"2026-10": 1.5}, "note": "unknown"}, # 배열로 옮길 수 없는 값은 그대로 보존
+])
+def test_round_trip(data):
+    assert UserRecord.from_dict(data).to_dict() == data
+
+
+def test_add_minutes_after_round_trip():
+    record = UserRecord.from_dict({"total": 10, "daily": {"2026-10-12": 10}})
+    record.add_minutes("2026-10-13", "2026-10", 20)
+    assert record.to_dict() == {"username": None, "total": 30, "weekly": {"2026-10-13": 20},
+                                "daily": {"2026-10-12": 10, "2026-10-13": 20}, "monthly": {"2026-10": 20}}
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+
+from storage import JsonStorage, SqliteStorage
+from weekly_archive import WeeklyArchive, iso_week_key
+
+
+def make_json_storage(tmp_path):
+    archive = WeeklyArchive(str(tmp_path / "weekly_archive.jsonl.gz"), str(tmp_path / "weekly_archive_index.json"))
+    storage = JsonStorage(str(tmp_path / "user_data.json"), archive=archive)
+    storage.load()
+    return storage
+
+
+def test_json_week_rollover_archive_round_trip(tmp_path):
+    storage = make_json_storage(tmp_path)
+    storage.record_session("1", "alice", "2026-10-06", "2026-10", 40) # 지난주 (월요일 2026-10-05)
+    storage.record_session("1", "alice", "2026-10-08", "2026-10", 20)
+    storage.record_session("1", "alice", "2026-10-13", "2026-10", 30) # 이번 주 첫 기록 → 지난주는 보관소로
+    assert storage.get_weekly("1", "2026-10-12") == {"2026-10-13": 30}
+    assert storage.get_weekly("1", "2026-10-05") == {"2026-10-06": 40, "2026-10-08": 20}
+    storage.flush_archive()
+    assert storage.archive.read_week(iso_week_key("2026-10-05")) == {
+        "1": {"username": "alice", "days": {"2026-10-06": 40, "2026-10-08": 20}}}
+    storage.close()
+
+    # 다시 열어도 이번 주는 기록에서, 지난주는 보관소에서 읽음
+    reopened = make_json_storage(tmp_path)
+    assert reopened.get_weekly("1", "2026-10-12") == {"2026-10-13": 30}
+    assert reopened.get_weekly("1", "2026-10-05") == {"2026-10-06": 40, "2026-10-08": 20}
+    assert reopened.get_summary("1") == {"username": "alice", "total": 90}
+    reopened.close()
+
+
+def test_json_rollover_appends_archive_off_the_calling_thread(tmp_path):
+    storage = make_json_storage(tmp_path)
+    append_threads = []
+    original_append = storage.archive.append
+
+    def recording_append(records):
+        append_threads.append(threading.current_thread())
+        original_append(records)
+
+    storage.archive.append = recording_append
+    storage.record_session("1", "alice", "2026-10-06", "2026-10", 40)
+    storage.record_session("1", "alice", "2026-10-13", "2026-10", 30) # 주 경계 → 보관소 덧붙이기
+    # 보관소 스레드에서 덧붙이는 중에도 메모리에서 지운 지난주를 읽으면 덧붙이기 이후 결과가 보임
+    assert storage.get_recent_weekly("1", "2026-10-05") == {}
+    assert storage.read_archived_weekly("1", "2026-10-05") == {"2026-10-06": 40}
+    assert append_threads and threading.current_thread() not in append_threads
+    storage.close()
+
+
+def test_sqlite_weekly_is_derived_from_daily_totals(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "study.db"))
+    storage.load()
+    try:
+        storage.record_session("1", "alice", "2026-10-11", "2026-10", 15) # 지난주 일요일
+        storage.record_session("1", "alice", "2026-10-12", "2026-10", 30)
+        storage.record_session("1", "alice", "2026-10-12", "2026-10", 10)
+        storage.record_session("2", "bob", "2026-10-18", "2026-10", 60)
+        assert storage.get_weekly("1", "2026-10-12") == {"2026-10-12": 40}
+        assert storage.get_weekly("1", "2026-10-05") == {"2026-10-11": 15}
+        assert list(storage.iter_weekly("2026-10-12")) == [
+            ("1", "alice", {"2026-10-12": 40}), ("2", "bob", {"2026-10-18": 60})]
+        assert sorted(storage.iter_ranking_rows("2026-10", "2026-10-12")) == [
+            ("1", "alice", 40, 55, 55), ("2", "bob", 60, 60, 60)]
+    finally:
+        storage.close()
+
+
+def test_sqlite_legacy_weekly_totals_merged_and_dropped(tmp_path):
+    db_file = str(tmp_path / "study.db")
+    conn = sqlite3.connect(db_file)
+    conn.executescript("""
+        CREATE TABLE daily_totals (user_id TEXT NOT NULL, date TEXT NOT NULL, minutes INTEGER NOT NULL DEFAULT 0,
+                                   PRIMARY KEY (user_id, date)) WITHOUT ROWID;
+        CREATE TABLE weekly_totals (user_id TEXT NOT NULL, date TEXT NOT NULL, minutes INTEGER NOT NULL DEFAULT 0,
+                                    PRIMARY KEY (user_id, date)) WITHOUT ROWID;
+        INSERT INTO daily_totals VALUES ('1', '2026-10-12', 40);
+        INSERT INTO weekly_totals VALUES ('1', '2026-10-12', 40), ('1', '2026-10-13', 25);
+    """)
+    conn.close()
+
+    storage = SqliteStorage(db_file)
+    storage.load()
+    try:
+        assert storage.get_weekly("1", "2026-10-12") == {"2026-10-12": 40, "2026-10-13": 25}
+        tables = {name for name, in storage._fetchall("SELECT name FROM sqlite_master WHERE type = 'table'", ())}
+        assert "weekly_totals" not in tables
+    finally:
+        storage.close()
+    storage.load() # 다시 열어도 그대로
+    storage.close()
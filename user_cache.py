@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# ------------------ 사용자 객체 조회 캐시 ------------------
+# bot.fetch_user() 는 매번 REST 요청을 보냅니다. 대부분의 사용자는 이미 게이트웨이 캐시(intents.members)에
+# 있으므로 다음 순서로 찾고, 모두 실패했을 때만 API 를 호출합니다.
+#   1) bot.get_user() (게이트웨이로 받은 길드 멤버 캐시)
+#   2) TTL 이 있는 로컬 캐시 (이전에 fetch_user 로 가져온 User 객체)
+#   3) bot.fetch_user() (REST)
+import os
+import time
+from collections import OrderedDict
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "3600"))      # 로컬 캐시 유지 시간(초)
+USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "50000"))       # 로컬 캐시 최대 항목 수
+
+
+class UserResolver:
+    def __init__(self, bot, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX):
+        self.bot = bot
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict() # uid -> (User, 만료 시각)
+        self.stats = {"gateway_hits": 0, "local_hits": 0, "api_fetches": 0}
+
+    def _from_gateway(self, uid):
+        # intents.members 가 켜져 있으면 길드 멤버의 User 도 bot.get_user() 캐시에 들어 있음 (O(1) 조회)
+        return self.bot.get_user(uid)
+
+    def cached(self, uid):
+        # API 를 호출하지 않고 게이트웨이/로컬 캐시에 있는 User 만 반환 (없거나 만료되면 None)
+        uid = int(uid)
+        user = self._from_gateway(uid)
+        if user is not None:
+            return user
+        entry = self._cache.get(uid)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    async def resolve(self, uid):
+        uid = int(uid)
+        user = self._from_gateway(uid)
+        if user is not None:
+            self.stats["gateway_hits"] += 1
+            return user
+
+        entry = self._cache.get(uid)
+        if entry is not None:
+            user, expires_at = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(uid)
+                self.stats["local_hits"] += 1
+                return user
+            del self._cache[uid]
+
+        self.stats["api_fetches"] += 1
+        user = await self.bot.fetch_user(uid) # discord.NotFound 등은 호출 측에서 처리
+        self._cache[uid] = (user, time.monotonic() + self.ttl)
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False) # 가장 오래 쓰지 않은 항목 제거
+        return user
+
+    async def send(self, uid, *args, **kwargs):
+        # 캐시된 User 를 재사용하면 discord.py 가 열어 둔 DM 채널도 재사용됨 (create_dm 호출 절약)
+        user = await self.resolve(uid)
+        return await user.send(*args, **kwargs)
+
+    def invalidate(self, uid):
+        self._cache.pop(int(uid), None)
+
+    def api_calls_avoided(self):
+        return self.stats["gateway_hits"] + self.stats["local_hits"]
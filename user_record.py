@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# ------------------ 사용자 집계 레코드 (메모리 절약형) ------------------
+# user_data.json 의 사용자 항목 {"username", "total", "weekly", "daily", "monthly"} 을
+# 날짜 문자열 키 dict 대신 배열로 들고 있습니다. 1년치 일간 기록이 dict 로는 수십 KB 이지만
+# 배열로는 하루 2바이트(약 730바이트)입니다.
+#   - DayBuffer: 연속된 번호(일: 날짜 서수, 월: 연*12+월)를 인덱스로 하는 array('H').
+#                값은 (분 + 1) 이고 0 은 "키 없음" → JSON 으로 되돌릴 때 원래 있던 키만 그대로 복원
+#   - UserRecord: __slots__ 클래스. from_dict()/to_dict() 로 기존 JSON 형식과 손실 없이 변환
+import array
+from datetime import date
+
+ABSENT = 0          # 배열 값 0 = 해당 날짜/월 기록 없음
+SMALL_LIMIT = 0xFFFF # 'H' 로 담을 수 있는 최댓값. 넘으면 'I' 로 바꿈
+
+
+class DayBuffer:
+    __slots__ = ("start", "values")
+
+    def __init__(self):
+        self.start = 0                   # values[0] 의 인덱스
+        self.values = array.array('H')
+
+    def __len__(self):
+        return len(self.values) - self.values.count(ABSENT)
+
+    def add(self, index, minutes):
+        # O(1) (앞쪽으로 늘어나는 경우만 복사)
+        if not self.values:
+            self.start = index
+        elif index < self.start:
+            self.values[0:0] = array.array(self.values.typecode, bytes(self.values.itemsize * (self.start - index)))
+            self.start = index
+        offset = index - self.start
+        if offset >= len(self.values):
+            self.values.extend(array.array(self.values.typecode, bytes(self.values.itemsize * (offset + 1 - len(self.values)))))
+        stored = self.values[offset]
+        value = (stored - 1 if stored != ABSENT else 0) + minutes + 1
+        if value > SMALL_LIMIT and self.values.typecode == 'H':
+            self.values = array.array('I', self.values)
+        self.values[offset] = value
+
+    def get(self, index, default=0):
+        offset = index - self.start
+        if 0 <= offset < len(self.values) and self.values[offset] != ABSENT:
+            return self.values[offset] - 1
+        return default
+
+    def range_sum(self, lo, hi):
+        # [lo, hi) 구간 합계
+        lo, hi = max(lo - self.start, 0), min(hi - self.start, len(self.values))
+        return sum(value - 1 for value in self.values[lo:hi] if value != ABSENT) if lo < hi else 0
+
+    def items(self, lo=None, hi=None):
+        # (인덱스, 분) : 기록이 있는 칸만
+        lo = 0 if lo is None else max(lo - self.start, 0)
+        hi = len(self.values) if hi is None else min(hi - self.start, len(self.values))
+        for offset in range(lo, hi):
+            value = self.values[offset]
+            if value != ABSENT:
+                yield self.start + offset, value - 1
+
+    def discard_before(self, index):
+        # index 이전 칸을 비우고 잘라냄
+        cut = min(max(index - self.start, 0), len(self.values))
+        if cut:
+            del self.values[:cut]
+            self.start += cut
+        if not self.values:
+            self.start = 0
+
+
+# --- 키 변환 ---
+def day_index(date_str):
+    return date.fromisoformat(date_str).toordinal()
+
+def day_key(index):
+    return date.fromordinal(index).isoformat()
+
+def month_index(month_str):
+    year, month = month_str.split("-")
+    if len(year) != 4 or len(month) != 2:
+        raise ValueError(month_str)
+    return int(year) * 12 + int(month) - 1
+
+def month_key(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+FIELDS = (("weekly", day_index, day_key), ("daily", day_index, day_key), ("monthly", month_index, month_key))
+KNOWN_KEYS = ("username", "total", "weekly", "daily", "monthly")
+
+
+class UserRecord:
+    __slots__ = ("username", "total", "weekly", "daily", "monthly", "extra")
+
+    def __init__(self, username=None, total=0):
+        self.username = username
+        self.total = total
+        self.weekly = DayBuffer()
+        self.daily = DayBuffer()
+        self.monthly = DayBuffer()
+        # 배열로 옮길 수 없는 값 (대부분 None):
+        #   "missing": 원래 JSON 에 없던 기본 키, "loose": {필드: {형식이 다른 키: 값}}, "other": 알 수 없는 키
+        self.extra = None
+
+    def add_minutes(self, date_str, month_str, minutes):
+        # 퇴장 기록 반영 O(1): 주간/일간/월간 누적
+        index = day_index(date_str)
+        self.total += minutes
+        self.weekly.add(index, minutes)
+        self.daily.add(index, minutes)
+        self.monthly.add(month_index(month_str), minutes)
+        if self.extra and "missing" in self.extra: # 기록한 사용자는 기본 키가 모두 있는 형식이 됨
+            del self.extra["missing"]
+            self.extra = self.extra or None
+
+    # --- JSON 변환 ---
+    @classmethod
+    def from_dict(cls, data):
+        record = cls(data.get("username"), data.get("total", 0))
+        extra = {}
+        missing = [key for key in KNOWN_KEYS if key not in data]
+        for key, value in data.items():
+            if key in ("username", "total"):
+                continue
+            field = next((f for f in FIELDS if f[0] == key), None)
+            if field is None or not isinstance(value, dict):
+                extra.setdefault("other", {})[key] = value
+                if field is not None:
+                    missing.append(key)
+                continue
+            buffer = getattr(record, key)
+            for sub_key, minutes in value.items():
+                try:
+                    if type(minutes) is not int or minutes < 0:
+                        raise ValueError(sub_key)
+                    buffer.add(field[1](sub_key), minutes)
+                except ValueError:
+                    extra.setdefault("loose", {}).setdefault(key, {})[sub_key] = minutes
+        if missing:
+            extra["missing"] = missing
+        record.extra = extra or None
+        return record
+
+    def to_dict(self):
+        extra = self.extra or {}
+        missing = extra.get("missing", ())
+        data = {}
+        for key in ("username", "total"):
+            if key not in missing:
+                data[key] = getattr(self, key)
+        for key, _, to_key in FIELDS:
+            buffer = getattr(self, key)
+            if key in missing and not len(buffer):
+                continue
+            values = {to_key(index): minutes for index, minutes in buffer.items()}
+            values.update(extra.get("loose", {}).get(key, {}))
+            data[key] = values
+        for key, value in extra.get("other", {}).items():
+            if key not in data:
+                data[key] = value
+        return data
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# ------------------ 음성 채널 입퇴장 자동 기록 ------------------
+# 서버 설정(!설정 음성)으로 지정한 공부용 음성 채널에 들어가면 입장, 나가면 퇴장으로 처리합니다.
+# 음성 상태 이벤트는 곧바로 기록하지 않고 사용자별 전환 하나만 DeadlineScheduler 에 예약해 두었다가
+# VOICE_BATCH_SECONDS 경계마다 마감된 전환을 한 번에 처리합니다 (수백 건이 몰려도 배치당 저장 한 번).
+#   - 입장: 다음 배치 경계에 시작 (입장 시각은 실제 음성 채널 입장 시각)
+#   - 퇴장: VOICE_LEAVE_GRACE 초 뒤 배치에서 종료 (퇴장 시각은 실제로 나간 시각)
+#     그 사이 다시 들어오면(재연결) 예약된 퇴장만 취소하고 세션은 이어짐
+#   - 입장이 처리되기 전에 나가면 둘 다 없던 일로 함
+import math
+import os
+
+from scheduler import DeadlineScheduler
+
+VOICE_LEAVE_GRACE = float(os.getenv("VOICE_LEAVE_GRACE", "120")) # 재연결로 보고 세션을 유지하는 시간(초)
+VOICE_BATCH_SECONDS = float(os.getenv("VOICE_BATCH_SECONDS", "2")) # 전환을 모아 처리하는 간격(초)
+
+JOIN = "join"
+LEAVE = "leave"
+
+
+class VoiceSessionTracker:
+    def __init__(self, grace=VOICE_LEAVE_GRACE, batch_seconds=VOICE_BATCH_SECONDS):
+        self.grace = grace
+        self.batch_seconds = batch_seconds
+        self.scheduler = DeadlineScheduler()
+        self.stats = {"events": 0, "joins": 0, "leaves": 0, "reconnects": 0, "cancelled": 0}
+
+    def __len__(self):
+        return len(self.scheduler)
+
+    def _batch_deadline(self, timestamp):
+        # 배치 경계로 올림 → 같은 구간의 전환은 같은 마감 시각이 되어 한 번에 처리됨
+        return math.ceil(timestamp / self.batch_seconds) * self.batch_seconds
+
+    def joined(self, uid, guild_id, username, at, active):
+        # 공부용 음성 채널 입장. active: 이미 입장 상태인지 (!입장 또는 이전 음성 세션)
+        self.stats["events"] += 1
+        pending = self.scheduler.get(uid)
+        if pending is not None and pending[0] == LEAVE:
+            self.scheduler.cancel(uid) # 유예 시간 안에 다시 들어옴 → 세션 유지
+            self.stats["reconnects"] += 1
+        elif pending is None and not active:
+            self.scheduler.schedule(uid, self._batch_deadline(at.timestamp()), (JOIN, guild_id, username, at))
+
+    def left(self, uid, username, at, active):
+        # 공부용 음성 채널 퇴장. active: 음성으로 시작한 세션이 진행 중인지
+        self.stats["events"] += 1
+        pending = self.scheduler.get(uid)
+        if pending is not None and pending[0] == JOIN:
+            self.scheduler.cancel(uid) # 시작 전에 나감
+            self.stats["cancelled"] += 1
+        elif pending is None and active:
+            self.scheduler.schedule(uid, self._batch_deadline(at.timestamp() + self.grace), (LEAVE, None, username, at))
+
+    def forget(self, uid):
+        # 명령어로 입장/퇴장한 경우 예약된 전환 취소
+        self.scheduler.cancel(uid)
+
+    async def run(self, handler):
+        # handler([(uid, (종류, guild_id, username, 시각)), ...]) 를 배치마다 호출
+        async def count_and_handle(due):
+            for _, (kind, *_rest) in due:
+                self.stats["joins" if kind == JOIN else "leaves"] += 1
+            await handler(due)
+
+        await self.scheduler.run_batches(count_and_handle)
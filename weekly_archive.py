@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# ------------------ 지난 주간 기록 보관소 ------------------
+# 주간 기록은 ISO 주(월요일 시작) 기준으로 나뉘며, 월요일에 전체 사용자를 훑어 비우지 않습니다.
+# 사용자의 다음 기록 시점에 지난 주 날짜들을 꺼내(lazy rollover) 이 보관소에 덧붙입니다.
+#   - weekly_archive.jsonl.gz : 덧붙일 때마다 gzip 멤버 하나 (여러 멤버를 이어 붙인 파일도 gzip 으로 그대로 읽힘)
+#                               한 줄 = {"week": "2025-W14", "user": "...", "username": "...", "days": {날짜: 분}}
+#   - weekly_archive_index.json : 주 → [(시작 위치, 길이)] 색인. 특정 주를 읽을 때 해당 구간만 풀어서 읽음
+# 색인은 보관소에서 다시 만들 수 있으므로 매번 저장하지 않고, 저장된 색인 이후에 덧붙은 부분은 시작 시 이어서 색인합니다.
+import glob
+import gzip
+import json
+import os
+import zlib
+from datetime import date, timedelta
+
+from persistence import atomic_write_text
+
+ARCHIVE_FILE = 'weekly_archive.jsonl.gz'
+ARCHIVE_INDEX_FILE = 'weekly_archive_index.json'
+INDEX_SAVE_EVERY = 100 # 이 횟수만큼 덧붙이면 색인 저장
+
+
+def week_start_of(date_str):
+    # "YYYY-MM-DD" → 그 주 월요일 "YYYY-MM-DD" (문자열 비교로 주 경계를 판단할 수 있음)
+    day = date.fromisoformat(date_str)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def iso_week_key(date_str):
+    # "YYYY-MM-DD" → "YYYY-Www"
+    iso_year, iso_week, _ = date.fromisoformat(date_str).isocalendar()
+    return f"{iso_year}-W{iso_week:02d}"
+
+
+def split_by_week(days):
+    # {날짜: 분} → {주 키: {날짜: 분}}
+    weeks = {}
+    for date_str, minutes in days.items():
+        weeks.setdefault(iso_week_key(date_str), {})[date_str] = minutes
+    return weeks
+
+
+def iter_legacy_backups(directory='.'):
+    # 예전 주간 초기화가 남긴 weekly_backup_*.json → (파일 경로, [(uid_str, username, {날짜: 분})])
+    for path in sorted(glob.glob(os.path.join(directory, "weekly_backup_*.json"))):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                backup = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"주간 백업 파일을 읽을 수 없습니다: {path}: {e}")
+            continue
+        yield path, [(uid_str, entry.get("username"), entry.get("weekly_data", {}))
+                     for uid_str, entry in backup.items()]
+
+
+class WeeklyArchive:
+    def __init__(self, path=ARCHIVE_FILE, index_file=ARCHIVE_INDEX_FILE):
+        self.path = path
+        self.index_file = index_file
+        self.weeks = {}        # 주 키 -> [[시작 위치, 길이], ...]
+        self.size = 0          # 색인이 반영한 보관소 크기 (bytes)
+        self._unsaved = 0
+
+    # --- 색인 ---
+    def load(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self.weeks, self.size = index["weeks"], index["size"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"주간 보관소 색인을 다시 만듭니다: {e}")
+                self.weeks, self.size = {}, 0
+        actual_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if actual_size < self.size: # 보관소가 교체됨 → 처음부터 다시 색인
+            self.weeks, self.size = {}, 0
+        if actual_size > self.size:
+            self._index_tail(actual_size)
+            self.save_index()
+
+    def _index_tail(self, actual_size):
+        # 색인 이후에 덧붙은 gzip 멤버들을 차례로 풀어 색인에 추가
+        with open(self.path, 'rb') as f:
+            f.seek(self.size)
+            data = f.read(actual_size - self.size)
+        position = 0
+        while position < len(data):
+            decompressor = zlib.decompressobj(wbits=31) # gzip 멤버 하나
+            try:
+                text = decompressor.decompress(data[position:]).decode('utf-8')
+            except zlib.error as e:
+                print(f"주간 보관소 {self.size + position} 이후가 손상되어 색인하지 않습니다: {e}")
+                break
+            length = len(data) - position - len(decompressor.unused_data)
+            for line in text.splitlines():
+                self._add_range(json.loads(line)["week"], self.size + position, length)
+            position += length
+        self.size += position
+
+    def _add_range(self, week, offset, length):
+        ranges = self.weeks.setdefault(week, [])
+        if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+            ranges[-1][1] += length # 바로 이어지는 구간은 합침 (같은 주를 연달아 덧붙이는 경우가 대부분)
+        elif not ranges or ranges[-1][0] != offset:
+            ranges.append([offset, length])
+
+    def save_index(self):
+        atomic_write_text(self.index_file, json.dumps({"size": self.size, "weeks": self.weeks}))
+        self._unsaved = 0
+
+    # --- 기록/조회 ---
+    def append(self, records):
+        # records: [{"week", "user", "username", "days"}]. gzip 멤버 하나로 덧붙이고 fsync
+        if not records:
+            return
+        payload = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records)
+        member = gzip.compress(payload.encode('utf-8'))
+        with open(self.path, 'ab') as f:
+            f.write(member)
+            f.flush()
+            os.fsync(f.fileno())
+        for week in {record["week"] for record in records}:
+            self._add_range(week, self.size, len(member))
+        self.size += len(member)
+        self._unsaved += 1
+        if self._unsaved >= INDEX_SAVE_EVERY:
+            self.save_index()
+
+    def read_week(self, week):
+        # {uid_str: {"username", "days"}} : 색인된 구간만 읽어서 풂
+        result = {}
+        if week not in self.weeks:
+            return result
+        with open(self.path, 'rb') as f:
+            for offset, length in self.weeks[week]:
+                f.seek(offset)
+                for line in gzip.decompress(f.read(length)).decode('utf-8').splitlines():
+                    record = json.loads(line)
+                    if record["week"] != week:
+                        continue
+                    entry = result.setdefault(record["user"], {"username": record.get("username"), "days": {}})
+                    for date_str, minutes in record["days"].items():
+                        entry["days"][date_str] = entry["days"].get(date_str, 0) + minutes
+        return result
+
+    def close(self):
+        if self._unsaved:
+            self.save_index()